@@ -1,80 +1,555 @@
+import argparse
 import asyncio
+import contextlib
+import json
 import logging
-import re
 import os
+import signal
+import sqlite3
+import sys
+import time
+import zlib
 
-from tools.subfinder import run_subfinder
-from tools.cloudfail import run_cloudfail
-from tools.reconbulk import run_reconbulk
-from tools.hatcloud import run_hatcloud
-from tools.maryam import run_maryam
-from tools.cloudunflare import run_cloudunflare
-from tools.bypass_firewall import run_bypass_firewall
-from tools.orsframe_work import run_osrframework
-from tools.catphish import run_catphish 
+from tools import daemon, dns, journal, logs, metrics, workqueue
+from tools.batch import target_file
+from tools.executor import draining, request_drain, reset_drain
+from tools.preflight import preflight
+from tools.registry import CONCURRENCY_LIMITS as concurrency_limits, get_registry, get_tool, load_tool
+from tools.results import error_result
+from tools.scheduler import DEFAULT_PRIORITY, PRIORITIES, current_share, job_share, log_progress, parse_priority
+from tools import store
+from tools.store import get_store, save_run
+from tools.stream import set_output_root
+from tools.targets import count_targets, is_target_source, is_valid_domain, iter_targets, spool_stdin, spool_targets
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Коды завершения пакетного режима
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_UNAVAILABLE = 3
+EXIT_INTERRUPTED = 130
 
-async def execute_tool(choice, target):
+async def execute_tool(choice, target, max_concurrency=None, refresh=False):
     try:
-        tools_dict = {
-            1: run_subfinder,
-            2: run_cloudfail,
-            3: run_reconbulk,
-            4: run_hatcloud,
-            5: run_maryam,
-            6: run_cloudunflare,
-            7: run_bypass_firewall,
-            8: run_osrframework,
-            9: run_catphish
-        }
-        logging.info(f"Запуск {tools_dict[choice].__name__} для {target}")
-        await tools_dict[choice](target, output_to_file=True)
+        spec = get_tool(choice)
+        check = preflight(spec.name)
+        if not check.ok:
+            logging.error(f"Инструмент {spec.name} недоступен: {check.reason}")
+            return [error_result(spec.name, target, FileNotFoundError(check.reason))]
+        if max_concurrency is None:
+            max_concurrency = concurrency_limits[spec.concurrency_class]
+        logging.info(f"Запуск {spec.name} для {target}")
+        return await load_tool(spec)(target, output_to_file=True, max_concurrency=max_concurrency, refresh=refresh)
     except Exception as e:
         logging.error(f"Ошибка при выполнении инструмента: {e}")
+        return []
 
-def is_valid_domain(domain):
-    # Простейшая проверка формата домена
-    
-    regex = r'^(?!-)[A-Za-z0-9-]{1,63}(?<!-)\.[A-Za-z]{2,}'
-    return re.match(regex, domain) is not None
+async def run_pipeline(choices, target, limits=None, refresh=False):
+    """
+    Запускает несколько инструментов для одного домена или файла с доменами в одном цикле событий.
+    Каждый инструмент параллельно обходит свои домены с лимитом своего класса,
+    поэтому общее время близко ко времени самого медленного инструмента.
+
+    :param choices: номера или имена инструментов из реестра.
+    :type choices: Iterable[int]
+    :param target: домен или путь к файлу с доменами.
+    :type target: str
+    :param limits: переопределение лимитов параллельности по классам инструментов.
+    :type limits: dict
+    :param refresh: игнорировать кэш результатов.
+    :type refresh: bool
+    :return: результаты всех инструментов.
+    :rtype: List[ToolResult]
+    """
+    limits = {**concurrency_limits, **(limits or {})}
+    results = await asyncio.gather(*(
+        execute_tool(choice, target, max_concurrency=limits[get_tool(choice).concurrency_class], refresh=refresh)
+        for choice in dict.fromkeys(choices)
+    ))
+    return [result for tool_results in results for result in tool_results]
+
+def count_units(choices, targets):
+    """
+    Оценка числа запусков (инструмент, цель) для прогресса задания. Ошибка чтения файла
+    (например, обрезанный .gz) не прерывает задание: прогресс остаётся без общего числа (0),
+    а саму ошибку сообщат инструменты, когда дойдут до файла.
+    """
+    try:
+        return sum(count_targets(target) for target in targets) * len(dict.fromkeys(choices))
+    except (OSError, EOFError, zlib.error) as e:
+        logging.warning(f"Не удалось оценить число целей для прогресса: {e}")
+        return 0
+
+async def run_scheduled(choices, target, limits=None, refresh=False, priority=DEFAULT_PRIORITY):
+    """
+    Выполняет run_pipeline как отдельное задание планировщика (tools.scheduler): его процессы
+    делят бюджет с другими заданиями пропорционально весу приоритета.
+    """
+    with job_share(f"{','.join(choices)} {target}", priority) as share:
+        share.total = await asyncio.to_thread(count_units, choices, [target])
+        return await run_pipeline(choices, target, limits, refresh)
+
+def is_valid_target(target, specs):
+    # Имя пользователя проверяется только на непустоту, остальные инструменты ждут домен или файл
+    if not target:
+        return False
+    if is_target_source(target):
+        return True
+    return all(spec.input_kind == "username" or is_valid_domain(target) for spec in specs)
 
 async def main():
-    tools = {
-        1: "Subfinder (поиск поддоменов)",
-        2: "CloudFail (защита и проверка доменов)",
-        3: "ReconBulk (массовая проверка доменов)",
-        4: "HatCloud (выяснить реальный IP)",
-        5: "Maryam (сбор информации по домену)",
-        6: "CloudUnflare (Bash-скрипт)",
-        7: "BypassFirewall (пытается найти реальный IP)",
-        8: "OSRFramework (сбор информации по домену)",
-        9: "Catphish (сбор информации по домену)"
-    }
+    tools = get_registry()
 
     while True:
         print("Выберите инструмент для работы с доменом:")
-        for key, value in tools.items():
-            print(f"{key}. {value}")
+        for key, spec in tools.items():
+            print(f"{key}. {spec.title}")
 
         try:
-            choice = int(input("Введите номер инструмента (1-7): "))
-            if choice not in tools:
+            # Несколько номеров через запятую запускают инструменты параллельно
+            answer = input(f"Введите номер инструмента (1-{len(tools)}) или несколько через запятую: ")
+            choices = [int(part) for part in answer.split(",") if part.strip()]
+            if not choices or any(choice not in tools for choice in choices):
                 raise ValueError("Неверный выбор.")
         except ValueError as e:
             logging.error(e)
             continue
 
         target = input("Введите домен или путь к файлу с доменами: ").strip()
-        if not target or (not is_valid_domain(target) and not os.path.isfile(target)):
+        if not is_valid_target(target, [tools[choice] for choice in choices]):
             logging.error("Вы не ввели действительный домен или путь к файлу. Попробуйте снова.")
             continue
 
-        await execute_tool(choice, target)
+        if len(choices) == 1:
+            await execute_tool(choices[0], target)
+        else:
+            await run_pipeline(choices, target)
 
         answer = input("Хотите продолжить? (y/n): ")
         if answer.lower() != "y":
             break
 
+def parse_tools(value):
+    # Инструменты задаются строкой через запятую или списком строк
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, list) or not all(isinstance(part, str) for part in value):
+        raise ValueError(f"Инструменты задаются строкой через запятую или списком строк, получено: {value!r}")
+    choices = [get_tool(part).name for part in value if str(part).strip()]
+    if not choices:
+        raise ValueError("Не указан ни один инструмент")
+    return choices
+
+def parse_limits(value):
+    # Лимиты задаются списком "класс=N" или словарём {"класс": N}
+    if isinstance(value, dict):
+        value = [f"{key}={limit}" for key, limit in value.items()]
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f"Лимиты параллельности задаются словарём {{\"класс\": N}} или списком \"класс=N\", получено: {value!r}")
+    limits = {}
+    for item in value:
+        key, _, limit = item.partition("=")
+        if key not in concurrency_limits or not limit.isdigit() or int(limit) < 1:
+            raise ValueError(f"Неверный лимит параллельности: {item}. Классы: {', '.join(concurrency_limits)}")
+        limits[key] = int(limit)
+    return limits
+
+def parse_refresh(value):
+    # "false" из YAML или JSON-строки не должен включать повторный запуск, поэтому принимается только bool
+    if not isinstance(value, bool):
+        raise ValueError(f"refresh задаётся true или false, получено: {value!r}")
+    return value
+
+def as_list(value, name):
+    # Одна строка — это одна цель или один файл, а не список символов
+    if isinstance(value, str):
+        return [value]
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise ValueError(f"{name} задаётся строкой или списком, получено: {value!r}")
+    return value
+
+def load_job_file(path):
+    with open(path, "r") as f:
+        if path.endswith((".yml", ".yaml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("Для YAML-файлов заданий установите PyYAML или используйте JSON")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    # Файл может быть списком заданий или словарём с общими настройками и ключом "jobs"
+    if isinstance(data, list):
+        data = {"jobs": data}
+    if not isinstance(data, dict) or not isinstance(data.get("jobs"), list):
+        raise ValueError(f"В файле заданий {path} нет списка jobs")
+    return data
+
+def build_jobs(args):
+    """
+    Собирает список запусков (инструменты, цель, refresh, приоритет) из аргументов командной строки и файла заданий.
+
+    :return: запуски, лимиты параллельности и директория результатов.
+    :rtype: tuple
+    """
+    settings = load_job_file(args.job_file) if args.job_file else {"jobs": []}
+    limits = parse_limits(settings.get("concurrency", {}))
+    limits.update(parse_limits(args.concurrency))
+    output_dir = args.output_dir or settings.get("output_dir")
+
+    job_specs = list(settings["jobs"])
+    if args.tools or args.target or args.targets_file:
+        job_specs.append({"tools": args.tools or "", "targets": args.target, "targets_files": args.targets_file})
+
+    jobs = []
+    stdin_path = None
+    for spec in job_specs:
+        if not isinstance(spec, dict):
+            raise ValueError(f"Задание в файле должно быть словарём, получено: {spec!r}")
+        choices = parse_tools(spec.get("tools", ""))
+        refresh = parse_refresh(spec.get("refresh", settings.get("refresh", False))) or args.refresh
+        priority = spec.get("priority", settings.get("priority", args.priority))
+        parse_priority(priority)
+        targets = list(as_list(spec.get("targets"), "targets"))
+        for target in targets:
+            if not isinstance(target, str) or not is_valid_target(target, [get_tool(choice) for choice in choices]):
+                raise ValueError(f"Недействительная цель: {target}")
+        domains = [target for target in targets if not is_target_source(target)]
+        if len(domains) > 1:
+            # Домены задания — один список, как в run_job: лимит параллельности общий, subfinder идёт пакетами
+            targets = [spool_targets(domains)] + [target for target in targets if is_target_source(target)]
+        for path in as_list(spec.get("targets_files"), "targets_files"):
+            if path == "-":
+                # stdin читается один раз, а список нужен каждому инструменту задания
+                stdin_path = stdin_path or spool_stdin()
+                path = stdin_path
+            if not isinstance(path, str) or not os.path.isfile(path):
+                raise ValueError(f"Файл с доменами не найден: {path}")
+            targets.append(path)
+        if not targets:
+            raise ValueError("Для задания не указаны цели")
+        jobs.extend((choices, target, refresh, priority) for target in targets)
+
+    if not jobs:
+        raise ValueError("Не задано ни одного запуска: укажите --tools и цели или --job-file")
+    return jobs, limits, output_dir
+
+@contextlib.contextmanager
+def graceful_sigint():
+    """
+    Первый SIGINT останавливает выдачу новых целей (request_drain) и даёт дождаться начатых запусков,
+    второй отменяет текущую задачу.
+    """
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+
+    def on_sigint():
+        if draining():
+            logging.warning("Повторный SIGINT: текущие запуски прерываются")
+            task.cancel()
+        else:
+            logging.warning("Получен SIGINT: новые цели не запускаются, ожидаем завершения текущих (повторный Ctrl+C прервёт их)")
+            request_drain()
+
+    reset_drain()
+    try:
+        loop.add_signal_handler(signal.SIGINT, on_sigint)
+    except (NotImplementedError, RuntimeError):
+        # Windows: обработчики сигналов в цикле событий не поддерживаются, остаётся KeyboardInterrupt
+        pass
+    try:
+        yield
+    finally:
+        try:
+            loop.remove_signal_handler(signal.SIGINT)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+async def run_batch(jobs, limits=None):
+    """
+    Выполняет все запуски в одном цикле событий и возвращает код завершения.
+    Каждый запуск — отдельное задание планировщика со своим приоритетом; их прогресс периодически пишется в журнал.
+    Первый SIGINT останавливает выдачу новых целей и дожидается начатых запусков,
+    второй прерывает их немедленно.
+    """
+    started = time.time()
+    progress = asyncio.create_task(log_progress())
+    try:
+        with graceful_sigint():
+            # Ошибка одного запуска не отменяет остальные: она становится его результатом с ошибкой
+            outcomes = await asyncio.gather(*(run_scheduled(choices, target, limits, refresh, priority)
+                                              for choices, target, refresh, priority in jobs), return_exceptions=True)
+    finally:
+        progress.cancel()
+    results = []
+    for (choices, target, _, _), outcome in zip(jobs, outcomes):
+        if isinstance(outcome, BaseException) and not isinstance(outcome, Exception):
+            # Отмена (повторный SIGINT) и выход процесса не превращаются в результаты
+            raise outcome
+        if isinstance(outcome, Exception):
+            logging.error(f"Запуск {','.join(choices)} для {target} прерван ошибкой: {outcome}")
+            outcome = [error_result(choice, target, outcome) for choice in choices]
+        results.extend(outcome)
+    failed = [result for result in results if not result.ok]
+    logging.info(f"Пакетный запуск завершён: {len(results) - len(failed)} успешно, {len(failed)} с ошибкой")
+    if any(result.run_id for result in results):
+        get_store().flush()
+        logging.info(f"Результаты сохранены в {get_store().path}")
+        if store.diff_mode:
+            report_changes(started)
+    for result in failed:
+        logging.error(f"{result.tool} {result.target}: {result.error or f'код возврата {result.returncode}'}")
+    if draining():
+        logging.warning("Запуск остановлен досрочно; для продолжения повторите команду с тем же --journal")
+        return EXIT_INTERRUPTED
+    # Пустой результат допустим, если все цели уже выполнены по журналу
+    return EXIT_FAILED if failed or not (results or journal.skipped()) else EXIT_OK
+
+def report_changes(since):
+    """
+    Печатает в stdout отличия запусков этого пакета от прошлых снимков (по одному JSON на строку).
+    """
+    changes = get_store().find_changes(since=since, limit=-1)
+    for change in changes:
+        print(json.dumps({key: change[key] for key in ("change", "tool", "target", "kind", "value")}, ensure_ascii=False))
+    added = sum(change["change"] == "+" for change in changes)
+    targets = len({(change["tool"], change["target"]) for change in changes})
+    logging.info(f"Изменения с прошлого запуска: {added} добавлено, {len(changes) - added} пропало, целей с изменениями: {targets}")
+
+def allowed_file(path, targets_dir):
+    # Файл целей внутри targets_dir (с учётом символических ссылок)
+    root = os.path.realpath(targets_dir)
+    return os.path.commonpath([root, os.path.realpath(path)]) == root
+
+def parse_job(payload, local=True, targets_dir=None):
+    """
+    Проверяет задание, пришедшее в API демона, и возвращает его описание.
+    Ошибки клиента — ValueError: демон отвечает на них 400.
+    Файлы целей принимаются только из targets_dir, если она задана, а без неё — только
+    от клиентов Unix-сокета (local): по TCP без аутентификации нельзя читать файлы сервера.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("Задание должно быть JSON-объектом")
+    choices = parse_tools(payload.get("tools", ""))
+    unavailable = [choice for choice in choices if not preflight(choice).ok]
+    if unavailable:
+        raise ValueError(f"Инструменты недоступны: {', '.join(unavailable)}")
+    targets = payload.get("targets", [])
+    if isinstance(targets, str):
+        targets = [targets]
+    if not targets:
+        raise ValueError("Для задания не указаны цели")
+    specs = [get_tool(choice) for choice in choices]
+    for target in targets:
+        # stdin демона не связан с клиентом
+        if not isinstance(target, str) or target == "-" or not is_valid_target(target, specs):
+            raise ValueError(f"Недействительная цель: {target}")
+        if is_target_source(target) and (not allowed_file(target, targets_dir) if targets_dir else not local):
+            raise ValueError(f"Файл целей {target} недоступен: " + (
+                f"разрешены только файлы из {targets_dir}" if targets_dir else "по TCP принимаются только домены"))
+    priority = payload.get("priority", DEFAULT_PRIORITY)
+    parse_priority(priority)
+    return {"tools": choices, "targets": targets, "refresh": parse_refresh(payload.get("refresh", False)),
+            "limits": parse_limits(payload.get("concurrency", {})), "priority": priority}
+
+async def run_job(spec):
+    """
+    Выполняет задание демона. Отдельные домены передаются инструментам одним списком,
+    чтобы работали пакетные запуски и общий отсев повторов, файлы — как есть.
+    Демон выполняет задание в его доле планировщика (tools.scheduler); здесь оценивается её объём.
+    """
+    current_share.get().total = await asyncio.to_thread(count_units, spec["tools"], spec["targets"])
+    domains = [target for target in spec["targets"] if not is_target_source(target)]
+    files = [target for target in spec["targets"] if is_target_source(target)]
+    run = lambda target: run_pipeline(spec["tools"], target, spec["limits"], spec["refresh"])
+    if len(domains) > 1:
+        with target_file(domains, name="targets") as path:
+            results = await asyncio.gather(run(path), *map(run, files))
+    else:
+        results = await asyncio.gather(*map(run, domains + files))
+    return [result for target_results in results for result in target_results]
+
+def queue_tasks(jobs):
+    # Каждая цель из файлов — отдельное задание: исполнители на других узлах не видят локальных файлов
+    for choices, target, refresh, _ in jobs:
+        for choice in choices:
+            kind = "username" if get_tool(choice).input_kind == "username" else "domain"
+            for item in iter_targets(target, kind=kind):
+                yield choice, item, refresh
+
+async def coordinate(queue, jobs, wait):
+    """
+    Ставит запуски в общую очередь и, если нужно, собирает результаты исполнителей в локальное хранилище.
+    """
+    batch, total = await asyncio.to_thread(queue.enqueue, queue_tasks(jobs))
+    logging.info(f"В очередь {queue.path} поставлено {total} заданий, партия {batch}")
+    print(batch)
+    if not wait:
+        return EXIT_OK
+    results = []
+
+    def on_result(result):
+        results.append(result)
+        save_run(result)
+
+    with graceful_sigint():
+        counts = await workqueue.wait_batch(queue, batch, on_result)
+    get_store().flush()
+    failed = [result for result in results if not result.ok]
+    logging.info(f"Партия {batch}: {len(results) - len(failed)} успешно, {len(failed)} с ошибкой; результаты в {get_store().path}")
+    if draining():
+        logging.warning(f"Ожидание прервано; партия продолжает выполняться, осталось {counts['pending'] + counts['leased']} заданий")
+        return EXIT_INTERRUPTED
+    return EXIT_FAILED if failed else EXIT_OK
+
+async def work(queue, slots, until_empty):
+    """
+    Исполнитель общей очереди: выполняет задания теми же обёртками, что и пакетный режим.
+    """
+    # Исполнитель берёт только задания установленных у него инструментов: недоступный инструмент
+    # не должен превращаться в выполненное задание, его выполнит другой узел
+    checks = [preflight(spec.name) for spec in get_registry().values()]
+    tools = [check.name for check in checks if check.ok]
+    for check in checks:
+        if not check.ok:
+            logging.warning(f"Инструмент {check.name} недоступен ({check.reason}), его задания исполнитель не берёт")
+    if not tools:
+        logging.error("Ни один инструмент не доступен, исполнителю нечего выполнять")
+        return EXIT_UNAVAILABLE
+    logging.info(f"Исполнитель {queue.worker}: очередь {queue.path}, слотов {slots}, инструменты: {', '.join(tools)}")
+    with graceful_sigint():
+        completed = await workqueue.run_worker(
+            queue, lambda task: execute_tool(task.tool, task.target, max_concurrency=1, refresh=task.refresh), slots,
+            until_empty, tools
+        )
+    logging.info(f"Исполнитель {queue.worker}: выполнено {completed} заданий")
+    return EXIT_INTERRUPTED if draining() else EXIT_OK
+
+def distributed(args):
+    """
+    Режимы общей очереди: --enqueue (координатор) и --worker (исполнитель).
+    """
+    try:
+        queue = workqueue.WorkQueue(args.queue)
+        if args.worker:
+            return asyncio.run(work(queue, args.slots, args.until_empty))
+        jobs, _, output_dir = build_jobs(args)
+        if output_dir:
+            set_output_root(output_dir)
+        return asyncio.run(coordinate(queue, jobs, args.wait))
+    except (ValueError, OSError, sqlite3.Error) as e:
+        logging.error(e)
+        return EXIT_USAGE
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        return EXIT_INTERRUPTED
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный запуск инструментов без интерактивного меню.")
+    parser.add_argument("-t", "--tools", help="номера или имена инструментов через запятую, например 1,hatcloud")
+    parser.add_argument("-d", "--target", action="append", default=[], help="домен (можно указать несколько раз)")
+    parser.add_argument("-f", "--targets-file", action="append", default=[], help="файл с доменами, .gz или - для stdin (можно указать несколько раз)")
+    parser.add_argument("-c", "--concurrency", action="append", default=[], metavar="КЛАСС=N",
+                        help=f"лимит параллельности для класса инструментов: {', '.join(concurrency_limits)}")
+    parser.add_argument("-o", "--output-dir", help="директория для файлов результатов")
+    parser.add_argument("-j", "--job-file", help="JSON- или YAML-файл с описанием запусков")
+    parser.add_argument("--refresh", action="store_true", help="игнорировать кэш результатов")
+    parser.add_argument("--priority", default=DEFAULT_PRIORITY,
+                        help=f"приоритет заданий при общем бюджете процессов: {', '.join(PRIORITIES)} или вес числом")
+    parser.add_argument("--dns-prefilter", action="store_true",
+                        help="не запускать DNS-инструменты для целей без A-записей (проверка встроенным резолвером)")
+    parser.add_argument("--diff", action="store_true",
+                        help="выводить только отличия от прошлого запуска; цепочка пропускает неизменившиеся цели")
+    parser.add_argument("--journal", help="журнал выполненных целей: при повторном запуске они пропускаются")
+    parser.add_argument("--daemon", action="store_true",
+                        help="работать демоном и принимать задания через HTTP API (см. tools/daemon.py)")
+    parser.add_argument("--socket", default=daemon.DEFAULT_SOCKET_PATH, help="Unix-сокет API демона")
+    parser.add_argument("--listen", metavar="ХОСТ:ПОРТ", help="также принимать задания по TCP (без аутентификации)")
+    parser.add_argument("--targets-dir", default=os.environ.get("CFD_DAEMON_TARGETS_DIR"),
+                        help="демон принимает файлы целей только из этой директории (без неё — только через Unix-сокет)")
+    parser.add_argument("--queue", default=workqueue.DEFAULT_QUEUE_PATH, help="SQLite-файл общей очереди заданий")
+    parser.add_argument("--enqueue", action="store_true", help="поставить запуски в общую очередь вместо выполнения")
+    parser.add_argument("--wait", action="store_true", help="с --enqueue: дождаться исполнителей и собрать результаты")
+    parser.add_argument("--worker", action="store_true", help="выполнять задания из общей очереди")
+    parser.add_argument("--slots", type=int, default=os.cpu_count() or 1, help="число одновременных заданий исполнителя")
+    parser.add_argument("--until-empty", action="store_true", help="с --worker: завершиться, когда очередь опустеет")
+    parser.add_argument("--metrics-file", help="файл для метрик в формате Prometheus")
+    parser.add_argument("--metrics-json", help="файл для JSON-сводки метрик по инструментам")
+    return parser.parse_args(argv)
+
+def serve(args):
+    """
+    Режим демона: один цикл событий на все задания, кэши и пулы общие.
+    """
+    if args.output_dir:
+        set_output_root(args.output_dir)
+    if args.dns_prefilter:
+        dns.set_prefilter(True)
+    try:
+        validate = lambda payload, local: parse_job(payload, local, args.targets_dir)
+        asyncio.run(daemon.serve(validate, run_job, args.socket, args.listen))
+    except (OSError, ValueError) as e:
+        logging.error(f"Не удалось запустить демон: {e}")
+        return EXIT_USAGE
+    finally:
+        if args.metrics_file:
+            metrics.write_prometheus(args.metrics_file)
+        logging.info(f"Метрики демона:\n{metrics.write_summary(args.metrics_json)}")
+    return EXIT_OK
+
+def cli(argv=None):
+    args = parse_args(argv)
+    logs.setup_logging()
+    if args.daemon:
+        return serve(args)
+    if args.enqueue or args.worker:
+        try:
+            return distributed(args)
+        finally:
+            if args.metrics_file:
+                metrics.write_prometheus(args.metrics_file)
+    try:
+        jobs, limits, output_dir = build_jobs(args)
+    except (ValueError, OSError) as e:
+        logging.error(e)
+        return EXIT_USAGE
+
+    # Задания для недоступных инструментов не ставятся в очередь вовсе
+    unavailable = {choice for choices, _, _, _ in jobs for choice in choices if not preflight(choice).ok}
+    for name in sorted(unavailable):
+        logging.error(f"Инструмент {name} недоступен ({preflight(name).reason}), его задания пропущены")
+    jobs = [([choice for choice in choices if choice not in unavailable], *job) for choices, *job in jobs]
+    jobs = [job for job in jobs if job[0]]
+    if not jobs:
+        return EXIT_UNAVAILABLE
+
+    if output_dir:
+        set_output_root(output_dir)
+    if args.dns_prefilter:
+        dns.set_prefilter(True)
+    if args.diff:
+        store.set_diff_mode(True)
+    try:
+        if args.journal:
+            journal.open_journal(args.journal)
+        code = asyncio.run(run_batch(jobs, limits))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        return EXIT_INTERRUPTED
+    except OSError as e:
+        logging.error(f"Не удалось открыть журнал {args.journal}: {e}")
+        return EXIT_USAGE
+    finally:
+        journal.close_journal()
+        # Сводка пишется и при прерывании, чтобы было видно, где ушло время
+        if args.metrics_file:
+            metrics.write_prometheus(args.metrics_file)
+        logging.info(f"Метрики запуска:\n{metrics.write_summary(args.metrics_json)}")
+    return EXIT_FAILED if unavailable and code == EXIT_OK else code
+
 if __name__ == "__main__":
+    # С аргументами — пакетный режим, без них — интерактивное меню
+    if len(sys.argv) > 1:
+        sys.exit(cli())
+    logs.setup_logging()
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""
+Бенчмарк execute_tool и обёрток run_* на заглушках инструментов (bench/stub_tool.py).
+Работает без сети: в PATH подкладываются поддельные subfinder, cloudfail, maryam, ReconBulk,
+ruby, bash и python3, а скрипты инструментов — в отдельную CFD_TOOLS_HOME.
+
+Каждый сценарий (инструмент × размер списка) запускается в отдельном процессе,
+чтобы пиковый RSS не накапливался между сценариями.
+
+Пример:
+    python bench/run_bench.py --tools subfinder,hatcloud --sizes 1,100,10000 --latency 0.01 --lines 1000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB = os.path.join(PROJECT_ROOT, "bench", "stub_tool.py")
+
+STUB_BINARIES = ("subfinder", "cloudfail", "maryam", "ReconBulk", "ruby", "bash", "python3")
+STUB_SCRIPTS = (
+    "hatcloud.rb",
+    "sudomy.py",
+    os.path.join("CloudUnflare", "cloudunflare.bash"),
+    os.path.join("bypass-firewalls-by-DNS-history", "bypass-firewalls-by-DNS-history.sh"),
+    os.path.join("osrframework", "usufy.py"),
+    os.path.join("catphish", "catphish.rb"),
+)
+DEFAULT_TOOLS = "subfinder,cloudfail,reconbulk,hatcloud,maryam,cloudunflare,bypass_firewall,osrframework,catphish,sudomy"
+
+
+def prepare_stubs(workdir: str) -> dict:
+    """
+    Создаёт заглушки и возвращает окружение для процесса-исполнителя сценария.
+    """
+    bin_dir = os.path.join(workdir, "bin")
+    tools_home = os.path.join(workdir, "tools_home")
+    os.makedirs(bin_dir)
+    with open(STUB) as f:
+        # Абсолютный путь к интерпретатору, чтобы поддельный python3 в PATH не подменил сам себя
+        stub_source = f"#!{sys.executable}\n{f.read()}"
+    for name in STUB_BINARIES:
+        path = os.path.join(bin_dir, name)
+        with open(path, "w") as f:
+            f.write(stub_source)
+        os.chmod(path, 0o755)
+    for script in STUB_SCRIPTS:
+        path = os.path.join(tools_home, script)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write("# заглушка\n")
+
+    env = dict(os.environ)
+    env.update({
+        "PATH": f"{bin_dir}{os.pathsep}{env.get('PATH', '')}",
+        "CFD_TOOLS_HOME": tools_home,
+        "CFD_CACHE_PATH": os.path.join(workdir, "cache.sqlite"),
+        "CFD_OUTPUT_DIR": os.path.join(workdir, "out"),
+        "PYTHONPATH": PROJECT_ROOT,
+    })
+    return env
+
+
+async def run_scenario(tool: str, size: int, entry: str, concurrency: int, workdir: str) -> dict:
+    sys.path.insert(0, PROJECT_ROOT)
+    import app
+    from tools import metrics
+    from tools.registry import get_tool, load_tool
+
+    # Логирование каждого запуска исказило бы замер
+    logging.getLogger().setLevel(logging.WARNING)
+
+    targets_file = os.path.join(workdir, f"targets_{size}.txt")
+    with open(targets_file, "w") as f:
+        for i in range(size):
+            f.write(f"d{i}.bench.test\n")
+
+    spec = get_tool(tool)
+    started = time.perf_counter()
+    if entry == "execute_tool":
+        results = await app.execute_tool(spec.name, targets_file, max_concurrency=concurrency or None, refresh=True)
+    else:
+        limit = concurrency or app.concurrency_limits[spec.concurrency_class]
+        results = await load_tool(spec)(targets_file, output_to_file=True, max_concurrency=limit, refresh=True)
+    elapsed = time.perf_counter() - started
+
+    stats = metrics.summary().get(spec.name, {})
+    return {
+        "tool": spec.name,
+        "entry": entry,
+        "targets": size,
+        "seconds": elapsed,
+        "targets_per_second": size / elapsed if elapsed else 0.0,
+        "results": len(results),
+        "failed": sum(1 for result in results if not result.ok),
+        "records": sum(len(result.records) for result in results),
+        "spawns": stats.get("runs", 0),
+        "run_p50": stats.get("wall_seconds_p50", 0.0),
+        "run_p95": stats.get("wall_seconds_p95", 0.0),
+        "run_p99": stats.get("wall_seconds_p99", 0.0),
+        # ru_maxrss в Linux — килобайты
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "children_peak_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Оффлайн-бенчмарк обёрток инструментов на заглушках.")
+    parser.add_argument("--tools", default=DEFAULT_TOOLS, help="имена инструментов через запятую")
+    parser.add_argument("--sizes", default="1,10,100,1000", help="размеры списков доменов через запятую (до 100000)")
+    parser.add_argument("--entry", choices=("execute_tool", "run"), default="execute_tool",
+                        help="что замерять: execute_tool из app.py или функцию run_* напрямую")
+    parser.add_argument("--concurrency", type=int, default=0, help="лимит параллельности (0 — лимит класса инструмента)")
+    parser.add_argument("--lines", type=int, default=100, help="строк вывода заглушки на домен")
+    parser.add_argument("--latency", type=float, default=0.05, help="средняя задержка заглушки, секунды")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="доля запусков заглушки с ошибкой")
+    parser.add_argument("--transient", action="store_true", help="ошибки заглушки выглядят временными (с повторами)")
+    parser.add_argument("--json", help="файл для сохранения результатов в JSON")
+    parser.add_argument("--worker", nargs=3, metavar=("TOOL", "SIZE", "WORKDIR"), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.worker:
+        tool, size, workdir = args.worker
+        report = asyncio.run(run_scenario(tool, int(size), args.entry, args.concurrency, workdir))
+        print(json.dumps(report))
+        return 0
+
+    workdir = tempfile.mkdtemp(prefix="cfd_bench_")
+    reports = []
+    try:
+        env = prepare_stubs(workdir)
+        env.update({
+            "CFD_STUB_LINES": str(args.lines),
+            "CFD_STUB_LATENCY": str(args.latency),
+            "CFD_STUB_FAIL_RATE": str(args.fail_rate),
+            "CFD_STUB_TRANSIENT": "1" if args.transient else "0",
+        })
+        print(f"{'инструмент':<16}{'целей':>8}{'сек':>9}{'целей/с':>10}{'ошибок':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'RSS МБ':>8}")
+        for tool in args.tools.split(","):
+            for size in (int(size) for size in args.sizes.split(",")):
+                command = [sys.executable, os.path.abspath(__file__), "--entry", args.entry,
+                           "--concurrency", str(args.concurrency), "--worker", tool, str(size), workdir]
+                completed = subprocess.run(command, env=env, capture_output=True, text=True)
+                if completed.returncode != 0:
+                    print(f"{tool:<16}{size:>8}  ошибка сценария: {completed.stderr.strip().splitlines()[-1:]}")
+                    continue
+                report = json.loads(completed.stdout.strip().splitlines()[-1])
+                reports.append(report)
+                print(f"{report['tool']:<16}{size:>8}{report['seconds']:>9.2f}{report['targets_per_second']:>10.1f}"
+                      f"{report['failed']:>8}{report['run_p50']:>8.3f}{report['run_p95']:>8.3f}{report['run_p99']:>8.3f}"
+                      f"{report['peak_rss_kb'] / 1024:>8.1f}")
+                # Файлы результатов сценария больше не нужны и только занимают диск
+                shutil.rmtree(env["CFD_OUTPUT_DIR"], ignore_errors=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
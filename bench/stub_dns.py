@@ -0,0 +1,92 @@
+"""
+Заглушка DNS-сервера для проверки и бенчмарков tools/dns.py без сети.
+
+Отвечает на A-запросы к любому имени детерминированным адресом из 198.18.0.0/15 с TTL 300;
+имена, начинающиеся с "nx", получают NXDOMAIN (с SOA в authority), "cf" — адрес из диапазона Cloudflare.
+
+Пример:
+    python bench/stub_dns.py --port 5353 &
+    CFD_DNS_SERVERS=127.0.0.1:5353 CFD_DNS_PREFILTER=1 python app.py -t hatcloud -f domains.txt
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import socket
+import struct
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.dns import QTYPES, RCODE_NXDOMAIN, _read_name  # noqa: E402
+
+
+def encode_name(name: str) -> bytes:
+    return b"".join(len(label).to_bytes(1, "big") + label.encode() for label in name.split(".") if label) + b"\x00"
+
+
+def answer(query: bytes) -> bytes:
+    qid = struct.unpack_from("!H", query)[0]
+    name, offset = _read_name(query, 12)
+    qtype = struct.unpack_from("!H", query, offset)[0]
+    question = query[12:offset + 4]
+    first = name.split(".", 1)[0]
+    if first.startswith("nx"):
+        zone = name.split(".", 1)[-1]
+        soa = encode_name(f"ns.{zone}") + encode_name(f"hostmaster.{zone}") + struct.pack("!IIIII", 1, 3600, 600, 86400, 60)
+        authority = encode_name(zone) + struct.pack("!HHIH", QTYPES["SOA"], 1, 300, len(soa)) + soa
+        return struct.pack("!HHHHHH", qid, 0x8180 | RCODE_NXDOMAIN, 1, 0, 1, 0) + question + authority
+    if qtype != QTYPES["A"]:
+        return struct.pack("!HHHHHH", qid, 0x8180, 1, 0, 0, 0) + question
+    digest = hashlib.md5(name.encode()).digest()
+    address = bytes([104, 16, digest[0], digest[1]]) if first.startswith("cf") else bytes([198, 18 + digest[0] % 2, digest[1], digest[2]])
+    # Ответ ссылается на имя из вопроса через указатель сжатия (0xC00C)
+    record = b"\xc0\x0c" + struct.pack("!HHIH", QTYPES["A"], 1, 300, 4) + address
+    return struct.pack("!HHHHHH", qid, 0x8180, 1, 1, 0, 0) + question + record
+
+
+class StubDnsProtocol(asyncio.DatagramProtocol):
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.queries = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.queries += 1
+        response = answer(data)
+        if self.latency:
+            asyncio.get_running_loop().call_later(self.latency, self.transport.sendto, response, addr)
+        else:
+            self.transport.sendto(response, addr)
+
+
+async def serve(host: str, port: int, latency: float) -> None:
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    sock.bind((host, port))
+    transport, protocol = await loop.create_datagram_endpoint(lambda: StubDnsProtocol(latency), sock=sock)
+    print(f"Заглушка DNS слушает {host}:{port}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        transport.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Заглушка DNS-сервера (UDP).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5353)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, секунды")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.latency))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""
+Заглушка внешнего инструмента для бенчмарков: subfinder, cloudfail, maryam, ReconBulk,
+ruby/bash/python3 со скриптами инструментов. Сеть не используется.
+
+Поведение задаётся переменными окружения:
+    CFD_STUB_LINES      — число строк вывода на домен (по умолчанию 100)
+    CFD_STUB_LATENCY    — средняя задержка запуска в секундах (по умолчанию 0.05)
+    CFD_STUB_FAIL_RATE  — доля запусков, завершающихся ошибкой (по умолчанию 0)
+    CFD_STUB_TRANSIENT  — 1, если ошибки должны выглядеть временными (будут повторы)
+"""
+import os
+import random
+import sys
+import time
+
+
+def domains_from_args(args):
+    # ReconBulk получает файл с доменами через -f, subfinder в пакетном режиме — через -dL,
+    # остальные инструменты — домен аргументом
+    for option in ("-f", "-dL"):
+        if option in args:
+            with open(args[args.index(option) + 1]) as f:
+                return [line.strip() for line in f if line.strip()]
+    candidates = [arg for arg in args if "." in arg and not arg.startswith("-") and not os.path.isfile(arg)]
+    return candidates[:1] or ["example.com"]
+
+
+def main():
+    name = os.path.basename(sys.argv[1] if len(sys.argv) > 1 and os.path.isfile(sys.argv[1]) else sys.argv[0])
+    lines = int(os.environ.get("CFD_STUB_LINES", "100"))
+    latency = float(os.environ.get("CFD_STUB_LATENCY", "0.05"))
+    fail_rate = float(os.environ.get("CFD_STUB_FAIL_RATE", "0"))
+
+    if latency > 0:
+        time.sleep(random.expovariate(1 / latency))
+    if random.random() < fail_rate:
+        if os.environ.get("CFD_STUB_TRANSIENT") == "1":
+            sys.stderr.write("Connection reset by peer\n")
+        else:
+            sys.stderr.write(f"{name}: fatal error\n")
+        return 1
+
+    out = sys.stdout
+    for domain in domains_from_args(sys.argv[1:]):
+        for i in range(lines):
+            if "subfinder" in name or "sudomy" in name:
+                out.write(f"sub{i}.{domain}\n")
+            elif any(tool in name for tool in ("cloudfail", "hatcloud", "cloudunflare", "bypass")):
+                out.write(f"[+] {domain} candidate 198.18.{i // 256 % 256}.{i % 256} / 8.{i % 256}.{i // 256 % 256}.1\n")
+            else:
+                out.write(f"[{name}] {domain} finding {i}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+import argparse
+import json
+
+import pytest
+
+import app
+
+
+def build(tmp_path, jobs):
+    job_file = tmp_path / "jobs.json"
+    job_file.write_text(json.dumps({"jobs": jobs}))
+    args = argparse.Namespace(job_file=str(job_file), concurrency=[], output_dir=None, tools=None, target=[],
+                              targets_file=[], refresh=False, priority="normal")
+    return app.build_jobs(args)[0]
+
+
+def test_build_jobs_accepts_single_target_string(tmp_path):
+    assert build(tmp_path, [{"tools": "hatcloud", "targets": "x.example.com"}]) == [
+        (["hatcloud"], "x.example.com", False, "normal")]
+
+
+@pytest.mark.parametrize("job", [
+    "a.example",
+    {"tools": "hatcloud", "targets": ["x.example.com"], "refresh": "false"},
+    {"tools": "hatcloud", "targets": 5},
+    {"tools": "hatcloud", "targets_files": "/nonexistent/targets.txt"},
+])
+def test_build_jobs_rejects_malformed_job(tmp_path, job):
+    with pytest.raises(ValueError):
+        build(tmp_path, [job])
+
+
+def test_parse_tools_accepts_string_and_list():
+    assert app.parse_tools("hatcloud, subfinder") == app.parse_tools(["hatcloud", "subfinder"]) == ["hatcloud", "subfinder"]
+
+
+@pytest.mark.parametrize("payload", [
+    [],
+    {"tools": 123, "targets": ["x.example.com"]},
+    {"tools": ["hatcloud", 1], "targets": ["x.example.com"]},
+    {"tools": "", "targets": ["x.example.com"]},
+])
+def test_parse_job_rejects_malformed_tools(payload):
+    with pytest.raises(ValueError, match="JSON-объектом|Инструменты задаются|Не указан"):
+        app.parse_job(payload)
+
+
+@pytest.mark.parametrize("value", [5, "hatcloud=2", ["unknown=2"], ["network=0"]])
+def test_parse_limits_rejects_malformed_concurrency(value):
+    with pytest.raises(ValueError):
+        app.parse_limits(value)
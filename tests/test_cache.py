@@ -0,0 +1,55 @@
+import pytest
+
+from tools.cache import ResultCache
+from tools.results import ToolResult
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"), flush_interval=0.01)
+    yield cache
+    cache.close()
+
+
+def test_put_is_readable_before_and_after_write(cache):
+    cache.put(ToolResult("hatcloud", "a.test", 0), ["ruby", "hatcloud.rb", "a.test"])
+    assert cache.get("hatcloud", "a.test", ["ruby", "hatcloud.rb", "a.test"]) is not None
+    cache.flush()
+    assert cache.get("hatcloud", "a.test", ["ruby", "hatcloud.rb", "a.test"]).target == "a.test"
+    assert cache.get("hatcloud", "a.test", ["ruby", "hatcloud.rb", "-v", "a.test"]) is None
+
+
+def test_failed_results_are_not_cached(cache):
+    cache.put(ToolResult("hatcloud", "a.test", 1), ["hatcloud"])
+    assert cache.get("hatcloud", "a.test", ["hatcloud"]) is None
+
+
+def test_file_target_is_keyed_by_contents(cache, tmp_path):
+    targets = tmp_path / "r.txt"
+    targets.write_text("a.test\n")
+    command = ["ReconBulk", "-f", str(targets)]
+    cache.put(ToolResult("reconbulk", str(targets), 0), command)
+    assert cache.get("reconbulk", str(targets), command) is not None
+
+    targets.write_text("a.test\nb.test\nc.test\n")
+    assert cache.get("reconbulk", str(targets), command) is None
+
+    # Тот же список в другом файле (временный файл следующего запуска) — попадание
+    copy = tmp_path / "copy.txt"
+    copy.write_text("a.test\n")
+    assert cache.get("reconbulk", str(copy), ["ReconBulk", "-f", str(copy)]) is not None
+
+
+def test_eviction_keeps_size_under_limit(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"), max_bytes=2000, flush_interval=0.01)
+    try:
+        for i in range(100):
+            cache.put(ToolResult("hatcloud", f"{i}.test", 0), ["hatcloud", f"{i}.test"])
+        cache.flush()
+        total, rows = cache.db.execute("SELECT SUM(size), COUNT(*) FROM cache").fetchone()
+        assert total <= 2000 and 0 < rows < 100
+        # Вытесняются давно не читанные записи, последние остаются
+        assert cache.get("hatcloud", "99.test", ["hatcloud", "99.test"]) is not None
+        assert cache.get("hatcloud", "0.test", ["hatcloud", "0.test"]) is None
+    finally:
+        cache.close()
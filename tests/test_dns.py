@@ -0,0 +1,144 @@
+"""
+Резолвер tools/dns.py против заглушки DNS-сервера (bench/stub_dns.py) на свободном локальном порту.
+"""
+import asyncio
+import struct
+
+import pytest
+
+from stub_dns import StubDnsProtocol, answer, encode_name
+from tools import dns
+from tools.dns import QTYPES, RCODE_NOERROR, RCODE_NXDOMAIN, RCODE_SERVFAIL, Resolver, build_query, parse_response
+
+
+class DroppingDnsProtocol(StubDnsProtocol):
+    # Теряет первые drop запросов: проверка повторов по таймауту
+    def __init__(self, drop: int):
+        super().__init__(0.0)
+        self.drop = drop
+
+    def datagram_received(self, data, addr):
+        if self.drop:
+            self.drop -= 1
+            self.queries += 1
+            return
+        super().datagram_received(data, addr)
+
+
+async def start_stub(protocol_factory=lambda: StubDnsProtocol(0.0)):
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(protocol_factory, local_addr=("127.0.0.1", 0))
+    return transport, protocol, transport.get_extra_info("sockname")[1]
+
+
+def run_with_stub(scenario, protocol_factory=lambda: StubDnsProtocol(0.0), **resolver_options):
+    async def main():
+        transport, protocol, port = await start_stub(protocol_factory)
+        resolver = Resolver([("127.0.0.1", port)], **resolver_options)
+        try:
+            return await scenario(resolver, protocol)
+        finally:
+            resolver.close()
+            transport.close()
+    return asyncio.run(main())
+
+
+def test_parse_response_follows_compression_pointer():
+    response = answer(build_query(0x1234, "www.example.test", "A"))
+    qid, rcode, question, records, negative_ttl = parse_response(response)
+    assert (qid, rcode, question, negative_ttl) == (0x1234, RCODE_NOERROR, "www.example.test", None)
+    # Имя ответа записано указателем 0xC00C на имя из вопроса
+    assert response[len(build_query(0, "www.example.test", "A")):][:2] == b"\xc0\x0c"
+    [(name, rtype, ttl, address)] = records
+    assert (name, rtype, ttl) == ("www.example.test", QTYPES["A"], 300)
+    assert address.startswith("198.1")
+
+
+def test_parse_response_reads_cname_and_soa_minimum():
+    query = build_query(7, "alias.example.test", "A")
+    question = query[12:]
+    cname = b"\xc0\x0c" + struct.pack("!HHIH", QTYPES["CNAME"], 1, 120, 6) + b"\x03www\xc0\x12"
+    soa_rdata = encode_name("ns.example.test") + encode_name("hostmaster.example.test") + struct.pack("!IIIII", 1, 2, 3, 4, 30)
+    soa = b"\xc0\x12" + struct.pack("!HHIH", QTYPES["SOA"], 1, 90, len(soa_rdata)) + soa_rdata
+    response = struct.pack("!HHHHHH", 7, 0x8180, 1, 1, 1, 0) + question + cname + soa
+    _, _, _, records, negative_ttl = parse_response(response)
+    assert records == [("alias.example.test", QTYPES["CNAME"], 120, "www.example.test")]
+    # RFC 2308: min(TTL записи SOA, поле MINIMUM)
+    assert negative_ttl == 30
+
+
+def test_read_name_rejects_pointer_loop():
+    looped = b"\x00" * 12 + b"\xc0\x0c"
+    with pytest.raises(ValueError):
+        dns._read_name(looped, 12)
+
+
+def test_resolve_and_cache_positive_answer():
+    async def scenario(resolver, protocol):
+        first = await resolver.resolve("Host.Example.Test.")
+        second = await resolver.resolve("host.example.test")
+        return first, second, protocol.queries
+
+    first, second, queries = run_with_stub(scenario)
+    assert first.ok and first.ttl == 300 and first.name == "host.example.test"
+    assert second == first
+    assert queries == 1
+
+
+def test_negative_answer_cached_with_soa_ttl():
+    async def scenario(resolver, protocol):
+        first = await resolver.resolve("nxhost.example.test")
+        second = await resolver.resolve("nxhost.example.test")
+        return first, second, protocol.queries
+
+    first, second, queries = run_with_stub(scenario)
+    assert first.rcode == RCODE_NXDOMAIN and not first.ok
+    # Заглушка отвечает SOA с TTL 300 и MINIMUM 60
+    assert first.ttl == 60
+    assert second == first and queries == 1
+
+
+def test_concurrent_queries_for_one_name_are_coalesced():
+    async def scenario(resolver, protocol):
+        answers = await asyncio.gather(*(resolver.resolve("same.example.test") for _ in range(20)))
+        return answers, protocol.queries
+
+    answers, queries = run_with_stub(scenario, lambda: StubDnsProtocol(0.05))
+    assert len({answer.addresses for answer in answers}) == 1
+    assert queries == 1
+
+
+def test_lost_query_is_retried():
+    async def scenario(resolver, protocol):
+        return await resolver.resolve("retry.example.test"), protocol.queries
+
+    result, queries = run_with_stub(scenario, lambda: DroppingDnsProtocol(drop=1), timeout=0.2)
+    assert result.ok
+    assert queries == 2
+
+
+def test_no_answer_after_all_attempts_is_servfail_and_not_cached():
+    async def scenario(resolver, protocol):
+        first = await resolver.resolve("lost.example.test")
+        return first, resolver._cached(("lost.example.test", "A")), protocol.queries
+
+    result, cached, queries = run_with_stub(scenario, lambda: DroppingDnsProtocol(drop=100), timeout=0.1, attempts=2)
+    assert result.rcode == RCODE_SERVFAIL and result.error
+    assert cached is None
+    assert queries == 2
+
+
+def test_prefilter_skips_names_without_a_records(monkeypatch):
+    async def scenario(resolver, protocol):
+        monkeypatch.setattr(dns, "_default_resolver", resolver)
+        return [name async for name in dns.prefilter(["a.example.test", "nxb.example.test", "c.example.test"])]
+
+    monkeypatch.setattr(dns, "prefilter_enabled", True)
+    kept = run_with_stub(scenario)
+    assert sorted(kept) == ["a.example.test", "c.example.test"]
+
+
+def test_prefilter_disabled_passes_targets_through(monkeypatch):
+    monkeypatch.setattr(dns, "prefilter_enabled", False)
+    targets = ["a.example.test", "nxb.example.test"]
+    assert dns.prefilter(targets) is targets
@@ -0,0 +1,18 @@
+from tools.batch import target_file
+from tools.reconbulk import chunk_label
+from tools.targets import spool_targets
+
+
+def test_chunk_label_of_temporary_list_does_not_depend_on_path(tmp_path):
+    chunk = ["a.example.test", "b.example.test"]
+    first, second = spool_targets(chunk), spool_targets(chunk)
+    assert first != second
+    assert chunk_label(first, chunk) == chunk_label(second, chunk)
+    assert chunk_label(first, chunk).startswith("targets#")
+    with target_file(chunk, name="targets") as path:
+        assert chunk_label(path, chunk) == chunk_label(first, chunk)
+
+    listed = tmp_path / "list.txt"
+    listed.write_text("\n".join(chunk) + "\n")
+    assert chunk_label(str(listed), chunk).startswith(f"{listed}#")
+    assert chunk_label("a.example.test", ["a.example.test"]) == "a.example.test"
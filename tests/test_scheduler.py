@@ -0,0 +1,155 @@
+import asyncio
+
+import pytest
+
+from tools.scheduler import PRIORITIES, FairScheduler, PrioritySlots, Share, current_share, job_share, parse_priority
+
+
+def serve(scheduler, shares, rounds, elapsed=1.0, tool="tool", backlog=4):
+    """
+    Один слот: у каждого задания всегда backlog ожидающих процессов (как у пула run_concurrently);
+    возвращает, сколько раз запущен процесс каждого задания.
+    """
+    for share in shares:
+        for _ in range(backlog):
+            scheduler.enqueue(share, tool, 1.0)
+    served = {share.name: 0 for share in shares}
+    for _ in range(rounds):
+        waiter = scheduler.head(lambda waiter: True)
+        estimate = scheduler.start(waiter)
+        # Пул ставит следующий процесс, пока этот выполняется
+        scheduler.enqueue(waiter.share, tool, 1.0)
+        scheduler.finish(waiter, estimate, elapsed)
+        served[waiter.share.name] += 1
+    return served
+
+
+def test_parse_priority():
+    assert parse_priority(None) == PRIORITIES["normal"]
+    assert parse_priority("high") == PRIORITIES["high"]
+    assert parse_priority("2.5") == 2.5
+    for value in ("urgent", 0, -1):
+        with pytest.raises(ValueError):
+            parse_priority(value)
+
+
+def test_service_is_split_by_priority_weight():
+    scheduler = FairScheduler()
+    high = scheduler.open("high", "high")
+    low = scheduler.open("low", "low")
+    served = serve(scheduler, [high, low], 170)
+    assert served["high"] / served["low"] == pytest.approx(16, rel=0.15)
+
+
+def test_new_share_does_not_get_credit_for_idle_time_or_wait_behind_old_one():
+    scheduler = FairScheduler()
+    bulk = scheduler.open("bulk")
+    serve(scheduler, [bulk], 100)
+    small = scheduler.open("small")
+    waiter = scheduler.enqueue(small, "tool", 1.0)
+    # Новое задание встаёт вровень с активным, а не с нулевым временем, но раньше следующего процесса большого
+    assert small.vtime == pytest.approx(bulk.vtime)
+    assert scheduler.head(lambda waiter: True) is waiter
+
+
+def test_tools_share_a_job_fairly():
+    scheduler = FairScheduler()
+    share = scheduler.open("job")
+    for _ in range(3):
+        scheduler.enqueue(share, "slow", 1.0)
+    fast = scheduler.enqueue(share, "fast", 1.0)
+    first = scheduler.head(lambda waiter: True)
+    scheduler.finish(first, scheduler.start(first), 5.0)
+    # После долгого процесса одного инструмента следующим идёт другой инструмент того же задания
+    assert scheduler.head(lambda waiter: True) is fast
+
+
+def test_cancelled_waiter_leaves_queue_and_active_set():
+    scheduler = FairScheduler()
+    share = scheduler.open("job")
+    waiter = scheduler.enqueue(share, "tool", 1.0)
+    version = scheduler.version
+    scheduler.cancel(waiter)
+    assert scheduler.head(lambda waiter: True) is None
+    assert share.active == 0 and scheduler.version > version
+
+
+def test_open_names_are_unique_and_close_finishes_progress():
+    scheduler = FairScheduler()
+    first = scheduler.open("job")
+    second = scheduler.open("job")
+    assert first.name != second.name
+    first.total = 4
+    first.advance(4)
+    scheduler.close(first)
+    assert first.progress() == {"done": 4, "total": 4, "percent": 100.0, "eta_seconds": 0.0}
+    assert first.name not in scheduler.shares
+
+
+def test_progress_without_total_or_start():
+    share = Share("job")
+    assert share.progress() == {"done": 0, "total": 0, "percent": 0.0, "eta_seconds": None}
+    share.advance(3)
+    assert share.progress()["total"] == 3
+
+
+def test_job_share_sets_context():
+    with job_share("job", "low", total=5) as share:
+        assert current_share.get() is share
+        assert share.weight == PRIORITIES["low"] and share.total == 5
+    assert current_share.get() is not share
+
+
+def test_priority_slots_wake_higher_priority_first():
+    async def main():
+        slots = PrioritySlots(1)
+        order = []
+        release = asyncio.Event()
+
+        async def job(name, weight):
+            async with slots.slot(weight):
+                order.append(name)
+                if name == "first":
+                    await release.wait()
+
+        first = asyncio.create_task(job("first", PRIORITIES["normal"]))
+        await asyncio.sleep(0)
+        waiting = [asyncio.create_task(job(name, PRIORITIES[name])) for name in ("low", "normal")]
+        await asyncio.sleep(0)
+        # Задание с резервным приоритетом не ждёт слота
+        await job("high", PRIORITIES["high"])
+        release.set()
+        await asyncio.gather(first, *waiting)
+        return order, slots.running
+
+    order, running = asyncio.run(main())
+    assert order == ["first", "high", "normal", "low"]
+    assert running == 0
+
+
+def test_priority_slots_cancelled_waiter_does_not_leak_slot():
+    async def main():
+        slots = PrioritySlots(1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with slots.slot(1.0):
+                await release.wait()
+
+        async def wait():
+            async with slots.slot(1.0):
+                pass
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(wait())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        release.set()
+        await holder
+        await asyncio.gather(waiter, return_exceptions=True)
+        async with slots.slot(1.0):
+            pass
+        return slots.running
+
+    assert asyncio.run(main()) == 0
@@ -0,0 +1,95 @@
+import pytest
+
+from tools.results import OriginIP, Subdomain, ToolResult
+from tools.store import ResultStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(str(tmp_path / "results.sqlite"), flush_interval=0.01)
+    yield store
+    store.close()
+
+
+def subfinder_run(hosts, returncode=0):
+    return ToolResult("subfinder", "example.test", returncode,
+                      [Subdomain("example.test", host, "subfinder") for host in hosts])
+
+
+def changes(store):
+    return sorted((change["change"], change["kind"], change["value"]) for change in store.find_changes())
+
+
+def test_runs_and_records_are_stored(store):
+    result = ToolResult("hatcloud", "example.test", 0, [OriginIP("example.test", "203.0.113.7", "hatcloud", "possible origin")])
+    run_id = store.append(result)
+    [run] = store.find_runs(domain="example.test")
+    assert (run["id"], run["tool"], run["returncode"]) == (run_id, "hatcloud", 0)
+    [record] = store.find_records(domain="example.test", tool="hatcloud")
+    assert (record["kind"], record["value"], record["role"]) == ("OriginIP", "203.0.113.7", "possible origin")
+    assert store.read_output(run_id) == ""
+    assert store.read_output("missing") is None
+
+
+def test_first_snapshot_has_no_changes(store):
+    store.append(subfinder_run(["a.example.test", "b.example.test"]))
+    assert changes(store) == []
+
+
+def test_changes_against_previous_snapshot(store):
+    store.append(subfinder_run(["a.example.test", "b.example.test"]))
+    store.append(subfinder_run(["b.example.test", "c.example.test"]))
+    assert changes(store) == [("+", "Subdomain", "c.example.test"), ("-", "Subdomain", "a.example.test")]
+
+
+def test_unchanged_run_records_nothing(store):
+    store.append(subfinder_run(["a.example.test"]))
+    store.append(subfinder_run(["a.example.test"]))
+    assert changes(store) == []
+
+
+def test_failed_run_does_not_replace_snapshot(store):
+    store.append(subfinder_run(["a.example.test"]))
+    store.append(subfinder_run([], returncode=1))
+    store.append(subfinder_run(["a.example.test", "b.example.test"]))
+    # Сравнение идёт с последним успешным запуском, а не с неудачным пустым
+    assert changes(store) == [("+", "Subdomain", "b.example.test")]
+
+
+def test_removed_record_of_pruned_run_is_reported_by_hash(store):
+    store.append(subfinder_run(["a.example.test"]))
+    store.flush()
+    # Запуск снимка не удаляется prune, поэтому записи удаляются напрямую, как после ручной чистки
+    store.db.execute("DELETE FROM records")
+    store.append(subfinder_run(["b.example.test"]))
+    removed = [change for change in changes(store) if change[0] == "-"]
+    assert len(removed) == 1 and removed[0][1] == "" and removed[0][2].startswith("#")
+
+
+def test_prune_keeps_snapshot_runs(store):
+    store.append(subfinder_run(["a.example.test"]))
+    store.append(subfinder_run(["b.example.test"]))
+    store.flush()
+    assert store.prune(before=float("inf")) == 1
+    [run] = store.find_runs()
+    assert store.find_records(domain="example.test")[0]["run_id"] == run["id"]
+
+
+def test_is_new_uses_snapshot_from_before_this_process(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    previous = ResultStore(path)
+    previous.append(subfinder_run(["a.example.test"]))
+    previous.close()
+
+    store = ResultStore(path)
+    try:
+        assert not store.is_new("subfinder", "example.test")
+        assert not store.is_new("subfinder", "example.test", "Subdomain", "a.example.test")
+        assert store.is_new("subfinder", "example.test", "Subdomain", "b.example.test")
+        # Запуск этого процесса не меняет ответ
+        store.append(subfinder_run(["b.example.test"]))
+        store.flush()
+        assert store.is_new("subfinder", "example.test", "Subdomain", "b.example.test")
+        assert store.is_new("subfinder", "other.test")
+    finally:
+        store.close()
@@ -0,0 +1,35 @@
+import asyncio
+import time
+
+import pytest
+
+from tools.stream import stream_process
+
+
+def test_lines_are_read_and_output_file_written(tmp_path):
+    output = tmp_path / "out.txt"
+    seen = []
+    result = asyncio.run(stream_process(["sh", "-c", "echo a; echo b >&2; echo c"], str(output), seen.append))
+    assert (result.returncode, result.lines, result.stderr) == (0, 2, "b\n")
+    assert seen == ["a", "c"]
+    assert output.read_text() == "a\nc\n"
+
+
+def test_timeout_kills_background_child_holding_stdout(tmp_path):
+    marker = tmp_path / "alive"
+    # Процесс сразу выходит, а фоновый дочерний держит stdout открытым
+    command = ["sh", "-c", f"(sleep 0.5; echo alive > {marker}) & echo hi"]
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(stream_process(command, str(tmp_path / "out.txt")), 0.2)
+        elapsed = time.monotonic() - started
+        # Каналы закрываются после завершения группы; даём циклу их обработать
+        await asyncio.sleep(0.05)
+        return elapsed
+
+    started = time.monotonic()
+    assert asyncio.run(main()) < 0.5
+    time.sleep(0.8)
+    assert not marker.exists()
+    assert not (tmp_path / "out.txt.part").exists()
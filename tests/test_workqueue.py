@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from tools import workqueue
+from tools.results import ToolResult
+from tools.workqueue import DONE, FAILED, LEASED, PENDING, WorkQueue
+
+
+@pytest.fixture
+def queue_path(tmp_path):
+    return str(tmp_path / "queue.sqlite")
+
+
+def ok_result(task):
+    return ToolResult(task.tool, task.target, 0)
+
+
+def test_lease_complete_and_collect(queue_path):
+    coordinator = WorkQueue(queue_path)
+    batch, total = coordinator.enqueue([("hatcloud", "a.test", False), ("hatcloud", "b.test", True)])
+    assert total == 2
+
+    worker = WorkQueue(queue_path)
+    [first] = worker.lease()
+    assert (first.tool, first.target, first.refresh, first.attempts) == ("hatcloud", "a.test", False, 1)
+    assert coordinator.counts(batch) == {PENDING: 1, LEASED: 1, DONE: 0, FAILED: 0}
+    assert worker.complete(first, [ok_result(first)])
+
+    [result] = coordinator.collect(batch)
+    assert (result.tool, result.target, result.ok) == ("hatcloud", "a.test", True)
+    # Собранные результаты второй раз не выдаются
+    assert coordinator.collect(batch) == []
+
+
+def test_one_task_is_leased_to_one_worker(queue_path):
+    WorkQueue(queue_path).enqueue([("hatcloud", "a.test", False)])
+    first, second = WorkQueue(queue_path), WorkQueue(queue_path)
+    assert len(first.lease()) == 1
+    assert second.lease() == []
+
+
+def test_expired_lease_is_taken_over_and_stale_result_rejected(queue_path, monkeypatch):
+    WorkQueue(queue_path).enqueue([("hatcloud", "a.test", False)])
+    crashed, healthy = WorkQueue(queue_path), WorkQueue(queue_path)
+    # Аренда истекает сразу: исполнитель «упал» до продления
+    monkeypatch.setattr(workqueue, "LEASE_SECONDS", -1.0)
+    [stale] = crashed.lease()
+    monkeypatch.setattr(workqueue, "LEASE_SECONDS", 60.0)
+    [task] = healthy.lease()
+    assert task.id == stale.id and task.attempts == 2
+    assert not crashed.complete(stale, [ok_result(stale)])
+    assert healthy.complete(task, [ok_result(task)])
+
+
+def test_task_fails_after_max_attempts(queue_path, monkeypatch):
+    queue = WorkQueue(queue_path)
+    batch, _ = queue.enqueue([("hatcloud", "a.test", False)])
+    monkeypatch.setattr(workqueue, "LEASE_SECONDS", -1.0)
+    for _ in range(workqueue.MAX_ATTEMPTS):
+        assert len(queue.lease()) == 1
+    assert queue.lease() == []
+    assert queue.counts(batch)[FAILED] == 1
+    [result] = queue.collect(batch)
+    assert not result.ok and "попытки исчерпаны" in result.error
+
+
+def test_release_returns_task_without_spending_attempt(queue_path):
+    queue = WorkQueue(queue_path)
+    queue.enqueue([("hatcloud", "a.test", False)])
+    [task] = queue.lease()
+    queue.release([task.id])
+    [again] = WorkQueue(queue_path).lease()
+    assert again.id == task.id and again.attempts == 1
+
+
+def test_lease_only_tools_the_worker_has(queue_path):
+    queue = WorkQueue(queue_path)
+    batch, _ = queue.enqueue([("subfinder", "a.test", False), ("hatcloud", "a.test", False)])
+    [task] = queue.lease(2, tools=["hatcloud"])
+    assert task.tool == "hatcloud"
+    assert queue.lease(tools=["hatcloud"]) == []
+    assert queue.lease(tools=[]) == []
+    assert queue.counts(batch)[PENDING] == 1
+
+
+def test_run_worker_completes_tasks_until_empty(queue_path, monkeypatch):
+    monkeypatch.setattr(workqueue, "POLL_INTERVAL", 0.01)
+    queue = WorkQueue(queue_path)
+    batch, _ = queue.enqueue([("hatcloud", f"{i}.test", False) for i in range(5)] + [("subfinder", "x.test", False)])
+
+    async def runner(task):
+        if task.target == "3.test":
+            raise RuntimeError("сбой")
+        return [ok_result(task)]
+
+    completed = asyncio.run(workqueue.run_worker(queue, runner, slots=2, until_empty=True, tools=["hatcloud"]))
+    assert completed == 5
+    assert queue.counts(batch) == {PENDING: 1, LEASED: 0, DONE: 4, FAILED: 1}
+
+
+def test_until_empty_ignores_expired_and_foreign_leases(queue_path, monkeypatch):
+    monkeypatch.setattr(workqueue, "POLL_INTERVAL", 0.01)
+    queue = WorkQueue(queue_path)
+    queue.enqueue([("subfinder", "x.test", False), ("subfinder", "y.test", False), ("hatcloud", "a.test", False)])
+    # Исполнитель с subfinder упал: одна аренда истекла, другая ещё действует
+    monkeypatch.setattr(workqueue, "LEASE_SECONDS", -1.0)
+    WorkQueue(queue_path).lease(tools=["subfinder"])
+    monkeypatch.setattr(workqueue, "LEASE_SECONDS", 60.0)
+    WorkQueue(queue_path).lease(tools=["subfinder"])
+    assert queue.running() == 1 and queue.running(["hatcloud"]) == 0
+
+    async def runner(task):
+        return [ok_result(task)]
+
+    completed = asyncio.run(asyncio.wait_for(
+        workqueue.run_worker(queue, runner, slots=1, until_empty=True, tools=["hatcloud"]), 5))
+    assert completed == 1
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from tools.results import ANSI_RE, HOST_RE
+from tools.stream import StreamResult
+from tools.targets import name_source
+
+# Сколько доменов передаётся одному процессу инструмента со списочным вводом (subfinder -dL):
+# запуск Go-бинарника или интерпретатора стоит дороже, чем разбор общего вывода обратно по доменам
+BATCH_SIZE = int(os.environ.get("CFD_BATCH_SIZE", "50"))
+
+
+def chunked(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    """
+    Разбивает поток целей на списки не длиннее size, не читая поток целиком.
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+@contextmanager
+def target_file(targets: List[str], name: Optional[str] = None) -> Iterator[str]:
+    """
+    Временный файл со списком целей (по одной в строке); удаляется после выхода из блока.
+    name — постоянное имя списка для меток журнала и результатов (см. tools.targets.source_name).
+    """
+    fd, path = tempfile.mkstemp(prefix="cfd-batch-", suffix=".txt")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write("\n".join(targets) + "\n")
+        if name is not None:
+            name_source(path, name)
+        yield path
+    finally:
+        name_source(path, None)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class BatchParser:
+    """
+    Разбор общего вывода пакетного запуска: каждая строка передаётся парсерам тех доменов
+    пакета, к которым относятся найденные в ней имена (домен или его поддомен), и попадает
+    в вывод этих доменов. Для run_supervised ведёт себя как обычный парсер (feed/reset/finish).
+    """
+    __slots__ = ("parsers", "capture", "_outputs", "_lines", "_bytes")
+
+    def __init__(self, parsers: Dict[str, object], capture: bool = False):
+        self.parsers = parsers
+        self.capture = capture
+        self.reset()
+
+    def reset(self) -> None:
+        for parser in self.parsers.values():
+            parser.reset()
+        self._outputs: Dict[str, list] = {domain: [] for domain in self.parsers}
+        self._lines = dict.fromkeys(self.parsers, 0)
+        self._bytes = dict.fromkeys(self.parsers, 0)
+
+    def _domains(self, line: str) -> List[str]:
+        domains = []
+        for host in HOST_RE.findall(ANSI_RE.sub("", line)):
+            labels = host.lower().split(".")
+            # Все суффиксы имени, которые есть в пакете: поддомен вложенного домена достаётся обоим,
+            # как и при отдельных запусках
+            for start in range(len(labels) - 1):
+                domain = ".".join(labels[start:])
+                if domain in self.parsers and domain not in domains:
+                    domains.append(domain)
+        return domains
+
+    def feed(self, line: str) -> None:
+        for domain in self._domains(line):
+            self.parsers[domain].feed(line)
+            self._lines[domain] += 1
+            self._bytes[domain] += len(line) + 1
+            if self.capture:
+                self._outputs[domain].append(line)
+
+    def finish(self) -> None:
+        for parser in self.parsers.values():
+            parser.finish()
+
+    def split(self, result: StreamResult, domain: str) -> StreamResult:
+        """
+        Результат пакетного запуска в части одного домена: его строки, объём и вывод.
+        """
+        lines = self._outputs[domain]
+        output = zlib.compress(("\n".join(lines) + "\n").encode(), 6) if lines else b""
+        return result._replace(lines=self._lines[domain], bytes=self._bytes[domain], output=output)
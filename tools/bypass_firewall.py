@@ -1,61 +1,92 @@
 import asyncio
-import os
 import logging
-from datetime import datetime
+from typing import List, Optional
 
-logging.basicConfig(level=logging.INFO)
+from tools.cache import cached_result, store_result
+from tools.dns import prefilter
+from tools.executor import DEFAULT_MAX_CONCURRENCY, run_concurrently
+from tools.journal import mark_done, pending
+from tools.logs import excerpt
+from tools.preflight import require_tool
+from tools.results import OriginIPParser, ToolResult, error_result
+from tools.store import save_run
+from tools.supervisor import run_supervised
+from tools.targets import iter_targets
 
-async def run_bypass_firewall(domain: str, output_dir: str = "bypass_dns_history_results", output_to_file: bool = True) -> None:
+async def _run_bypass_firewall_domain(domain: str, output_dir: str, output_to_file: bool, refresh: bool) -> ToolResult:
+    """
+    Запускает bypass-firewalls-by-DNS-history для одного домена.
+    """
+    command = [*require_tool("bypass_firewall"), domain]  # Команда для запуска Bash-скрипта
+
+    cached = cached_result("bypass_firewall", domain, command, refresh)
+    if cached is not None:
+        return cached
+
+    logging.info(f"Запуск bypass-firewalls-by-DNS-history для домена: {domain}")
+    parser = OriginIPParser(domain, "bypass_firewall")
+    result = await run_supervised("bypass_firewall", command, parser=parser, label=f"bypass-firewalls-by-DNS-history {domain}", capture=output_to_file)
+
+    if result.returncode == 0:
+        logging.info(f"Результаты bypass-firewalls-by-DNS-history для {domain}: {result.lines} строк")
+    else:
+        logging.error(f"Ошибка при запуске bypass-firewalls-by-DNS-history для {domain}: {excerpt(result.stderr)}")
+
+    tool_result = ToolResult("bypass_firewall", domain, result.returncode, parser.records,
+                              error=result.stderr if result.returncode else "")
+    save_run(tool_result, result)
+    store_result(tool_result, command)
+    return tool_result
+
+async def run_bypass_firewall(domain: str, output_dir: str = "bypass_dns_history_results", output_to_file: bool = True,
+                              max_concurrency: int = DEFAULT_MAX_CONCURRENCY, timeout: Optional[float] = None, refresh: bool = False) -> List[ToolResult]:
     """
     Асинхронная функция для запуска bypass-firewalls-by-DNS-history через Bash.
 
-    :param domain: домен для поиска данных.
+    :param domain: домен или файл с доменами для поиска данных.
     :type domain: str
-    :param output_dir: директория для сохранения результатов.
+    :param output_dir: не используется, результаты сохраняются в хранилище (tools.store); оставлен для совместимости.
     :type output_dir: str
-    :param output_to_file: флаг, означающий, что результаты будут сохранены в файл.
+    :param output_to_file: флаг, означающий, что полный вывод будет сохранён в хранилище результатов.
     :type output_to_file: bool
+    :param max_concurrency: максимальное число одновременно запущенных процессов.
+    :type max_concurrency: int
+    :param timeout: таймаут в секундах на один домен.
+    :type timeout: float
+    :param refresh: игнорировать кэш и запустить инструмент заново.
+    :type refresh: bool
     """
+    results = []
     try:
-        os.makedirs(output_dir, exist_ok=True)
-        command = ["bash", "./bypass-firewalls-by-DNS-history/bypass-firewalls-by-DNS-history.sh", domain]  # Команда для запуска Bash-скрипта
-
-        logging.info(f"Запуск bypass-firewalls-by-DNS-history для домена: {domain}")
-        process = await asyncio.create_subprocess_exec(
-            *command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-
-        stdout, stderr = await process.communicate()
-
-        # Преобразуем байтовые данные в строки
-        stdout_str = stdout.decode()
-        stderr_str = stderr.decode()
-
-        if process.returncode == 0:
-            logging.info(f"Результаты bypass-firewalls-by-DNS-history для {domain}:")
-            logging.info(stdout_str)
-
-            if output_to_file:
-                file_name = f"{output_dir}/bypass_dns_history_results_{domain}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-                with open(file_name, "w") as f:
-                    f.write(stdout_str)
-                logging.info(f"Результаты сохранены в {file_name}")
-        else:
-            logging.error(f"Ошибка при запуске bypass-firewalls-by-DNS-history для {domain}: {stderr_str}")
-    except FileNotFoundError:
-        logging.error("Команда bypass-firewalls-by-DNS-history не найдена. Убедитесь, что bypass-firewalls-by-DNS-history.sh находится в рабочей директории.")
+        # Недоступный инструмент отсекается до разбора целей, без единого запуска процесса
+        require_tool("bypass_firewall")
+        domain_list = prefilter(pending("bypass_firewall", iter_targets(domain)))
+
+        async for item, result, error in run_concurrently(
+            domain_list, lambda item: _run_bypass_firewall_domain(item, output_dir, output_to_file, refresh), max_concurrency, timeout
+        ):
+            if isinstance(error, FileNotFoundError):
+                logging.error("Команда bypass-firewalls-by-DNS-history не найдена. Убедитесь, что bypass-firewalls-by-DNS-history.sh находится в рабочей директории.")
+            elif error is not None:
+                logging.error(f"Ошибка при обработке {item}: {error}")
+            if error is None:
+                mark_done(result)
+            results.append(result if error is None else error_result("bypass_firewall", item, error))
+    except FileNotFoundError as e:
+        logging.error(f"Команда bypass-firewalls-by-DNS-history не найдена. Убедитесь, что bypass-firewalls-by-DNS-history.sh находится в рабочей директории. ({e})")
+        results.append(error_result("bypass_firewall", domain, e))
     except Exception as e:
         logging.error(f"Неожиданная ошибка: {e}")
 
-def run_bypass_firewall_sync(domain: str, output_dir: str = "bypass_dns_history_results", output_to_file: bool = True) -> None:
+    return results
+
+def run_bypass_firewall_sync(domain: str, output_dir: str = "bypass_dns_history_results", output_to_file: bool = True,
+                             max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> List[ToolResult]:
     """
     Функция для синхронного запуска асинхронной задачи run_bypass_firewall.
     """
     if not domain:
         logging.error("Домен не может быть пустым")
-        return
-
-    asyncio.run(run_bypass_firewall(domain, output_dir, output_to_file))
+        return []
 
+    return asyncio.run(run_bypass_firewall(domain, output_dir, output_to_file, max_concurrency))
@@ -0,0 +1,307 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from tools.results import ToolResult, result_from_dict, result_to_dict
+
+DEFAULT_CACHE_PATH = os.environ.get("CFD_CACHE_PATH", os.path.join(".cache", "results.sqlite"))
+# Предельный размер сохранённых результатов; при превышении вытесняются давно не читанные записи
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL = 24 * 3600
+# Вытеснение освобождает место с запасом, чтобы не запускаться после каждой новой записи
+EVICT_RATIO = 0.9
+# Запись идёт пачками в отдельном потоке: одна транзакция на BATCH_SIZE изменений или FLUSH_INTERVAL секунд
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0
+
+# Время жизни результатов по инструментам (секунды). Поддомены меняются медленнее,
+# чем DNS-история и найденные IP, поэтому хранятся дольше.
+TOOL_TTLS = {
+    "subfinder": 24 * 3600,
+    "sudomy": 24 * 3600,
+    "cloudfail": 12 * 3600,
+    "hatcloud": 12 * 3600,
+    "cloudunflare": 12 * 3600,
+    "bypass_firewall": 12 * 3600,
+    "maryam": 24 * 3600,
+    "catphish": 24 * 3600,
+    "osrframework": 24 * 3600,
+    "reconbulk": 6 * 3600,
+}
+
+
+# Хэши содержимого файлов целей по (путь, размер, mtime)
+_digests: Dict[tuple, str] = {}
+
+
+def file_digest(path: str) -> str:
+    """
+    Хэш содержимого файла целей: результат по списку доменов зависит от списка, а не от пути к файлу.
+    Хэш запоминается по (путь, размер, mtime), поэтому get и put одного запуска читают файл один раз.
+    """
+    stat = os.stat(path)
+    marker = (path, stat.st_size, stat.st_mtime_ns)
+    digest = _digests.get(marker)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        digest = f"sha256:{sha.hexdigest()}"
+        if len(_digests) >= 1024:
+            _digests.clear()
+        _digests[marker] = digest
+    return digest
+
+
+def cache_key(tool: str, target: str, args: List[str]) -> str:
+    """
+    Ключ кэша: хэш от инструмента, цели и полной командной строки.
+    Если цель — файл, вместо его пути (в цели и в команде) берётся хэш содержимого.
+    """
+    if os.path.isfile(target):
+        digest = file_digest(target)
+        args = [digest if arg == target else arg for arg in args]
+        target = digest
+    return hashlib.sha256(json.dumps([tool, target, args]).encode()).hexdigest()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS cache ("
+        "key TEXT PRIMARY KEY, tool TEXT, target TEXT, created REAL, accessed REAL, size INTEGER, payload TEXT)"
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+    return db
+
+
+class ResultCache:
+    """
+    Кэш результатов инструментов в SQLite с TTL по инструментам и LRU-вытеснением по размеру.
+    Цикл событий только читает по ключу; новые записи, отметки чтения и вытеснение выполняет
+    отдельный поток пачками, как в tools.store. Суммарный размер ведётся счётчиком и сверяется
+    с таблицей только при превышении предела, а вытеснение освобождает место с запасом (EVICT_RATIO).
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES, ttls: Optional[dict] = None,
+                 batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = {**TOOL_TTLS, **(ttls or {})}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._db: Optional[sqlite3.Connection] = None
+        self._queue: queue.Queue = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # Записи, ещё не дошедшие до базы: ключ -> (created, payload)
+        self._unwritten: Dict[str, tuple] = {}
+        self.total: Optional[int] = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        # Соединение для чтения; у потока записи своё
+        if self._db is None:
+            self._db = _connect(self.path)
+        return self._db
+
+    def get(self, tool: str, target: str, args: List[str]) -> Optional[ToolResult]:
+        key = cache_key(tool, target, args)
+        row = self._unwritten.get(key)
+        if row is None:
+            row = self.db.execute("SELECT created, payload FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        created, payload = row
+        now = time.time()
+        if now - created > self.ttls.get(tool, DEFAULT_TTL):
+            self._submit(("delete", key))
+            return None
+        self._submit(("touch", key, now))
+        return result_from_dict(json.loads(payload))
+
+    def put(self, result: ToolResult, args: List[str], target: Optional[str] = None) -> None:
+        # Кэшируются только успешные запуски, ошибки должны повторяться
+        if not result.ok:
+            return
+        payload = json.dumps(result_to_dict(result))
+        now = time.time()
+        key = cache_key(result.tool, target or result.target, args)
+        with self._lock:
+            self._unwritten[key] = (now, payload)
+        self._submit(("put", key, result.tool, result.target, now, payload))
+
+    def _submit(self, item: tuple) -> None:
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="result-cache-writer", daemon=True)
+                self._writer.start()
+        self._queue.put(item)
+
+    def _write_loop(self) -> None:
+        try:
+            db = _connect(self.path)
+        except (OSError, sqlite3.Error) as e:
+            logging.error(f"Кэш результатов {self.path} недоступен, результаты не кэшируются: {e}")
+            while self._queue.get() is not None:
+                self._queue.task_done()
+            self._queue.task_done()
+            return
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    self._queue.task_done()
+                    return
+                batch = [item]
+                deadline = time.monotonic() + self.flush_interval
+                stop = False
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+                try:
+                    self._write_batch(db, batch)
+                except Exception as e:
+                    logging.error(f"Ошибка записи {len(batch)} результатов в кэш: {e}")
+                finally:
+                    with self._lock:
+                        for entry in batch:
+                            # Более новая запись того же ключа ещё ждёт своей пачки
+                            if entry[0] == "put" and self._unwritten.get(entry[1], (None,))[0] == entry[4]:
+                                del self._unwritten[entry[1]]
+                for _ in range(len(batch) + stop):
+                    self._queue.task_done()
+                if stop:
+                    return
+        finally:
+            db.close()
+
+    def _write_batch(self, db: sqlite3.Connection, batch) -> None:
+        if self.total is None:
+            self.total = db.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        db.execute("BEGIN")
+        try:
+            for entry in batch:
+                if entry[0] == "put":
+                    _, key, tool, target, now, payload = entry
+                    db.execute(
+                        "INSERT OR REPLACE INTO cache (key, tool, target, created, accessed, size, payload) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)", (key, tool, target, now, now, len(payload), payload)
+                    )
+                    self.total += len(payload)
+                elif entry[0] == "touch":
+                    db.execute("UPDATE cache SET accessed = ? WHERE key = ?", (entry[2], entry[1]))
+                else:
+                    db.execute("DELETE FROM cache WHERE key = ?", (entry[1],))
+            if self.total > self.max_bytes:
+                self._evict(db)
+            db.execute("COMMIT")
+        except sqlite3.Error:
+            db.execute("ROLLBACK")
+            # Счётчик мог разойтись с таблицей: пересчитывается при следующей пачке
+            self.total = None
+            raise
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        """
+        Удаляет давно не читанные записи, пока суммарный размер не опустится до max_bytes × EVICT_RATIO.
+        Счётчик сначала сверяется с таблицей: замены записей и удаления устаревших его завышают,
+        а другие процессы с тем же файлом кэша — занижают.
+        """
+        self.total = db.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if self.total <= self.max_bytes:
+            return
+        excess = self.total - int(self.max_bytes * EVICT_RATIO)
+        freed = 0
+        keys = []
+        for key, size in db.execute("SELECT key, size FROM cache ORDER BY accessed"):
+            keys.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        db.executemany("DELETE FROM cache WHERE key = ?", keys)
+        self.total -= freed
+        logging.info(f"Из кэша вытеснено {len(keys)} записей ({freed} байт)")
+
+    def flush(self) -> None:
+        """
+        Ждёт, пока все поставленные в очередь изменения будут записаны.
+        """
+        if self._writer is not None:
+            self._queue.join()
+
+    def clear(self, tool: Optional[str] = None) -> None:
+        self.flush()
+        if tool is None:
+            self.db.execute("DELETE FROM cache")
+        else:
+            self.db.execute("DELETE FROM cache WHERE tool = ?", (tool,))
+        self.total = None
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+_default_cache: Optional[ResultCache] = None
+
+
+def get_cache() -> ResultCache:
+    """
+    Общий экземпляр кэша для всех обёрток.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+        atexit.register(_default_cache.close)
+    return _default_cache
+
+
+def cached_result(tool: str, target: str, args: List[str], refresh: bool = False) -> Optional[ToolResult]:
+    """
+    Возвращает результат из кэша, если он есть и не устарел; при refresh кэш не читается.
+    """
+    if refresh:
+        return None
+    try:
+        result = get_cache().get(tool, target, args)
+    except (OSError, sqlite3.Error) as e:
+        logging.error(f"Ошибка чтения кэша: {e}")
+        return None
+    if result is not None:
+        logging.info(f"Результат {tool} для {target} взят из кэша")
+    return result
+
+
+def store_result(result: ToolResult, args: List[str], target: Optional[str] = None) -> None:
+    """
+    Сохраняет успешный результат в кэш; target — цель ключа, если она отличается от result.target
+    (например, временный файл с целями, переданный инструменту).
+    """
+    try:
+        get_cache().put(result, args, target)
+    except (OSError, sqlite3.Error) as e:
+        logging.error(f"Ошибка записи в кэш: {e}")
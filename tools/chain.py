@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from typing import Iterable, List, Optional
+
+from tools.bypass_firewall import run_bypass_firewall
+from tools.cloudunflare import run_cloudunflare
+from tools.executor import DEFAULT_MAX_CONCURRENCY
+from tools.hatcloud import run_hatcloud
+from tools import store
+from tools.results import Record, Subdomain, ToolResult
+from tools.subfinder import run_subfinder
+from tools.targets import iter_targets
+
+ORIGIN_TOOLS = {
+    "hatcloud": run_hatcloud,
+    "cloudunflare": run_cloudunflare,
+    "bypass_firewall": run_bypass_firewall,
+}
+
+
+async def run_chain(target: str, output_to_file: bool = True, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                    timeout: Optional[float] = None, refresh: bool = False,
+                    origin_tools: Iterable[str] = tuple(ORIGIN_TOOLS)) -> List[ToolResult]:
+    """
+    Цепочка «subfinder → поиск реального IP»: каждый поддомен передаётся инструментам
+    поиска origin сразу, как только subfinder его вывел, не дожидаясь конца перебора.
+    Каждый хост обрабатывается один раз, даже если его нашли для нескольких доменов.
+    В режиме изменений (store.diff_mode) поиск origin запускается только для поддоменов,
+    которых не было в снимке subfinder прошлого запуска, и для доменов, у которых снимка ещё нет.
+
+    :param target: домен или файл с доменами.
+    :type target: str
+    :param output_to_file: флаг, означающий, что полный вывод будет сохранён в хранилище результатов.
+    :type output_to_file: bool
+    :param max_concurrency: число хостов, обрабатываемых одновременно.
+    :type max_concurrency: int
+    :param timeout: таймаут в секундах на один запуск инструмента.
+    :type timeout: float
+    :param refresh: игнорировать кэш результатов.
+    :type refresh: bool
+    :param origin_tools: имена инструментов поиска origin из ORIGIN_TOOLS.
+    :type origin_tools: Iterable[str]
+    :return: результаты subfinder и всех инструментов поиска origin.
+    :rtype: List[ToolResult]
+    """
+    origin_tools = [ORIGIN_TOOLS[name] for name in origin_tools]
+    hosts: asyncio.Queue = asyncio.Queue()
+    seen = set()
+    results: List[ToolResult] = []
+    workers = max(1, max_concurrency)
+    diff = store.diff_mode
+    unchanged = 0
+
+    def enqueue(host: str) -> None:
+        host = host.lower().rstrip(".")
+        if host and host not in seen:
+            seen.add(host)
+            hosts.put_nowait(host)
+
+    def on_record(record: Record) -> None:
+        nonlocal unchanged
+        if isinstance(record, Subdomain):
+            if diff and not store.get_store().is_new("subfinder", record.domain, "Subdomain", record.host):
+                unchanged += 1
+                return
+            enqueue(record.host)
+
+    async def produce() -> None:
+        nonlocal unchanged
+        try:
+            # Сам домен тоже проверяется, subfinder выводит только поддомены
+            for domain in iter_targets(target):
+                if diff and not store.get_store().is_new("subfinder", domain):
+                    unchanged += 1
+                    continue
+                enqueue(domain)
+            results.extend(await run_subfinder(target, output_to_file=output_to_file, max_concurrency=max_concurrency,
+                                               timeout=timeout, refresh=refresh, on_record=on_record))
+        finally:
+            for _ in range(workers):
+                hosts.put_nowait(None)
+
+    async def consume() -> None:
+        while True:
+            host = await hosts.get()
+            if host is None:
+                return
+            for tool_results in await asyncio.gather(*(
+                tool(host, output_to_file=output_to_file, max_concurrency=1, timeout=timeout, refresh=refresh)
+                for tool in origin_tools
+            )):
+                results.extend(tool_results)
+
+    await asyncio.gather(produce(), *(consume() for _ in range(workers)))
+    logging.info(f"Цепочка для {target}: обработано {len(seen)} уникальных хостов")
+    if unchanged:
+        logging.info(f"Цепочка для {target}: {unchanged} хостов без изменений с прошлого запуска пропущены")
+    return results
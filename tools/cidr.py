@@ -0,0 +1,158 @@
+import bisect
+import ipaddress
+import logging
+import operator
+import os
+import socket
+import struct
+from itertools import compress, repeat
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Список диапазонов Cloudflare (CIDR по одному в строке, # — комментарий)
+DEFAULT_RANGES_PATH = os.environ.get(
+    "CFD_CLOUDFLARE_RANGES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cloudflare_ranges.txt")
+)
+
+EDGE = "edge"
+ORIGIN = "possible origin"
+
+
+def _merge(networks: Iterable[ipaddress._BaseNetwork]) -> Tuple[List[int], List[int]]:
+    """
+    Отсортированные непересекающиеся интервалы [начало, конец] для списка сетей.
+    """
+    starts: List[int] = []
+    ends: List[int] = []
+    for network in sorted(networks, key=lambda network: int(network.network_address)):
+        start, end = int(network.network_address), int(network.broadcast_address)
+        if ends and start <= ends[-1] + 1:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+
+class CidrIndex:
+    """
+    Индекс диапазонов адресов для пакетной проверки принадлежности IP.
+    Интервалы хранятся отсортированными массивами начал и концов; поиск — бинарный
+    (numpy.searchsorted, если numpy установлен, иначе bisect через map без цикла на Python).
+    """
+    __slots__ = ("v4_starts", "v4_ends", "v6_starts", "v6_ends", "_np_v4", "_np_v6")
+
+    def __init__(self, cidrs: Iterable[str]):
+        networks = [ipaddress.ip_network(cidr.strip(), strict=False) for cidr in cidrs]
+        self.v4_starts, self.v4_ends = _merge(network for network in networks if network.version == 4)
+        self.v6_starts, self.v6_ends = _merge(network for network in networks if network.version == 6)
+        self._np_v4 = self._np_v6 = None
+        if numpy is not None:
+            self._np_v4 = (numpy.array(self.v4_starts, dtype=numpy.uint32), numpy.array(self.v4_ends, dtype=numpy.uint32))
+            # 128-битные адреса numpy не умеет; если все сети не длиннее /64, хватает старших 64 бит
+            if all(network.prefixlen <= 64 for network in networks if network.version == 6):
+                self._np_v6 = (numpy.array([start >> 64 for start in self.v6_starts], dtype=numpy.uint64),
+                               numpy.array([end >> 64 for end in self.v6_ends], dtype=numpy.uint64))
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_RANGES_PATH) -> "CidrIndex":
+        with open(path, "r") as f:
+            return cls(line.split("#", 1)[0] for line in f if line.split("#", 1)[0].strip())
+
+    def __len__(self) -> int:
+        return len(self.v4_starts) + len(self.v6_starts)
+
+    def contains(self, ip: str) -> bool:
+        return self.classify([ip])[0]
+
+    def classify(self, ips: Sequence[str]) -> List[bool]:
+        """
+        Для каждого адреса — входит ли он в один из диапазонов индекса. Адреса должны быть
+        корректными IPv4/IPv6 (как их выдаёт OriginIPParser); некорректные считаются не входящими.
+
+        :param ips: адреса в текстовом виде.
+        :type ips: Sequence[str]
+        """
+        is_v6 = list(map(operator.contains, ips, repeat(":")))
+        try:
+            v4 = self._classify_v4(list(compress(ips, map(operator.not_, is_v6))))
+            v6 = self._classify_v6(list(compress(ips, is_v6)))
+        except (OSError, ValueError):
+            return [self._contains_slow(ip) for ip in ips]
+        if not v6 or not v4:
+            return v4 or v6
+        # Сборка результата в исходном порядке: next() из итератора своего семейства адресов
+        return list(map(next, map((iter(v4), iter(v6)).__getitem__, is_v6)))
+
+    def _classify_v4(self, ips: List[str]) -> List[bool]:
+        if not ips or not self.v4_starts:
+            return [False] * len(ips)
+        packed = b"".join(map(socket.inet_pton, repeat(socket.AF_INET), ips))
+        if self._np_v4 is not None:
+            return self._np_lookup(numpy.frombuffer(packed, dtype=">u4").astype(numpy.uint32), *self._np_v4)
+        values = struct.unpack(f">{len(ips)}I", packed)
+        return self._bisect_lookup(values, self.v4_starts, self.v4_ends)
+
+    def _classify_v6(self, ips: List[str]) -> List[bool]:
+        if not ips or not self.v6_starts:
+            return [False] * len(ips)
+        packed = list(map(socket.inet_pton, repeat(socket.AF_INET6), ips))
+        if self._np_v6 is not None:
+            high = numpy.frombuffer(b"".join(packed), dtype=">u8")[::2].astype(numpy.uint64)
+            return self._np_lookup(high, *self._np_v6)
+        values = list(map(int.from_bytes, packed, repeat("big")))
+        return self._bisect_lookup(values, self.v6_starts, self.v6_ends)
+
+    @staticmethod
+    def _np_lookup(values, starts, ends) -> List[bool]:
+        positions = numpy.searchsorted(starts, values, side="right") - 1
+        return ((positions >= 0) & (values <= ends[positions.clip(0)])).tolist()
+
+    @staticmethod
+    def _bisect_lookup(values: Sequence[int], starts: List[int], ends: List[int]) -> List[bool]:
+        # bisect_right даёт позицию p: интервал-кандидат p-1; ends_shifted[p] == ends[p-1], а при p == 0 — -1
+        ends_shifted = [-1, *ends]
+        positions = map(bisect.bisect_right, repeat(starts), values)
+        return list(map(operator.le, values, map(ends_shifted.__getitem__, positions)))
+
+    def _contains_slow(self, ip: str) -> bool:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        starts, ends = (self.v4_starts, self.v4_ends) if address.version == 4 else (self.v6_starts, self.v6_ends)
+        value = int(address)
+        position = bisect.bisect_right(starts, value) - 1
+        return position >= 0 and value <= ends[position]
+
+
+_default_index: Optional[CidrIndex] = None
+
+
+def get_cloudflare_index() -> Optional[CidrIndex]:
+    """
+    Индекс диапазонов Cloudflare из DEFAULT_RANGES_PATH; None, если файл не читается.
+    """
+    global _default_index
+    if _default_index is None:
+        try:
+            _default_index = CidrIndex.from_file(DEFAULT_RANGES_PATH)
+        except (OSError, ValueError) as e:
+            logging.error(f"Не удалось загрузить диапазоны Cloudflare из {DEFAULT_RANGES_PATH}: {e}")
+            return None
+    return _default_index
+
+
+def classify_ips(ips: Sequence[str]) -> List[str]:
+    """
+    Роль каждого адреса: EDGE (адрес Cloudflare) или ORIGIN (возможный реальный сервер).
+    Если диапазоны не загружены, роль не определяется (пустая строка).
+    """
+    index = get_cloudflare_index()
+    if index is None:
+        return [""] * len(ips)
+    return list(map((ORIGIN, EDGE).__getitem__, index.classify(ips)))
@@ -1,53 +1,86 @@
-import os
-import subprocess
 import asyncio
 import logging
+from typing import List, Optional
 
-logging.basicConfig(level=logging.INFO)
+from tools.cache import cached_result, store_result
+from tools.dns import prefilter
+from tools.executor import DEFAULT_MAX_CONCURRENCY, run_concurrently
+from tools.journal import mark_done, pending
+from tools.logs import excerpt
+from tools.preflight import require_tool
+from tools.results import OriginIPParser, ToolResult, error_result
+from tools.store import save_run
+from tools.supervisor import run_supervised
+from tools.targets import iter_targets
 
-async def run_cloudfail(target: str, output_to_file: bool = True) -> None:
+async def _run_cloudfail_domain(target: str, output_to_file: bool, refresh: bool) -> ToolResult:
+    """
+    Запускает cloudfail для одного домена.
+    """
+    command = [*require_tool("cloudfail"), "--target", target]
+    cached = cached_result("cloudfail", target, command, refresh)
+    if cached is not None:
+        return cached
+
+    parser = OriginIPParser(target, "cloudfail")
+    result = await run_supervised("cloudfail", command, parser=parser, label=f"CloudFail {target}", capture=output_to_file)
+
+    if result.returncode == 0:
+        logging.info(f"Результаты CloudFail для {target}: {result.lines} строк")
+    else:
+        logging.error(f"Ошибка при запуске CloudFail: {excerpt(result.stderr)}")
+
+    tool_result = ToolResult("cloudfail", target, result.returncode, parser.records,
+                              error=result.stderr if result.returncode else "")
+    save_run(tool_result, result)
+    store_result(tool_result, command)
+    return tool_result
+
+async def run_cloudfail(target: str, output_to_file: bool = True, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                        timeout: Optional[float] = None, refresh: bool = False) -> List[ToolResult]:
     """
     Асинхронная функция для запуска cloudfail
-    :param target: домен, для которого будет выполняться поиск
+    :param target: домен или файл с доменами, для которых будет выполняться поиск
     :type target: str
-    :param output_to_file: флаг, означающий, что результаты будут сохранены в файл
+    :param output_to_file: флаг, означающий, что полный вывод будет сохранён в хранилище результатов
     :type output_to_file: bool
+    :param max_concurrency: максимальное число одновременно запущенных процессов
+    :type max_concurrency: int
+    :param timeout: таймаут в секундах на один домен
+    :type timeout: float
+    :param refresh: игнорировать кэш и запустить инструмент заново
+    :type refresh: bool
     """
+    results = []
     try:
-        command = ["cloudfail", "--target", target]
-        result = await asyncio.create_subprocess_exec(
-            *command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-
-        stdout, stderr = await result.communicate()
-        
-        stdout_str = stdout.decode()
-        stderr_str = stderr.decode()
-
-        if result.returncode == 0:
-            logging.info(f"Результаты CloudFail для {target}:")
-            logging.info(stdout_str)
-            
-            if output_to_file:
-                file_name = f"{target}_cloudfail_{os.urandom(4).hex()}.txt"
-                with open(file_name, "w") as f:
-                    f.write(stdout_str)
-                logging.info(f"Результаты сохранены в {file_name}")
-        else:
-            logging.error(f"Ошибка при запуске CloudFail: {stderr_str}")
-    except FileNotFoundError:
-        logging.error("Команда cloudfail не найдена. Убедитесь, что она установлена и доступна в PATH.")
+        # Недоступный инструмент отсекается до разбора целей, без единого запуска процесса
+        require_tool("cloudfail")
+        domain_list = prefilter(pending("cloudfail", iter_targets(target)))
+
+        async for domain, result, error in run_concurrently(
+            domain_list, lambda domain: _run_cloudfail_domain(domain, output_to_file, refresh), max_concurrency, timeout
+        ):
+            if isinstance(error, FileNotFoundError):
+                logging.error("Команда cloudfail не найдена. Убедитесь, что она установлена и доступна в PATH.")
+            elif error is not None:
+                logging.error(f"Ошибка при обработке {domain}: {error}")
+            if error is None:
+                mark_done(result)
+            results.append(result if error is None else error_result("cloudfail", domain, error))
+    except FileNotFoundError as e:
+        logging.error(f"Команда cloudfail не найдена. Убедитесь, что она установлена и доступна в PATH. ({e})")
+        results.append(error_result("cloudfail", target, e))
     except Exception as e:
         logging.error(f"Неожиданная ошибка: {e}")
 
-def run_cloudfail_sync(target: str, output_to_file: bool = True) -> None:
+    return results
+
+def run_cloudfail_sync(target: str, output_to_file: bool = True, max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> List[ToolResult]:
     """
     Функция для запуска асинхронной задачи run_cloudfail
     """
     if not target:
         logging.error("Домен не может быть пустым")
-        return
+        return []
 
-    asyncio.run(run_cloudfail(target, output_to_file))
\ No newline at end of file
+    return asyncio.run(run_cloudfail(target, output_to_file, max_concurrency))
@@ -1,61 +1,92 @@
 import asyncio
-import subprocess
-import os
 import logging
-from datetime import datetime
+from typing import List, Optional
 
-logging.basicConfig(level=logging.INFO)
+from tools.cache import cached_result, store_result
+from tools.dns import prefilter
+from tools.executor import DEFAULT_MAX_CONCURRENCY, run_concurrently
+from tools.journal import mark_done, pending
+from tools.logs import excerpt
+from tools.preflight import require_tool
+from tools.results import OriginIPParser, ToolResult, error_result
+from tools.store import save_run
+from tools.supervisor import run_supervised
+from tools.targets import iter_targets
 
-async def run_cloudunflare(domain: str, output_dir: str = "cloudunflare_results", output_to_file: bool = True) -> None:
+async def _run_cloudunflare_domain(domain: str, output_dir: str, output_to_file: bool, refresh: bool) -> ToolResult:
+    """
+    Запускает CloudUnflare для одного домена.
+    """
+    command = [*require_tool("cloudunflare"), domain]  # Команда для запуска CloudUnflare
+
+    cached = cached_result("cloudunflare", domain, command, refresh)
+    if cached is not None:
+        return cached
+
+    logging.info(f"Запуск CloudUnflare для домена: {domain}")
+    parser = OriginIPParser(domain, "cloudunflare")
+    result = await run_supervised("cloudunflare", command, parser=parser, label=f"CloudUnflare {domain}", capture=output_to_file)
+
+    if result.returncode == 0:
+        logging.info(f"Результаты CloudUnflare для {domain}: {result.lines} строк")
+    else:
+        logging.error(f"Ошибка при запуске CloudUnflare для {domain}: {excerpt(result.stderr)}")
+
+    tool_result = ToolResult("cloudunflare", domain, result.returncode, parser.records,
+                              error=result.stderr if result.returncode else "")
+    save_run(tool_result, result)
+    store_result(tool_result, command)
+    return tool_result
+
+async def run_cloudunflare(domain: str, output_dir: str = "cloudunflare_results", output_to_file: bool = True,
+                           max_concurrency: int = DEFAULT_MAX_CONCURRENCY, timeout: Optional[float] = None, refresh: bool = False) -> List[ToolResult]:
     """
     Асинхронная функция для запуска CloudUnflare.
 
-    :param domain: домен для поиска информации через CloudUnflare.
+    :param domain: домен или файл с доменами для поиска информации через CloudUnflare.
     :type domain: str
-    :param output_dir: директория для сохранения результатов.
+    :param output_dir: не используется, результаты сохраняются в хранилище (tools.store); оставлен для совместимости.
     :type output_dir: str
-    :param output_to_file: флаг, означающий, что результаты будут сохранены в файл.
+    :param output_to_file: флаг, означающий, что полный вывод будет сохранён в хранилище результатов.
     :type output_to_file: bool
+    :param max_concurrency: максимальное число одновременно запущенных процессов.
+    :type max_concurrency: int
+    :param timeout: таймаут в секундах на один домен.
+    :type timeout: float
+    :param refresh: игнорировать кэш и запустить инструмент заново.
+    :type refresh: bool
     """
+    results = []
     try:
-        os.makedirs(output_dir, exist_ok=True)
-        command = ["bash", "./CloudUnflare/cloudunflare.bash", domain]  # Команда для запуска CloudUnflare
-
-        logging.info(f"Запуск CloudUnflare для домена: {domain}")
-        process = await asyncio.create_subprocess_exec(
-            *command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-
-        stdout, stderr = await process.communicate()
-
-        # Преобразуем байтовые данные в строки
-        stdout_str = stdout.decode()
-        stderr_str = stderr.decode()
-
-        if process.returncode == 0:
-            logging.info(f"Результаты CloudUnflare для {domain}:")
-            logging.info(stdout_str)
-
-            if output_to_file:
-                file_name = f"{output_dir}/cloudunflare_results_{domain}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-                with open(file_name, "w") as f:
-                    f.write(stdout_str)
-                logging.info(f"Результаты сохранены в {file_name}")
-        else:
-            logging.error(f"Ошибка при запуске CloudUnflare для {domain}: {stderr_str}")
-    except FileNotFoundError:
-        logging.error("Команда CloudUnflare не найдена. Убедитесь, что cloudunflare.bash находится в рабочей директории.")
+        # Недоступный инструмент отсекается до разбора целей, без единого запуска процесса
+        require_tool("cloudunflare")
+        domain_list = prefilter(pending("cloudunflare", iter_targets(domain)))
+
+        async for item, result, error in run_concurrently(
+            domain_list, lambda item: _run_cloudunflare_domain(item, output_dir, output_to_file, refresh), max_concurrency, timeout
+        ):
+            if isinstance(error, FileNotFoundError):
+                logging.error("Команда CloudUnflare не найдена. Убедитесь, что cloudunflare.bash находится в рабочей директории.")
+            elif error is not None:
+                logging.error(f"Ошибка при обработке {item}: {error}")
+            if error is None:
+                mark_done(result)
+            results.append(result if error is None else error_result("cloudunflare", item, error))
+    except FileNotFoundError as e:
+        logging.error(f"Команда CloudUnflare не найдена. Убедитесь, что cloudunflare.bash находится в рабочей директории. ({e})")
+        results.append(error_result("cloudunflare", domain, e))
     except Exception as e:
         logging.error(f"Неожиданная ошибка: {e}")
 
-def run_cloudunflare_sync(domain: str, output_dir: str = "cloudunflare_results", output_to_file: bool = True) -> None:
+    return results
+
+def run_cloudunflare_sync(domain: str, output_dir: str = "cloudunflare_results", output_to_file: bool = True,
+                          max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> List[ToolResult]:
     """
     Функция для запуска асинхронной задачи run_cloudunflare синхронно
     """
     if not domain:
         logging.error("Домен не может быть пустым")
-        return
+        return []
 
-    asyncio.run(run_cloudunflare(domain, output_dir, output_to_file))
+    return asyncio.run(run_cloudunflare(domain, output_dir, output_to_file, max_concurrency))
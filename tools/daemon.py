@@ -0,0 +1,354 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from tools.executor import request_drain, reset_drain
+from tools.results import ToolResult, result_to_dict
+from tools.scheduler import DEFAULT_PRIORITY, PrioritySlots, Share, job_share, parse_priority
+from tools.store import get_store, result_sink
+
+# Unix-сокет API по умолчанию; относительный путь считается от текущей директории
+DEFAULT_SOCKET_PATH = os.environ.get("CFD_DAEMON_SOCKET", "cfd.sock")
+# Сколько заданий выполняется одновременно; остальные ждут в очереди по приоритету, задания с приоритетом high
+# не ждут вовсе (процессы всё равно ограничивает tools.governor, деля бюджет между заданиями по весу приоритета)
+MAX_RUNNING_JOBS = int(os.environ.get("CFD_DAEMON_JOBS", "4"))
+# Сколько завершённых заданий хранится для status/results; более старые забываются
+MAX_FINISHED_JOBS = 1000
+MAX_BODY = 1024 * 1024
+# Сколько ждать заголовков запроса от клиента
+REQUEST_TIMEOUT = 30.0
+
+STATUS_TEXT = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class Job:
+    """
+    Задание демона: разобранный запрос, состояние (queued, running, done, failed, cancelled),
+    результаты в порядке сохранения и доля планировщика с прогрессом выполнения.
+    """
+    __slots__ = ("id", "spec", "state", "created", "started", "finished", "results", "error", "task", "share", "_changed")
+
+    def __init__(self, spec: dict):
+        self.id = uuid.uuid4().hex
+        self.spec = spec
+        self.state = "queued"
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.results: List[ToolResult] = []
+        self.error = ""
+        self.task: Optional[asyncio.Task] = None
+        self.share: Optional[Share] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.finished is not None
+
+    def add(self, result: ToolResult) -> None:
+        self.results.append(result)
+        self._notify()
+
+    def _notify(self) -> None:
+        # Ждущие держат текущее событие; новое создаётся, чтобы следующее ожидание снова блокировалось
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def follow(self) -> AsyncIterator[ToolResult]:
+        """
+        Отдаёт уже сохранённые результаты задания, затем новые по мере появления, до его завершения.
+        """
+        position = 0
+        while True:
+            changed = self._changed
+            while position < len(self.results):
+                yield self.results[position]
+                position += 1
+            if self.done:
+                return
+            await changed.wait()
+
+    def to_dict(self) -> dict:
+        failed = sum(not result.ok for result in self.results)
+        return {
+            "id": self.id,
+            "state": self.state,
+            "tools": self.spec.get("tools"),
+            "targets": self.spec.get("targets"),
+            "priority": self.spec.get("priority", DEFAULT_PRIORITY),
+            "progress": self.share.progress() if self.share is not None else None,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "results": len(self.results),
+            "failed": failed,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    Очередь заданий одного долгоживущего цикла событий. Все задания делят кэши процесса:
+    найденные бинарники, кэш результатов, хранилище, DNS-резолвер и пул разбора вывода.
+
+    :param validate: проверяет тело запроса и возвращает описание задания (ValueError — ошибка клиента);
+        второй аргумент — пришёл ли запрос через Unix-сокет, а не по TCP.
+    :param runner: корутина, выполняющая задание и возвращающая все его результаты.
+    """
+
+    def __init__(self, validate: Callable[[Any, bool], dict], runner: Callable[[dict], Awaitable[List[ToolResult]]],
+                 max_running: int = MAX_RUNNING_JOBS):
+        self.validate = validate
+        self.runner = runner
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.accepting = True
+        self._slots = PrioritySlots(max_running)
+
+    def submit(self, payload: Any, local: bool = True) -> Job:
+        job = Job(self.validate(payload, local))
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job))
+        self._forget_finished()
+        logging.info(f"Задание {job.id} поставлено в очередь: {job.spec.get('tools')} для {len(job.spec.get('targets', []))} целей")
+        return job
+
+    async def _run(self, job: Job) -> None:
+        try:
+            priority = job.spec.get("priority", DEFAULT_PRIORITY)
+            async with self._slots.slot(parse_priority(priority)):
+                job.state = "running"
+                job.started = time.time()
+                # Результаты попадают в задание по мере сохранения (tools.store.save_run), а не в конце
+                result_sink.set(job.add)
+                with job_share(job.id, priority) as job.share:
+                    results = await self.runner(job.spec)
+            # Результаты из кэша не проходят через хранилище и добавляются в конце
+            saved = {id(result) for result in job.results}
+            for result in results:
+                if id(result) not in saved:
+                    job.results.append(result)
+            job.state = "done"
+        except asyncio.CancelledError:
+            job.state = "cancelled"
+        except Exception as e:
+            logging.error(f"Задание {job.id} завершилось ошибкой: {e}")
+            job.state = "failed"
+            job.error = str(e) or type(e).__name__
+        finally:
+            job.finished = time.time()
+            job._notify()
+            logging.info(f"Задание {job.id}: {job.state}, результатов {len(job.results)}")
+
+    def cancel(self, job: Job) -> None:
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+
+    def _forget_finished(self) -> None:
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    async def shutdown(self) -> None:
+        """
+        Перестаёт принимать задания, отменяет ещё не начатые и дожидается выполняющихся.
+        """
+        self.accepting = False
+        for job in self.jobs.values():
+            if job.state == "queued":
+                self.cancel(job)
+        tasks = [job.task for job in self.jobs.values() if job.task is not None and not job.task.done()]
+        if tasks:
+            logging.info(f"Ожидание {len(tasks)} незавершённых заданий")
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def cancel_all(self) -> None:
+        for job in self.jobs.values():
+            self.cancel(job)
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), REQUEST_TIMEOUT)
+    request_line, *header_lines = head.decode("latin-1").split("\r\n")
+    method, path, _ = request_line.split(" ", 2)
+    headers = {}
+    for line in header_lines:
+        name, _, value = line.partition(":")
+        if name:
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", "0"))
+    if length > MAX_BODY:
+        raise OverflowError(f"Тело запроса больше {MAX_BODY} байт")
+    body = await asyncio.wait_for(reader.readexactly(length), REQUEST_TIMEOUT) if length else b""
+    return method.upper(), path.split("?", 1)[0].rstrip("/") or "/", body
+
+
+def _head(status: int, content_type: str, length: Optional[int] = None) -> bytes:
+    lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}", f"Content-Type: {content_type}", "Connection: close"]
+    if length is not None:
+        lines.append(f"Content-Length: {length}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+
+async def _respond(writer: asyncio.StreamWriter, status: int, payload: Any) -> None:
+    body = json.dumps(payload, ensure_ascii=False).encode() + b"\n"
+    writer.write(_head(status, "application/json; charset=utf-8", len(body)) + body)
+    await writer.drain()
+
+
+async def _stream_results(writer: asyncio.StreamWriter, job: Job) -> None:
+    # NDJSON без Content-Length: конец выдачи — закрытие соединения после завершения задания
+    writer.write(_head(200, "application/x-ndjson; charset=utf-8"))
+    async for result in job.follow():
+        writer.write(json.dumps(result_to_dict(result), ensure_ascii=False).encode() + b"\n")
+        await writer.drain()
+    writer.write(json.dumps({"job": job.to_dict()}, ensure_ascii=False).encode() + b"\n")
+    await writer.drain()
+
+
+async def handle(manager: JobManager, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 local: bool = True) -> None:
+    """
+    HTTP API демона (одно обращение на соединение):
+
+        POST   /jobs              — поставить задание {"tools": ..., "targets": [...], "refresh": false}
+        GET    /jobs              — список заданий
+        GET    /jobs/<id>         — состояние задания
+        GET    /jobs/<id>/results — результаты потоком NDJSON до завершения задания
+        DELETE /jobs/<id>         — отменить задание
+        GET    /health            — состояние демона
+
+    local — соединение пришло через Unix-сокет (доступен только владельцу), а не по TCP.
+    """
+    try:
+        try:
+            method, path, body = await _read_request(reader)
+        except OverflowError as e:
+            await _respond(writer, 413, {"error": str(e)})
+            return
+        except (ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+            await _respond(writer, 400, {"error": "Некорректный HTTP-запрос"})
+            return
+
+        parts = path.strip("/").split("/")
+        if parts == ["health"] and method == "GET":
+            running = sum(job.state == "running" for job in manager.jobs.values())
+            queued = sum(job.state == "queued" for job in manager.jobs.values())
+            await _respond(writer, 200, {"status": "ok" if manager.accepting else "stopping",
+                                         "running": running, "queued": queued, "store": get_store().path})
+        elif parts == ["jobs"] and method == "POST":
+            if not manager.accepting:
+                await _respond(writer, 503, {"error": "Демон останавливается и не принимает задания"})
+                return
+            try:
+                job = manager.submit(json.loads(body or b"{}"), local)
+            except (ValueError, TypeError) as e:
+                await _respond(writer, 400, {"error": str(e)})
+                return
+            await _respond(writer, 202, job.to_dict())
+        elif parts == ["jobs"] and method == "GET":
+            await _respond(writer, 200, [job.to_dict() for job in manager.jobs.values()])
+        elif len(parts) in (2, 3) and parts[0] == "jobs":
+            job = manager.jobs.get(parts[1])
+            if job is None:
+                await _respond(writer, 404, {"error": f"Задание {parts[1]} не найдено"})
+            elif len(parts) == 3 and parts[2] == "results" and method == "GET":
+                await _stream_results(writer, job)
+            elif len(parts) == 2 and method == "GET":
+                await _respond(writer, 200, job.to_dict())
+            elif len(parts) == 2 and method == "DELETE":
+                manager.cancel(job)
+                await _respond(writer, 200, job.to_dict())
+            else:
+                await _respond(writer, 405 if len(parts) == 2 else 404, {"error": f"{method} {path} не поддерживается"})
+        else:
+            await _respond(writer, 404, {"error": f"{method} {path} не поддерживается"})
+    except (ConnectionError, asyncio.CancelledError):
+        # Клиент отключился (например, перестал следить за результатами) — задание продолжается
+        pass
+    except Exception as e:
+        logging.error(f"Ошибка обработки запроса к демону: {e}")
+        try:
+            await _respond(writer, 500, {"error": str(e)})
+        except ConnectionError:
+            pass
+    finally:
+        writer.close()
+
+
+async def serve(validate: Callable[[Any, bool], dict], runner: Callable[[dict], Awaitable[List[ToolResult]]],
+                socket_path: Optional[str] = DEFAULT_SOCKET_PATH, listen: Optional[str] = None,
+                max_running: int = MAX_RUNNING_JOBS) -> None:
+    """
+    Запускает демон в текущем цикле событий и работает до SIGINT/SIGTERM.
+    Первый сигнал прекращает приём заданий и выдачу новых целей и дожидается начатых запусков,
+    второй отменяет все задания.
+
+    :param socket_path: путь Unix-сокета (доступ только владельцу); None — без сокета.
+    :type socket_path: str
+    :param listen: "хост:порт" для TCP (только для доверенной сети: API без аутентификации).
+    :type listen: str
+    """
+    manager = JobManager(validate, runner, max_running)
+    servers = []
+    if socket_path:
+        if os.path.exists(socket_path):
+            # Сокет остался от прошлого запуска, если к нему никто не подключается
+            try:
+                _, probe = await asyncio.open_unix_connection(socket_path)
+                probe.close()
+                raise OSError(f"Демон уже запущен на {socket_path}")
+            except ConnectionRefusedError:
+                os.remove(socket_path)
+        server = await asyncio.start_unix_server(lambda r, w: handle(manager, r, w), socket_path)
+        os.chmod(socket_path, 0o600)
+        servers.append(server)
+        logging.info(f"Демон принимает задания на unix:{os.path.abspath(socket_path)}")
+    if listen:
+        host, _, port = listen.rpartition(":")
+        server = await asyncio.start_server(lambda r, w: handle(manager, r, w, local=False), host or "127.0.0.1", int(port))
+        servers.append(server)
+        logging.info(f"Демон принимает задания на http://{host or '127.0.0.1'}:{port}")
+    if not servers:
+        raise ValueError("Не задан ни Unix-сокет, ни адрес для демона")
+
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+
+    def on_signal():
+        if stop.is_set():
+            logging.warning("Повторный сигнал: все задания отменяются")
+            manager.cancel_all()
+        else:
+            logging.warning("Получен сигнал остановки: новые задания и цели не принимаются, ожидаем начатые")
+            stop.set()
+
+    reset_drain()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, on_signal)
+        except (NotImplementedError, RuntimeError):
+            pass
+    try:
+        await stop.wait()
+        manager.accepting = False
+        request_drain()
+        await manager.shutdown()
+    finally:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.remove_signal_handler(sig)
+            except (NotImplementedError, RuntimeError):
+                pass
+        for server in servers:
+            server.close()
+            await server.wait_closed()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+        get_store().flush()
@@ -0,0 +1,358 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import struct
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from tools.executor import run_concurrently
+from tools.scheduler import advance
+
+# Серверы имён: CFD_DNS_SERVERS="1.1.1.1,127.0.0.1:5353,[::1]:53", иначе из /etc/resolv.conf
+DNS_SERVERS = os.environ.get("CFD_DNS_SERVERS", "")
+RESOLV_CONF = "/etc/resolv.conf"
+DNS_TIMEOUT = 2.0
+DNS_ATTEMPTS = 3
+# Сколько запросов одновременно ждут ответа на одном сокете
+MAX_IN_FLIGHT = 256
+CACHE_SIZE = 100_000
+SOCKET_BUFFER = 1024 * 1024
+# TTL отрицательных ответов (NXDOMAIN, нет записей), если сервер не прислал SOA
+NEGATIVE_TTL = 300
+MAX_TTL = 24 * 3600
+
+QTYPES = {"A": 1, "NS": 2, "CNAME": 5, "SOA": 6, "AAAA": 28}
+RCODE_NOERROR = 0
+RCODE_SERVFAIL = 2
+RCODE_NXDOMAIN = 3
+
+# Пре-фильтр перед запуском внешних инструментов: цели без A-записей пропускаются
+prefilter_enabled = os.environ.get("CFD_DNS_PREFILTER", "") == "1"
+
+
+def set_prefilter(enabled: bool) -> None:
+    global prefilter_enabled
+    prefilter_enabled = enabled
+
+
+class DnsAnswer(NamedTuple):
+    name: str
+    qtype: str
+    addresses: Tuple[str, ...]
+    ttl: int
+    rcode: int
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.rcode == RCODE_NOERROR and bool(self.addresses)
+
+
+def build_query(qid: int, name: str, qtype: str) -> bytes:
+    # Заголовок: id, флаги (RD — рекурсивный запрос), один вопрос
+    header = struct.pack("!HHHHHH", qid, 0x0100, 1, 0, 0, 0)
+    labels = b"".join(len(label).to_bytes(1, "big") + label for label in name.encode("ascii").split(b".") if label)
+    return header + labels + b"\x00" + struct.pack("!HH", QTYPES[qtype], 1)
+
+
+def _read_name(data: bytes, offset: int) -> Tuple[str, int]:
+    """
+    Читает имя со сжатием (RFC 1035, 4.1.4); возвращает имя и смещение за ним.
+    """
+    labels = []
+    end = None
+    for _ in range(128):
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = struct.unpack_from("!H", data, offset)[0] & 0x3FFF
+            continue
+        offset += 1
+        if length == 0:
+            return ".".join(labels), end if end is not None else offset
+        labels.append(data[offset:offset + length].decode("ascii", errors="replace"))
+        offset += length
+    raise ValueError("Слишком длинная цепочка сжатия имени")
+
+
+def parse_response(data: bytes) -> Tuple[int, int, str, List[Tuple[str, int, int, str]], Optional[int]]:
+    """
+    Разбирает ответ сервера: (id, rcode, имя из вопроса, ответы [(имя, тип, ttl, значение)], минимальный TTL из SOA).
+    """
+    qid, flags, qdcount, ancount, nscount, _ = struct.unpack_from("!HHHHHH", data)
+    offset = 12
+    question = ""
+    for _ in range(qdcount):
+        question, offset = _read_name(data, offset)
+        offset += 4
+    answers = []
+    negative_ttl = None
+    for index in range(ancount + nscount):
+        name, offset = _read_name(data, offset)
+        rtype, _, ttl, length = struct.unpack_from("!HHIH", data, offset)
+        offset += 10
+        rdata = data[offset:offset + length]
+        if index < ancount:
+            if rtype == QTYPES["A"] and length == 4:
+                answers.append((name, rtype, ttl, socket.inet_ntop(socket.AF_INET, rdata)))
+            elif rtype == QTYPES["AAAA"] and length == 16:
+                answers.append((name, rtype, ttl, socket.inet_ntop(socket.AF_INET6, rdata)))
+            elif rtype == QTYPES["CNAME"]:
+                answers.append((name, rtype, ttl, _read_name(data, offset)[0]))
+        elif rtype == QTYPES["SOA"]:
+            # Отрицательный ответ кэшируется на min(TTL SOA, поле MINIMUM) (RFC 2308)
+            _, soa_end = _read_name(data, offset)
+            _, soa_end = _read_name(data, soa_end)
+            minimum = struct.unpack_from("!IIIII", data, soa_end)[4]
+            negative_ttl = min(ttl, minimum)
+        offset += length
+    return qid, flags & 0x000F, question, answers, negative_ttl
+
+
+def _parse_server(value: str) -> Tuple[str, int]:
+    value = value.strip()
+    if value.startswith("["):
+        host, _, port = value[1:].partition("]")
+        return host, int(port.lstrip(":") or 53)
+    if value.count(":") == 1:
+        host, port = value.split(":")
+        return host, int(port)
+    return value, 53
+
+
+def system_nameservers() -> List[Tuple[str, int]]:
+    if DNS_SERVERS:
+        return [_parse_server(server) for server in DNS_SERVERS.split(",") if server.strip()]
+    servers = []
+    try:
+        with open(RESOLV_CONF) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == "nameserver":
+                    # Адрес с зоной (fe80::1%eth0) asyncio не принимает, такие серверы пропускаются
+                    if "%" not in parts[1]:
+                        servers.append((parts[1], 53))
+    except OSError as e:
+        logging.warning(f"Не удалось прочитать {RESOLV_CONF}: {e}")
+    return servers or [("127.0.0.1", 53)]
+
+
+class _Protocol(asyncio.DatagramProtocol):
+    def __init__(self, resolver: "Resolver"):
+        self.resolver = resolver
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        self.resolver._on_datagram(data)
+
+
+class Resolver:
+    """
+    Асинхронный DNS-резолвер поверх UDP: один сокет на сервер имён, до max_in_flight запросов
+    одновременно, кэш ответов с учётом TTL (включая отрицательные) и объединение одинаковых запросов.
+    """
+
+    def __init__(self, nameservers: Optional[List[Tuple[str, int]]] = None, timeout: float = DNS_TIMEOUT,
+                 attempts: int = DNS_ATTEMPTS, max_in_flight: int = MAX_IN_FLIGHT, cache_size: int = CACHE_SIZE):
+        self.nameservers = nameservers or system_nameservers()
+        self.timeout = timeout
+        self.attempts = attempts
+        self.max_in_flight = max_in_flight
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[float, DnsAnswer]]" = OrderedDict()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._transports: List[asyncio.DatagramTransport] = []
+        self._sockets: List[socket.socket] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._ready: Optional[asyncio.Future] = None
+        self._pending: Dict[int, Tuple[str, asyncio.Future]] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    async def _ensure_transports(self) -> None:
+        # Сокеты и примитивы привязаны к циклу событий; новый asyncio.run получает новые, кэш сохраняется
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            # Другие запросы ждут, пока первый откроет сокеты
+            await asyncio.shield(self._ready)
+            return
+        self.close()
+        self._loop = loop
+        self._ready = loop.create_future()
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        try:
+            for host, port in self.nameservers:
+                family = socket.AF_INET6 if ":" in host else socket.AF_INET
+                sock = socket.socket(family, socket.SOCK_DGRAM)
+                self._sockets.append(sock)
+                sock.setblocking(False)
+                # Ответы на сотни одновременных запросов приходят пачкой; маленький буфер их теряет
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+                sock.connect((host, port))
+                transport, _ = await loop.create_datagram_endpoint(lambda: _Protocol(self), sock=sock)
+                self._transports.append(transport)
+        except BaseException as e:
+            self.close()
+            self._ready.set_exception(e if isinstance(e, Exception) else RuntimeError("DNS-резолвер не запущен"))
+            self._ready.exception()
+            raise
+        self._ready.set_result(None)
+
+    def _on_datagram(self, data: bytes) -> None:
+        if len(data) < 12:
+            return
+        qid = struct.unpack_from("!H", data)[0]
+        entry = self._pending.get(qid)
+        if entry is None:
+            return
+        name, future = entry
+        try:
+            response = parse_response(data)
+        except (ValueError, IndexError, struct.error) as e:
+            logging.debug(f"Некорректный DNS-ответ для {name}: {e}")
+            return
+        # Ответ принимается, только если вопрос совпадает с нашим (защита от подмены по id)
+        if response[2].lower().rstrip(".") == name and not future.done():
+            future.set_result(response)
+
+    def _cached(self, key: Tuple[str, str]) -> Optional[DnsAnswer]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires, answer = entry
+        if expires < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return answer
+
+    def _store(self, key: Tuple[str, str], answer: DnsAnswer) -> None:
+        self._cache[key] = (time.monotonic() + answer.ttl, answer)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def resolve(self, name: str, qtype: str = "A") -> DnsAnswer:
+        """
+        Адреса для имени (A или AAAA) с учётом цепочки CNAME.
+
+        :param name: доменное имя в ASCII (IDNA).
+        :type name: str
+        :param qtype: тип записи: "A" или "AAAA".
+        :type qtype: str
+        """
+        name = name.lower().rstrip(".")
+        key = (name, qtype)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        await self._ensure_transports()
+        # Одновременные запросы одного имени объединяются в один пакет
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+        future = self._loop.create_future()
+        self._inflight[key] = future
+        try:
+            answer = await self._query(name, qtype)
+            if answer.rcode != RCODE_SERVFAIL and not answer.error:
+                self._store(key, answer)
+            future.set_result(answer)
+            return answer
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение уже передано ожидающим; у future без них не будет предупреждения
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _query(self, name: str, qtype: str) -> DnsAnswer:
+        async with self._semaphore:
+            for attempt in range(self.attempts):
+                qid = random.randrange(65536)
+                while qid in self._pending:
+                    qid = random.randrange(65536)
+                future = self._loop.create_future()
+                self._pending[qid] = (name, future)
+                try:
+                    self._transports[attempt % len(self._transports)].sendto(build_query(qid, name, qtype))
+                    _, rcode, _, records, negative_ttl = await asyncio.wait_for(future, self.timeout)
+                except asyncio.TimeoutError:
+                    continue
+                except OSError as e:
+                    return DnsAnswer(name, qtype, (), 0, RCODE_SERVFAIL, str(e))
+                finally:
+                    del self._pending[qid]
+                addresses = tuple(value for _, rtype, _, value in records if rtype == QTYPES[qtype])
+                if rcode == RCODE_NOERROR and addresses:
+                    ttl = min(ttl for _, _, ttl, _ in records)
+                else:
+                    ttl = negative_ttl if negative_ttl is not None else NEGATIVE_TTL
+                return DnsAnswer(name, qtype, addresses, min(ttl, MAX_TTL), rcode)
+        return DnsAnswer(name, qtype, (), 0, RCODE_SERVFAIL, f"нет ответа за {self.attempts} попыток")
+
+    def close(self) -> None:
+        if self._loop is not None and not self._loop.is_closed():
+            for transport in self._transports:
+                transport.close()
+        else:
+            # Цикл уже закрыт (предыдущий asyncio.run), transport.close() в нём не выполнится
+            for sock in self._sockets:
+                sock.close()
+        self._transports = []
+        self._sockets = []
+        self._loop = None
+
+
+_default_resolver: Optional[Resolver] = None
+
+
+def get_resolver() -> Resolver:
+    global _default_resolver
+    if _default_resolver is None:
+        _default_resolver = Resolver()
+    return _default_resolver
+
+
+async def resolve(name: str, qtype: str = "A") -> DnsAnswer:
+    return await get_resolver().resolve(name, qtype)
+
+
+async def resolve_many(names: Iterable[str], qtype: str = "A",
+                       max_in_flight: int = MAX_IN_FLIGHT) -> AsyncIterator[DnsAnswer]:
+    """
+    Разрешает имена пачками на общем сокете и отдаёт ответы в порядке получения.
+    """
+    resolver = get_resolver()
+    async for name, answer, error in run_concurrently(names, lambda name: resolver.resolve(name, qtype), max_in_flight,
+                                                     progress=False):
+        yield answer if error is None else DnsAnswer(name, qtype, (), 0, RCODE_SERVFAIL, str(error))
+
+
+async def _resolvable(targets: Iterable[str]) -> AsyncIterator[str]:
+    skipped = 0
+    async for answer in resolve_many(targets):
+        if answer.ok:
+            yield answer.name
+        elif answer.rcode == RCODE_SERVFAIL:
+            # Сбой резолвинга не повод выбрасывать цель: пусть её проверит сам инструмент
+            yield answer.name
+        else:
+            skipped += 1
+            advance()
+            logging.debug(f"{answer.name}: нет A-записей (rcode {answer.rcode}), инструмент не запускается")
+    if skipped:
+        logging.info(f"DNS-фильтр: пропущено {skipped} целей без A-записей")
+
+
+def prefilter(targets: Iterable[str]) -> Union[Iterable[str], AsyncIterator[str]]:
+    """
+    Пропускает только цели, у которых есть A-записи (или не удалось проверить), если пре-фильтр включён;
+    иначе возвращает targets без изменений. Результат можно передавать в run_concurrently.
+    """
+    return _resolvable(targets) if prefilter_enabled else targets
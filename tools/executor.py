@@ -0,0 +1,123 @@
+import asyncio
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Optional, Tuple, Union
+
+from tools.metrics import queue_wait
+from tools.scheduler import advance
+
+DEFAULT_MAX_CONCURRENCY = 10
+
+# Плавная остановка: после request_drain() пулы не берут новые элементы, а начатые дорабатывают
+_draining = False
+
+
+def request_drain() -> None:
+    global _draining
+    _draining = True
+
+
+def draining() -> bool:
+    return _draining
+
+
+def reset_drain() -> None:
+    global _draining
+    _draining = False
+
+
+async def _iterate(items: Union[Iterable[Any], AsyncIterable[Any]]) -> AsyncIterator[Any]:
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def run_concurrently(
+    items: Union[Iterable[Any], AsyncIterable[Any]],
+    worker: Callable[[Any], Awaitable[Any]],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    timeout: Optional[float] = None,
+    progress: bool = True,
+) -> AsyncIterator[Tuple[Any, Any, Optional[BaseException]]]:
+    """
+    Асинхронный генератор, выполняющий worker для каждого элемента items не более чем
+    в max_concurrency параллельных задачах. Результаты отдаются в порядке завершения
+    в виде кортежей (элемент, результат, ошибка).
+
+    :param items: элементы для обработки (обычно домены), в том числе асинхронный итератор.
+    :type items: Iterable
+    :param worker: корутина, вызываемая для каждого элемента.
+    :type worker: Callable
+    :param max_concurrency: максимальное число одновременно выполняемых задач.
+    :type max_concurrency: int
+    :param timeout: таймаут в секундах на обработку одного элемента (None — без таймаута).
+    :type timeout: float
+    :param progress: учитывать обработанные элементы (список — по числу целей в нём) в прогрессе
+        текущего задания планировщика (tools.scheduler).
+    :type progress: bool
+    """
+    iterator = _iterate(items)
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    results: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def _process(item, waited):
+        queue_wait.set(waited)
+        try:
+            if timeout is not None:
+                result = await asyncio.wait_for(worker(item), timeout)
+            else:
+                result = await worker(item)
+            await results.put((item, result, None))
+        except asyncio.TimeoutError as e:
+            # Сообщение есть только у таймаутов, поднятых самим worker; пустое — сработал таймаут пула
+            await results.put((item, None, e if str(e) else TimeoutError(f"Превышен таймаут {timeout} с для {item}")))
+        except Exception as e:
+            await results.put((item, None, e))
+
+    async def _pool():
+        # Очередной элемент забирается только после освобождения слота,
+        # поэтому даже очень длинные списки не создают задач больше, чем max_concurrency
+        tasks = set()
+        queued = time.monotonic()
+        try:
+            while not _draining:
+                await semaphore.acquire()
+                if _draining:
+                    semaphore.release()
+                    break
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    semaphore.release()
+                    break
+                task = asyncio.create_task(_process(item, time.monotonic() - queued))
+                task.add_done_callback(lambda t: semaphore.release())
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await results.put(done)
+
+    pool = asyncio.create_task(_pool())
+    try:
+        while True:
+            entry = await results.get()
+            if entry is done:
+                break
+            if progress:
+                advance(len(entry[0]) if isinstance(entry[0], list) else 1)
+            yield entry
+        await pool
+    finally:
+        if not pool.done():
+            pool.cancel()
+            try:
+                await pool
+            except asyncio.CancelledError:
+                pass
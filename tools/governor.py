@@ -0,0 +1,243 @@
+import asyncio
+import ctypes
+import logging
+import os
+import platform
+import resource
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple
+
+from tools import metrics
+from tools.registry import get_tool, tool_weight
+from tools.scheduler import Waiter, current_share, get_scheduler
+
+# Общий бюджет веса одновременно запущенных процессов (вес инструмента — ToolSpec.weight или CLASS_WEIGHTS)
+CAPACITY = float(os.environ.get("CFD_CAPACITY", "0")) or (os.cpu_count() or 1) * 4
+# Новые процессы не запускаются, пока средняя загрузка за минуту выше MAX_LOAD...
+MAX_LOAD = float(os.environ.get("CFD_MAX_LOAD", "0")) or (os.cpu_count() or 1) * 1.5
+# ...свободной памяти меньше MIN_FREE_MEMORY_MB...
+MIN_FREE_MEMORY_MB = int(os.environ.get("CFD_MIN_FREE_MEMORY_MB", "512"))
+# ...или до предела открытых файлов осталось меньше FD_RESERVE (каждый процесс — три канала и их концы)
+FD_RESERVE = int(os.environ.get("CFD_FD_RESERVE", "64"))
+FDS_PER_PROCESS = 6
+# Показатели хоста читаются не чаще раза в SAMPLE_INTERVAL секунд; ожидающие перепроверяют их каждые POLL_INTERVAL
+SAMPLE_INTERVAL = 0.5
+POLL_INTERVAL = 1.0
+# Как часто повторять сообщение о том, почему запуски отложены
+DEFER_LOG_INTERVAL = 10.0
+# Резерв бюджета для заданий с высоким приоритетом (tools.scheduler): их первый процесс допускается сверх CAPACITY
+PRIORITY_RESERVE = float(os.environ.get("CFD_PRIORITY_RESERVE", "0")) or max(1.0, CAPACITY / 4)
+# CFD_GOVERNOR=0 отключает допуск по ресурсам (лимиты процессов при этом остаются)
+ENABLED = os.environ.get("CFD_GOVERNOR", "1") not in ("", "0")
+
+# Настройки дочерних процессов: приоритет CPU, класс ввода-вывода ("2:7" — best-effort, 7; "3" — idle; "" — не менять),
+# лимит виртуальной памяти (0 — без лимита; Go-бинарники резервируют много адресного пространства)
+# и oom_score_adj, чтобы при нехватке памяти ядро завершало инструмент, а не сам процесс запуска
+CHILD_NICE = int(os.environ.get("CFD_CHILD_NICE", "10"))
+CHILD_IONICE = os.environ.get("CFD_CHILD_IONICE", "2:7")
+CHILD_MEMORY_MB = int(os.environ.get("CFD_CHILD_MEMORY_MB", "0"))
+CHILD_OOM_SCORE_ADJ = int(os.environ.get("CFD_CHILD_OOM_SCORE_ADJ", "500"))
+
+# ioprio_set нет в стандартной библиотеке: номер системного вызова по архитектуре
+IOPRIO_SET = {"x86_64": 251, "aarch64": 30, "i686": 289, "armv7l": 314}
+IOPRIO_WHO_PGRP = 2
+IOPRIO_CLASS_SHIFT = 13
+_libc = None
+
+
+def read_host() -> Tuple[Optional[float], Optional[int], Optional[int]]:
+    """
+    Текущие показатели хоста: загрузка за минуту, доступная память в МБ и число открытых
+    файлов процесса. Недоступный на платформе показатель — None, и он не ограничивает запуск.
+    """
+    try:
+        load = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        load = None
+    memory = None
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    memory = int(line.split()[1]) // 1024
+                    break
+    except OSError:
+        pass
+    try:
+        fds = len(os.listdir("/proc/self/fd"))
+    except OSError:
+        fds = None
+    return load, memory, fds
+
+
+class Governor:
+    """
+    Допуск новых процессов инструментов по ресурсам всего хоста. Процесс запускается,
+    если его вес помещается в бюджет capacity и загрузка, свободная память и запас
+    дескрипторов в норме. Один процесс допускается всегда, чтобы запуск не встал
+    из-за нагрузки, созданной не нами. Из ожидающих процессов очередь определяет
+    tools.scheduler: запускается процесс задания с наименьшей использованной долей.
+    """
+
+    def __init__(self, capacity: float = CAPACITY, max_load: float = MAX_LOAD,
+                 min_free_memory_mb: int = MIN_FREE_MEMORY_MB, fd_reserve: int = FD_RESERVE,
+                 reserve: float = PRIORITY_RESERVE):
+        self.capacity = capacity
+        self.reserve = reserve
+        self.max_load = max_load
+        self.min_free_memory_mb = min_free_memory_mb
+        self.fd_reserve = fd_reserve
+        self.used = 0.0
+        self.running = 0
+        self.fd_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        self._sample: Tuple[Optional[float], Optional[int], Optional[int]] = (None, None, None)
+        self._sampled = 0.0
+        self._logged = 0.0
+        self._changed: Optional[asyncio.Future] = None
+        self._head: Tuple[tuple, Optional[Waiter]] = ((), None)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _bind(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Новый цикл событий (asyncio.run) — процессов прошлого цикла уже нет
+            self._changed = loop.create_future()
+            self._loop = loop
+            self.used = 0.0
+            self.running = 0
+
+    def _notify(self) -> None:
+        # Ждущие держат текущий future; новый создаётся, чтобы следующее ожидание снова блокировалось
+        changed, self._changed = self._changed, self._loop.create_future()
+        changed.set_result(None)
+
+    def host(self) -> Tuple[Optional[float], Optional[int], Optional[int]]:
+        now = time.monotonic()
+        if now - self._sampled >= SAMPLE_INTERVAL:
+            self._sample = read_host()
+            self._sampled = now
+        return self._sample
+
+    def fits(self, waiter: Waiter) -> bool:
+        # Резерв — только пока у задания нет своих процессов: он сокращает ожидание, а не расширяет бюджет
+        limit = self.capacity + (self.reserve if waiter.share.reserved and not waiter.share.running else 0)
+        return self.running == 0 or self.used + waiter.weight <= limit
+
+    def head(self) -> Optional[Waiter]:
+        # Первый в очереди из помещающихся в бюджет; пересчитывается только после изменений,
+        # а не каждым из проснувшихся ожидающих
+        state = (get_scheduler().version, self.used, self.running)
+        if self._head[0] != state:
+            self._head = (state, get_scheduler().head(self.fits))
+        return self._head[1]
+
+    def blocked_by(self, waiter: Waiter) -> Optional[str]:
+        """
+        Причина, по которой процесс waiter сейчас не запускается; None — можно запускать.
+        """
+        head = self.head()
+        if head is None:
+            return f"занят бюджет {self.used:g}/{self.capacity:g}"
+        if head is not waiter:
+            return f"очередь заданий: раньше запускается {head.tool} задания {head.share.name}"
+        if self.running == 0:
+            return None
+        load, memory, fds = self.host()
+        # Высокий приоритет не ждёт снижения загрузки: её, скорее всего, создают наши же процессы
+        if load is not None and load > self.max_load and not waiter.share.reserved:
+            return f"загрузка {load:.1f} выше {self.max_load:g}"
+        if memory is not None and memory < self.min_free_memory_mb:
+            return f"свободно {memory} МБ памяти, нужно не меньше {self.min_free_memory_mb}"
+        if fds is not None and self.fd_limit != resource.RLIM_INFINITY \
+                and fds + FDS_PER_PROCESS > self.fd_limit - self.fd_reserve:
+            return f"открыто {fds} файлов из {self.fd_limit}"
+        return None
+
+    @asynccontextmanager
+    async def admit(self, tool: str):
+        """
+        Ждёт допуска для одного процесса инструмента tool и держит его вес до выхода из блока.
+        """
+        if not ENABLED:
+            yield
+            return
+        scheduler = get_scheduler()
+        self._bind()
+        started = time.monotonic()
+        waiter = scheduler.enqueue(current_share.get(), tool, tool_weight(get_tool(tool)))
+        try:
+            while (reason := self.blocked_by(waiter)) is not None:
+                if time.monotonic() - self._logged >= DEFER_LOG_INTERVAL:
+                    self._logged = time.monotonic()
+                    logging.info(f"Запуск {tool} отложен: {reason} (выполняется процессов: {self.running})")
+                # Ждём освобождения слота, но не дольше POLL_INTERVAL: загрузка и память меняются и без нас.
+                # asyncio.wait, а не wait_for: wait_for теряет отмену, если ожидание завершилось в тот же момент
+                await asyncio.wait((self._changed,), timeout=POLL_INTERVAL)
+        except BaseException:
+            # Отменённый процесс мог быть первым в очереди: следующий не должен ждать POLL_INTERVAL
+            scheduler.cancel(waiter)
+            self._notify()
+            raise
+        # Проверка и занятие бюджета идут без await между ними, поэтому блокировка не нужна
+        estimate = scheduler.start(waiter)
+        self.used += waiter.weight
+        self.running += 1
+        # Следующий в очереди может поместиться в оставшийся бюджет
+        self._notify()
+        metrics.record_admission(tool, time.monotonic() - started)
+        running = time.monotonic()
+        try:
+            yield
+        finally:
+            scheduler.finish(waiter, estimate, time.monotonic() - running)
+            self.used -= waiter.weight
+            self.running -= 1
+            self._notify()
+
+
+def _ioprio_set(pgid: int, setting: str) -> None:
+    number = IOPRIO_SET.get(platform.machine())
+    if number is None or not setting:
+        return
+    io_class, _, level = setting.partition(":")
+    value = (int(io_class) << IOPRIO_CLASS_SHIFT) | int(level or 0)
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+    if _libc.syscall(number, IOPRIO_WHO_PGRP, pgid, value) != 0:
+        raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+
+
+def configure_child(pid: int) -> None:
+    """
+    Понижает приоритет и ограничивает ресурсы только что запущенного процесса инструмента.
+    Вызывается сразу после запуска (а не в preexec_fn, небезопасном при потоках в процессе);
+    процесс — лидер своей группы, поэтому nice и ionice задаются всей группе.
+    Ошибки не мешают запуску: процесс просто остаётся с настройками по умолчанию.
+    """
+    try:
+        if CHILD_NICE:
+            os.setpriority(os.PRIO_PGRP, pid, CHILD_NICE)
+        _ioprio_set(pid, CHILD_IONICE)
+        if hasattr(resource, "prlimit"):
+            resource.prlimit(pid, resource.RLIMIT_CORE, (0, 0))
+            if CHILD_MEMORY_MB:
+                limit = CHILD_MEMORY_MB * 1024 * 1024
+                resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+        if CHILD_OOM_SCORE_ADJ and os.path.exists(f"/proc/{pid}/oom_score_adj"):
+            with open(f"/proc/{pid}/oom_score_adj", "w") as f:
+                f.write(str(CHILD_OOM_SCORE_ADJ))
+    except (OSError, ValueError) as e:
+        # Процесс мог уже завершиться, или настройки заданы неверно
+        logging.debug(f"Не удалось настроить процесс {pid}: {e}")
+
+
+_default_governor: Optional[Governor] = None
+
+
+def get_governor() -> Governor:
+    global _default_governor
+    if _default_governor is None:
+        _default_governor = Governor()
+    return _default_governor
@@ -0,0 +1,103 @@
+import logging
+import os
+from typing import Any, Callable, Iterable, Iterator, Optional, Set, Tuple
+
+from tools.results import ToolResult
+from tools.scheduler import advance
+
+
+class Journal:
+    """
+    Журнал выполненных пар (инструмент, цель) для продолжения прерванного пакетного запуска.
+    Файл только дописывается по строке "инструмент<TAB>цель" на каждую успешно обработанную цель;
+    строка сбрасывается в ОС сразу, поэтому падение процесса не теряет уже записанный прогресс.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Set[Tuple[str, str]] = set()
+        self.skipped = 0
+        complete = True
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    # Оборванная последняя строка (процесс убит посреди записи) не считается
+                    complete = line.endswith("\n")
+                    tool, sep, target = line.rstrip("\n").partition("\t")
+                    if complete and sep and target:
+                        self.done.add((tool, target))
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        if not complete:
+            self._file.write("\n")
+
+    def is_done(self, tool: str, target: str) -> bool:
+        return (tool, target) in self.done
+
+    def mark(self, tool: str, target: str) -> None:
+        if (tool, target) in self.done:
+            return
+        self.done.add((tool, target))
+        self._file.write(f"{tool}\t{target}\n")
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+
+_active: Optional[Journal] = None
+
+
+def open_journal(path: str) -> Journal:
+    """
+    Включает журнал для всех обёрток; уже выполненные по нему цели будут пропущены.
+    """
+    global _active
+    close_journal()
+    _active = Journal(path)
+    if _active.done:
+        logging.info(f"Журнал {path}: {len(_active.done)} выполненных запусков будут пропущены")
+    return _active
+
+
+def close_journal() -> None:
+    global _active
+    if _active is not None:
+        _active.close()
+        _active = None
+
+
+def pending(tool: str, targets: Iterable[Any], key: Optional[Callable[[Any], str]] = None) -> Iterator[Any]:
+    """
+    Цели, которые ещё не выполнены инструментом по активному журналу.
+    Элементом может быть и часть списка целей (list) с меткой key(часть): в прогрессе задания
+    пропущенная часть учитывается по числу целей в ней.
+    """
+    if _active is None:
+        yield from targets
+        return
+    skipped = 0
+    for target in targets:
+        if _active.is_done(tool, key(target) if key is not None else target):
+            units = len(target) if isinstance(target, list) else 1
+            skipped += units
+            _active.skipped += units
+            advance(units)
+            continue
+        yield target
+    if skipped:
+        logging.info(f"{tool}: пропущено {skipped} целей, выполненных до перезапуска")
+
+
+def skipped() -> int:
+    # Сколько целей пропущено в этом процессе как выполненные ранее
+    return _active.skipped if _active is not None else 0
+
+
+def mark_done(result: ToolResult) -> None:
+    # Неудачные запуски не отмечаются, чтобы при продолжении их повторить
+    if _active is not None and result.ok:
+        _active.mark(result.tool, result.target)
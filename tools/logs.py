@@ -0,0 +1,174 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from typing import Optional
+
+# Уровень и формат журнала: text — строки для человека, json — по объекту на строку для сборщиков логов
+LOG_LEVEL = os.environ.get("CFD_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("CFD_LOG_FORMAT", "text")
+# Файл журнала в дополнение к stderr (переоткрывается после ротации logrotate)
+LOG_FILE = os.environ.get("CFD_LOG_FILE", "")
+# Сколько сообщений может ждать записи; при переполнении новые отбрасываются, а не тормозят цикл событий
+QUEUE_SIZE = int(os.environ.get("CFD_LOG_QUEUE_SIZE", "10000"))
+# Сколько символов вывода инструмента (stderr, строки stdout) попадает в одно сообщение;
+# полный вывод сохраняется только в результатах
+EXCERPT_CHARS = int(os.environ.get("CFD_LOG_EXCERPT", "2000"))
+# Сколько первых строк stdout каждого запуска выводить в журнал (0 — не выводить)
+OUTPUT_SAMPLE_LINES = int(os.environ.get("CFD_LOG_OUTPUT_LINES", "0"))
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+EVENTS_LOGGER = "cfd.events"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def excerpt(text: str, limit: int = EXCERPT_CHARS) -> str:
+    """
+    Укорачивает вывод инструмента для журнала: начало и конец (где обычно сама ошибка),
+    между ними — число пропущенных символов.
+    """
+    text = text.strip()
+    if len(text) <= limit:
+        return text
+    head = limit // 4
+    tail = limit - head
+    return f"{text[:head]} … [пропущено {len(text) - limit} символов] … {text[-tail:]}"
+
+
+def event(name: str, level: int = logging.INFO, **fields) -> None:
+    """
+    Структурированное событие (запуск, завершение, повтор процесса инструмента): имя и поля,
+    в текстовом журнале — "имя ключ=значение ...", в JSON — отдельные ключи.
+    """
+    logger = logging.getLogger(EVENTS_LOGGER)
+    if logger.isEnabledFor(level):
+        logger.log(level, name, extra={"event": name, "fields": fields})
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            message += " " + " ".join(f"{key}={_text_value(value)}" for key, value in fields.items())
+        return message
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "event", None):
+            data["event"] = record.event
+            data.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def _text_value(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    text = str(value)
+    return json.dumps(text, ensure_ascii=False) if not text or any(c.isspace() or c in '"=' for c in text) else text
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Кладёт сообщения в ограниченную очередь, не форматируя и не блокируясь: форматирование
+    и запись выполняет поток QueueListener. Переполненная очередь отбрасывает сообщения,
+    их число сообщается, как только место освободится.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Аргументы подставляются сразу (они могут измениться до записи), остальное форматирует поток записи
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            self.dropped += 1
+            return
+        except Exception:
+            self.handleError(record)
+            return
+        if self.dropped:
+            notice = logging.makeLogRecord({
+                "name": record.name, "levelno": logging.WARNING, "levelname": "WARNING",
+                "msg": f"Журнал не успевал за сообщениями, отброшено {self.dropped}",
+            })
+            try:
+                self.queue.put_nowait(notice)
+                self.dropped = 0
+            except queue.Full:
+                pass
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # При остановке очередь может быть полна: ждём места, а не теряем хвост журнала
+        self.queue.put(self._sentinel)
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, path: str = LOG_FILE) -> None:
+    """
+    Настраивает корневой логгер: сообщения из цикла событий только кладутся в очередь,
+    форматирует и пишет их в stderr (и в файл path) отдельный поток. Повторный вызов ничего не делает.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    formatter = JsonFormatter() if fmt == "json" else TextFormatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if path:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        handlers.append(logging.handlers.WatchedFileHandler(path, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(QUEUE_SIZE)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(log_queue))
+    root.setLevel(level)
+    _listener = _QueueListener(log_queue, *handlers)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """
+    Дописывает оставшиеся в очереди сообщения и останавливает поток записи.
+    """
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    for handler in listener.handlers[1:]:
+        handler.close()
+    # Сообщения после остановки (например, из обработчиков atexit) пишутся напрямую
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, _QueueHandler):
+            root.removeHandler(handler)
+            root.addHandler(listener.handlers[0])
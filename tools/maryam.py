@@ -1,67 +1,89 @@
 import asyncio
-import subprocess
-import os
 import logging
-from datetime import datetime
+from typing import List, Optional
 
-logging.basicConfig(level=logging.INFO)
+from tools.cache import cached_result, store_result
+from tools.executor import DEFAULT_MAX_CONCURRENCY, run_concurrently
+from tools.journal import mark_done, pending
+from tools.logs import excerpt
+from tools.preflight import require_tool
+from tools.results import FindingParser, ToolResult, error_result
+from tools.store import save_run
+from tools.supervisor import run_supervised
+from tools.targets import iter_targets
 
-async def run_maryam(targets: str, output_to_file: bool = True) -> None:
+async def _run_maryam_domain(domain: str, output_to_file: bool, refresh: bool) -> ToolResult:
+    """
+    Запускает OWASP Maryam для одного домена.
+    """
+    command = [*require_tool("maryam"), "-e", "info", "-d", domain]  # Команда для запуска OWASP Maryam
+
+    cached = cached_result("maryam", domain, command, refresh)
+    if cached is not None:
+        return cached
+
+    logging.info(f"Запуск Maryam для домена: {domain}")
+    parser = FindingParser(domain, "maryam")
+    result = await run_supervised("maryam", command, parser=parser, label=f"Maryam {domain}", capture=output_to_file)
+
+    if result.returncode == 0:
+        logging.info(f"Результаты Maryam для {domain}: {result.lines} строк")
+    else:
+        logging.error(f"Ошибка при запуске Maryam для {domain}: {excerpt(result.stderr)}")
+
+    tool_result = ToolResult("maryam", domain, result.returncode, parser.records,
+                              error=result.stderr if result.returncode else "")
+    save_run(tool_result, result)
+    store_result(tool_result, command)
+    return tool_result
+
+async def run_maryam(targets: str, output_to_file: bool = True, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                     timeout: Optional[float] = None, refresh: bool = False) -> List[ToolResult]:
     """
     Асинхронная функция для запуска OWASP Maryam.
 
     :param targets: файл с доменами или один домен для проверки.
     :type targets: str
-    :param output_to_file: флаг, означающий, что результаты будут сохранены в файл.
+    :param output_to_file: флаг, означающий, что полный вывод будет сохранён в хранилище результатов.
     :type output_to_file: bool
+    :param max_concurrency: максимальное число одновременно запущенных процессов.
+    :type max_concurrency: int
+    :param timeout: таймаут в секундах на один домен.
+    :type timeout: float
+    :param refresh: игнорировать кэш и запустить инструмент заново.
+    :type refresh: bool
     """
+    results = []
     try:
+        # Недоступный инструмент отсекается до разбора целей, без единого запуска процесса
+        require_tool("maryam")
         # Если targets это файл, читаем домены из файла, иначе используем как один домен
-        if os.path.isfile(targets):
-            with open(targets, "r") as file:
-                domain_list = file.read().splitlines()
-        else:
-            domain_list = [targets]
+        domain_list = pending("maryam", iter_targets(targets))
 
-        for domain in domain_list:
-            command = ["maryam", "-e", "info", "-d", domain]  # Команда для запуска OWASP Maryam
-
-            logging.info(f"Запуск Maryam для домена: {domain}")
-            process = await asyncio.create_subprocess_exec(
-                *command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-
-            stdout, stderr = await process.communicate()
-
-            # Преобразуем байтовые данные в строки
-            stdout_str = stdout.decode()
-            stderr_str = stderr.decode()
-
-            if process.returncode == 0:
-                logging.info(f"Результаты Maryam для {domain}:")
-                logging.info(stdout_str)
-
-                if output_to_file:
-                    file_name = f"maryam_results_{domain}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-                    with open(file_name, "w") as f:
-                        f.write(stdout_str)
-                    logging.info(f"Результаты сохранены в {file_name}")
-            else:
-                logging.error(f"Ошибка при запуске Maryam для {domain}: {stderr_str}")
-    except FileNotFoundError:
-        logging.error("Команда Maryam не найдена. Убедитесь, что она установлена и доступна в PATH.")
+        async for domain, result, error in run_concurrently(
+            domain_list, lambda domain: _run_maryam_domain(domain, output_to_file, refresh), max_concurrency, timeout
+        ):
+            if isinstance(error, FileNotFoundError):
+                logging.error("Команда Maryam не найдена. Убедитесь, что она установлена и доступна в PATH.")
+            elif error is not None:
+                logging.error(f"Ошибка при обработке {domain}: {error}")
+            if error is None:
+                mark_done(result)
+            results.append(result if error is None else error_result("maryam", domain, error))
+    except FileNotFoundError as e:
+        logging.error(f"Команда Maryam не найдена. Убедитесь, что она установлена и доступна в PATH. ({e})")
+        results.append(error_result("maryam", targets, e))
     except Exception as e:
         logging.error(f"Неожиданная ошибка: {e}")
 
-def run_maryam_sync(targets: str, output_to_file: bool = True) -> None:
+    return results
+
+def run_maryam_sync(targets: str, output_to_file: bool = True, max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> List[ToolResult]:
     """
     Функция для запуска асинхронной задачи run_maryam синхронно
     """
     if not targets:
         logging.error("Файл с доменами или домен не может быть пустым")
-        return
-
-    asyncio.run(run_maryam(targets, output_to_file))
+        return []
 
+    return asyncio.run(run_maryam(targets, output_to_file, max_concurrency))
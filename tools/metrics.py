@@ -0,0 +1,191 @@
+import contextvars
+import json
+import os
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# Время ожидания текущей задачи в очереди пула; выставляется executor'ом в контексте задачи
+queue_wait: contextvars.ContextVar = contextvars.ContextVar("queue_wait", default=0.0)
+
+# Границы корзин гистограммы длительности запуска, секунды
+WALL_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+# Размер равномерной выборки длительностей для перцентилей
+SAMPLE_SIZE = 10000
+
+
+@dataclass(slots=True)
+class ToolMetrics:
+    runs: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    spawn_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    cpu_user_seconds: float = 0.0
+    cpu_system_seconds: float = 0.0
+    stdout_bytes: int = 0
+    stderr_bytes: int = 0
+    queue_wait_seconds: float = 0.0
+    admission_wait_seconds: float = 0.0
+    max_wall_seconds: float = 0.0
+    wall_buckets: List[int] = field(default_factory=lambda: [0] * len(WALL_BUCKETS))
+    exit_codes: Dict[str, int] = field(default_factory=dict)
+    wall_samples: List[float] = field(default_factory=list)
+
+
+_metrics: Dict[str, ToolMetrics] = {}
+
+
+def _tool(tool: str) -> ToolMetrics:
+    if tool not in _metrics:
+        _metrics[tool] = ToolMetrics()
+    return _metrics[tool]
+
+
+def _observe_wall(metrics: ToolMetrics, seconds: float) -> None:
+    metrics.wall_seconds += seconds
+    metrics.max_wall_seconds = max(metrics.max_wall_seconds, seconds)
+    for index, bound in enumerate(WALL_BUCKETS):
+        if seconds <= bound:
+            metrics.wall_buckets[index] += 1
+    # Reservoir sampling: выборка остаётся равномерной при любом числе запусков
+    if len(metrics.wall_samples) < SAMPLE_SIZE:
+        metrics.wall_samples.append(seconds)
+    else:
+        index = random.randrange(metrics.runs)
+        if index < SAMPLE_SIZE:
+            metrics.wall_samples[index] = seconds
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def record_run(tool: str, result) -> None:
+    """
+    Учитывает завершённый запуск инструмента (StreamResult).
+    """
+    metrics = _tool(tool)
+    metrics.runs += 1
+    if result.returncode != 0:
+        metrics.failures += 1
+    code = str(result.returncode)
+    metrics.exit_codes[code] = metrics.exit_codes.get(code, 0) + 1
+    metrics.spawn_seconds += result.spawn_latency
+    metrics.cpu_user_seconds += result.cpu_user
+    metrics.cpu_system_seconds += result.cpu_system
+    metrics.stdout_bytes += result.bytes
+    metrics.stderr_bytes += result.stderr_bytes
+    metrics.queue_wait_seconds += queue_wait.get()
+    _observe_wall(metrics, result.wall_time)
+
+
+def record_timeout(tool: str, seconds: float) -> None:
+    metrics = _tool(tool)
+    metrics.runs += 1
+    metrics.failures += 1
+    metrics.timeouts += 1
+    metrics.exit_codes["timeout"] = metrics.exit_codes.get("timeout", 0) + 1
+    metrics.queue_wait_seconds += queue_wait.get()
+    _observe_wall(metrics, seconds)
+
+
+def record_admission(tool: str, seconds: float) -> None:
+    # Ожидание допуска по ресурсам хоста (tools.governor), отдельно от очереди пула
+    _tool(tool).admission_wait_seconds += seconds
+
+
+def summary() -> dict:
+    """
+    Сводка по инструментам для вывода в JSON в конце пакетного запуска.
+    """
+    report = {}
+    for tool, metrics in sorted(_metrics.items()):
+        report[tool] = {
+            "runs": metrics.runs,
+            "failures": metrics.failures,
+            "timeouts": metrics.timeouts,
+            "exit_codes": dict(metrics.exit_codes),
+            "spawn_seconds_avg": metrics.spawn_seconds / metrics.runs if metrics.runs else 0.0,
+            "wall_seconds_total": metrics.wall_seconds,
+            "wall_seconds_avg": metrics.wall_seconds / metrics.runs if metrics.runs else 0.0,
+            "wall_seconds_p50": percentile(metrics.wall_samples, 0.50),
+            "wall_seconds_p95": percentile(metrics.wall_samples, 0.95),
+            "wall_seconds_p99": percentile(metrics.wall_samples, 0.99),
+            "wall_seconds_max": metrics.max_wall_seconds,
+            "cpu_user_seconds": metrics.cpu_user_seconds,
+            "cpu_system_seconds": metrics.cpu_system_seconds,
+            "stdout_bytes": metrics.stdout_bytes,
+            "stderr_bytes": metrics.stderr_bytes,
+            "queue_wait_seconds_avg": metrics.queue_wait_seconds / metrics.runs if metrics.runs else 0.0,
+            "admission_wait_seconds_total": metrics.admission_wait_seconds,
+        }
+    return report
+
+
+def prometheus_text() -> str:
+    """
+    Метрики в текстовом формате Prometheus (для node_exporter textfile collector).
+    """
+    tools = sorted(_metrics.items())
+    lines = []
+
+    def family(name: str, kind: str, samples) -> None:
+        # Все строки одного семейства метрик должны идти подряд после его TYPE
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{{{labels}}} {value}")
+
+    family("cfd_tool_runs_total", "counter", ((f'tool="{t}"', m.runs) for t, m in tools))
+    family("cfd_tool_failures_total", "counter", ((f'tool="{t}"', m.failures) for t, m in tools))
+    family("cfd_tool_timeouts_total", "counter", ((f'tool="{t}"', m.timeouts) for t, m in tools))
+    family("cfd_tool_spawn_seconds_total", "counter", ((f'tool="{t}"', f"{m.spawn_seconds:.6f}") for t, m in tools))
+    family("cfd_tool_cpu_seconds_total", "counter", [
+        sample for t, m in tools for sample in (
+            (f'tool="{t}",mode="user"', f"{m.cpu_user_seconds:.6f}"),
+            (f'tool="{t}",mode="system"', f"{m.cpu_system_seconds:.6f}"),
+        )
+    ])
+    family("cfd_tool_output_bytes_total", "counter", [
+        sample for t, m in tools for sample in (
+            (f'tool="{t}",stream="stdout"', m.stdout_bytes),
+            (f'tool="{t}",stream="stderr"', m.stderr_bytes),
+        )
+    ])
+    family("cfd_tool_queue_wait_seconds_total", "counter",
+           ((f'tool="{t}"', f"{m.queue_wait_seconds:.6f}") for t, m in tools))
+    family("cfd_tool_admission_wait_seconds_total", "counter",
+           ((f'tool="{t}"', f"{m.admission_wait_seconds:.6f}") for t, m in tools))
+
+    lines.append("# TYPE cfd_tool_wall_seconds histogram")
+    for t, m in tools:
+        for bound, count in zip(WALL_BUCKETS, m.wall_buckets):
+            lines.append(f'cfd_tool_wall_seconds_bucket{{tool="{t}",le="{bound}"}} {count}')
+        lines += [
+            f'cfd_tool_wall_seconds_bucket{{tool="{t}",le="+Inf"}} {m.runs}',
+            f'cfd_tool_wall_seconds_sum{{tool="{t}"}} {m.wall_seconds:.6f}',
+            f'cfd_tool_wall_seconds_count{{tool="{t}"}} {m.runs}',
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str) -> None:
+    # Запись через временный файл, чтобы сборщик не прочитал файл наполовину
+    with open(f"{path}.tmp", "w") as f:
+        f.write(prometheus_text())
+    os.replace(f"{path}.tmp", path)
+
+
+def write_summary(path: Optional[str] = None) -> str:
+    report = json.dumps(summary(), ensure_ascii=False, indent=2)
+    if path:
+        with open(path, "w") as f:
+            f.write(report)
+    return report
+
+
+def reset() -> None:
+    _metrics.clear()
@@ -0,0 +1,133 @@
+import asyncio
+import atexit
+import logging
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Optional
+
+from tools.results import PARSERS, parse_chunk
+
+# Число процессов для разбора вывода; пул создаётся только при первом большом выводе.
+# На одном ядре пул только добавляет накладные расходы, и разбор всегда идёт в цикле событий.
+POOL_WORKERS = int(os.environ.get("CFD_PARSE_WORKERS", "0")) or os.cpu_count() or 1
+OFFLOAD_ENABLED = POOL_WORKERS > 1
+# Вывод до INLINE_BYTES разбирается прямо в цикле событий: для мелких запусков пул дороже самого разбора
+INLINE_BYTES = 1024 * 1024
+CHUNK_BYTES = 1024 * 1024
+# Слияние результатов куска идёт порциями, между ними цикл событий обслуживает другие задачи
+MERGE_SLICE = 5000
+# Сколько кусков одного потока может ждать разбора; дальше чтение stdout приостанавливается
+MAX_PENDING_CHUNKS = 2
+
+_pool: Optional[ProcessPoolExecutor] = None
+_slots: Optional[asyncio.Semaphore] = None
+_slots_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # forkserver: дочерние процессы не наследуют потоки (запись в хранилище) и сокеты родителя
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        _pool = ProcessPoolExecutor(POOL_WORKERS, mp_context=context)
+        logging.info(f"Запущен пул разбора вывода: {POOL_WORKERS} процессов")
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+def _pool_slots() -> asyncio.Semaphore:
+    # Общий лимит задач в пуле на все потоки вывода: очередь пула не растёт без ограничений
+    global _slots, _slots_loop
+    loop = asyncio.get_running_loop()
+    if _slots_loop is not loop:
+        _slots = asyncio.Semaphore(POOL_WORKERS * 2)
+        _slots_loop = loop
+    return _slots
+
+
+async def run_in_pool(func: Callable[..., Any], *args: Any) -> Any:
+    """
+    Выполняет func(*args) в пуле процессов, не блокируя цикл событий.
+    Если пул недоступен (сломан или не запускается), функция выполняется в потоке.
+    """
+    async with _pool_slots():
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(get_pool(), func, *args)
+        except (BrokenProcessPool, OSError) as e:
+            logging.error(f"Пул разбора вывода недоступен ({e}), разбор выполняется в потоке")
+            shutdown_pool()
+            return await asyncio.to_thread(func, *args)
+
+
+class OffloadFeeder:
+    """
+    Передаёт вывод процесса парсеру: первые INLINE_BYTES — построчно в цикле событий,
+    дальше — кусками по CHUNK_BYTES в пул процессов. Результаты кусков сливаются в парсер
+    строго по порядку; при MAX_PENDING_CHUNKS ожидающих кусках feed() ждёт, и чтение
+    stdout (а с ним и сам процесс) приостанавливается. Парсеры, которых нет в PARSERS
+    (например, tools.batch.BatchParser), всегда работают построчно.
+    """
+    __slots__ = ("parser", "offload", "total", "buffer", "buffered", "pending")
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.offload = OFFLOAD_ENABLED and type(parser).__name__ in PARSERS
+        self.total = 0
+        self.buffer = []
+        self.buffered = 0
+        self.pending: Deque[asyncio.Future] = deque()
+
+    async def feed(self, line: bytes) -> None:
+        self.total += len(line)
+        if self.total <= INLINE_BYTES or not self.offload:
+            self.parser.feed(line.decode(errors="replace").rstrip("\r\n"))
+            return
+        self.buffer.append(line)
+        self.buffered += len(line)
+        if self.buffered >= CHUNK_BYTES:
+            await self._submit()
+
+    async def _submit(self) -> None:
+        data = b"".join(self.buffer)
+        self.buffer = []
+        self.buffered = 0
+        parser = self.parser
+        self.pending.append(asyncio.ensure_future(
+            run_in_pool(parse_chunk, type(parser).__name__, parser.domain, parser.source, data)
+        ))
+        while len(self.pending) > MAX_PENDING_CHUNKS or (self.pending and self.pending[0].done()):
+            await self._merge(await self.pending.popleft())
+
+    async def _merge(self, values) -> None:
+        for start in range(0, len(values), MERGE_SLICE):
+            self.parser.merge(values[start:start + MERGE_SLICE])
+            await asyncio.sleep(0)
+
+    async def close(self) -> None:
+        """
+        Разбирает остаток буфера и дожидается всех кусков.
+        """
+        if self.buffer:
+            await self._submit()
+        while self.pending:
+            await self._merge(await self.pending.popleft())
+
+    def cancel(self) -> None:
+        for future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.buffer = []
@@ -1,61 +1,91 @@
 import asyncio
-import subprocess
-import os
 import logging
-from datetime import datetime
+from typing import List, Optional
 
-logging.basicConfig(level=logging.INFO)
+from tools.cache import cached_result, store_result
+from tools.executor import DEFAULT_MAX_CONCURRENCY, run_concurrently
+from tools.journal import mark_done, pending
+from tools.logs import excerpt
+from tools.preflight import require_tool
+from tools.results import FindingParser, ToolResult, error_result
+from tools.store import save_run
+from tools.supervisor import run_supervised
+from tools.targets import iter_targets
 
-async def run_osrframework(username: str, output_dir: str = "osrframework_results", output_to_file: bool = True) -> None:
+async def _run_osrframework_username(username: str, output_dir: str, output_to_file: bool, refresh: bool) -> ToolResult:
+    """
+    Запускает OSRFramework (usufy.py) для одного имени пользователя.
+    """
+    command = [*require_tool("osrframework"), username]
+
+    cached = cached_result("osrframework", username, command, refresh)
+    if cached is not None:
+        return cached
+
+    logging.info(f"Запуск OSRFramework (usufy.py) для пользователя: {username}")
+    parser = FindingParser(username, "osrframework")
+    result = await run_supervised("osrframework", command, parser=parser, label=f"OSRFramework {username}", capture=output_to_file)
+
+    if result.returncode == 0:
+        logging.info(f"Результаты OSRFramework для {username}: {result.lines} строк")
+    else:
+        logging.error(f"Ошибка при запуске OSRFramework для {username}: {excerpt(result.stderr)}")
+
+    tool_result = ToolResult("osrframework", username, result.returncode, parser.records,
+                              error=result.stderr if result.returncode else "")
+    save_run(tool_result, result)
+    store_result(tool_result, command)
+    return tool_result
+
+async def run_osrframework(username: str, output_dir: str = "osrframework_results", output_to_file: bool = True,
+                           max_concurrency: int = DEFAULT_MAX_CONCURRENCY, timeout: Optional[float] = None, refresh: bool = False) -> List[ToolResult]:
     """
     Асинхронная функция для запуска OSRFramework (например, usufy.py).
 
-    :param username: имя пользователя для поиска информации через OSRFramework.
+    :param username: имя пользователя или файл с именами для поиска информации через OSRFramework.
     :type username: str
-    :param output_dir: директория для сохранения результатов.
+    :param output_dir: не используется, результаты сохраняются в хранилище (tools.store); оставлен для совместимости.
     :type output_dir: str
-    :param output_to_file: флаг, означающий, что результаты будут сохранены в файл.
+    :param output_to_file: флаг, означающий, что полный вывод будет сохранён в хранилище результатов.
     :type output_to_file: bool
+    :param max_concurrency: максимальное число одновременно запущенных процессов.
+    :type max_concurrency: int
+    :param timeout: таймаут в секундах на одно имя пользователя.
+    :type timeout: float
+    :param refresh: игнорировать кэш и запустить инструмент заново.
+    :type refresh: bool
     """
+    results = []
     try:
-        os.makedirs(output_dir, exist_ok=True)
-        command = ["python3", "./osrframework/usufy.py", username]
-
-        logging.info(f"Запуск OSRFramework (usufy.py) для пользователя: {username}")
-        process = await asyncio.create_subprocess_exec(
-            *command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-
-        stdout, stderr = await process.communicate()
-
-        # Преобразуем байтовые данные в строки
-        stdout_str = stdout.decode()
-        stderr_str = stderr.decode()
-
-        if process.returncode == 0:
-            logging.info(f"Результаты OSRFramework для {username}:")
-            logging.info(stdout_str)
-
-            if output_to_file:
-                file_name = f"{output_dir}/osrframework_results_{username}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-                with open(file_name, "w") as f:
-                    f.write(stdout_str)
-                logging.info(f"Результаты сохранены в {file_name}")
-        else:
-            logging.error(f"Ошибка при запуске OSRFramework для {username}: {stderr_str}")
-    except FileNotFoundError:
-        logging.error("Команда OSRFramework не найдена. Убедитесь, что usufy.py находится в рабочей директории.")
+        # Недоступный инструмент отсекается до разбора целей, без единого запуска процесса
+        require_tool("osrframework")
+        username_list = pending("osrframework", iter_targets(username, kind="username"))
+
+        async for item, result, error in run_concurrently(
+            username_list, lambda item: _run_osrframework_username(item, output_dir, output_to_file, refresh), max_concurrency, timeout
+        ):
+            if isinstance(error, FileNotFoundError):
+                logging.error("Команда OSRFramework не найдена. Убедитесь, что usufy.py находится в рабочей директории.")
+            elif error is not None:
+                logging.error(f"Ошибка при обработке {item}: {error}")
+            if error is None:
+                mark_done(result)
+            results.append(result if error is None else error_result("osrframework", item, error))
+    except FileNotFoundError as e:
+        logging.error(f"Команда OSRFramework не найдена. Убедитесь, что usufy.py находится в рабочей директории. ({e})")
+        results.append(error_result("osrframework", username, e))
     except Exception as e:
         logging.error(f"Неожиданная ошибка: {e}")
 
-def run_osrframework_sync(username: str, output_dir: str = "osrframework_results", output_to_file: bool = True) -> None:
+    return results
+
+def run_osrframework_sync(username: str, output_dir: str = "osrframework_results", output_to_file: bool = True,
+                          max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> List[ToolResult]:
     """
     Функция для запуска асинхронной задачи run_osrframework синхронно.
     """
     if not username:
         logging.error("Имя пользователя не может быть пустым")
-        return
+        return []
 
-    asyncio.run(run_osrframework(username, output_dir, output_to_file))
\ No newline at end of file
+    return asyncio.run(run_osrframework(username, output_dir, output_to_file, max_concurrency))
@@ -0,0 +1,93 @@
+import functools
+import logging
+import os
+import shutil
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from tools.registry import get_registry, get_tool
+
+# Директория со скриптами инструментов (CloudUnflare/, catphish/, hatcloud.rb ...).
+# Относительные пути ищутся в ней, рядом с app.py и в текущей директории.
+TOOLS_HOME = os.environ.get("CFD_TOOLS_HOME", "")
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Куда ставят бинарники go install и pip install --user, если их нет в PATH
+EXTRA_BIN_DIRS = [os.path.expanduser(os.path.join("~", "go", "bin")), os.path.expanduser(os.path.join("~", ".local", "bin"))]
+SCRIPT_SUFFIXES = (".rb", ".py", ".sh", ".bash")
+# Составные инструменты без своего бинарника доступны, только если доступны инструменты, на которых они построены
+REQUIRES = {"chain": ("subfinder",)}
+
+
+class Preflight(NamedTuple):
+    name: str
+    command: Optional[Tuple[str, ...]]
+    reason: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.command is not None
+
+
+def search_dirs() -> List[str]:
+    return [path for path in (TOOLS_HOME, PROJECT_ROOT, os.getcwd()) if path]
+
+
+def resolve_binary(binary: str) -> Optional[str]:
+    """
+    Абсолютный путь к исполняемому файлу или скрипту инструмента, None если он не найден.
+    """
+    if os.sep in binary or binary.endswith(SCRIPT_SUFFIXES):
+        for base in search_dirs():
+            path = os.path.abspath(os.path.join(base, binary))
+            if os.path.isfile(path):
+                return path
+        return None
+    return shutil.which(binary) or shutil.which(binary, path=os.pathsep.join(EXTRA_BIN_DIRS))
+
+
+@functools.lru_cache(maxsize=None)
+def preflight(name: str) -> Preflight:
+    """
+    Проверяет наличие интерпретатора и бинарника инструмента. Результат кэшируется,
+    поэтому поиск по файловой системе выполняется один раз за процесс.
+    """
+    spec = get_tool(name)
+    if spec.binary is None:
+        for required in REQUIRES.get(spec.name, ()):
+            check = preflight(required)
+            if not check.ok:
+                return Preflight(spec.name, None, f"нужен {required}: {check.reason}")
+        return Preflight(spec.name, ())
+    command = []
+    if spec.interpreter:
+        interpreter = shutil.which(spec.interpreter)
+        if interpreter is None:
+            return Preflight(spec.name, None, f"интерпретатор {spec.interpreter} не найден в PATH")
+        command.append(interpreter)
+    binary = resolve_binary(spec.binary)
+    if binary is None:
+        places = search_dirs() if os.sep in spec.binary or spec.binary.endswith(SCRIPT_SUFFIXES) else ["PATH", *EXTRA_BIN_DIRS]
+        return Preflight(spec.name, None, f"{spec.binary} не найден ({', '.join(places)})")
+    command.append(binary)
+    return Preflight(spec.name, tuple(command))
+
+
+def require_tool(name: str) -> List[str]:
+    """
+    Разрешённая команда запуска инструмента; FileNotFoundError, если инструмент недоступен.
+    """
+    result = preflight(name)
+    if not result.ok:
+        raise FileNotFoundError(f"{result.name}: {result.reason}")
+    return list(result.command)
+
+
+def preflight_all() -> Dict[str, Preflight]:
+    results = {spec.name: preflight(spec.name) for spec in get_registry().values()}
+    for result in results.values():
+        if not result.ok:
+            logging.warning(f"Инструмент {result.name} недоступен: {result.reason}")
+    return results
+
+
+def reset_preflight() -> None:
+    preflight.cache_clear()
@@ -1,59 +1,114 @@
 import asyncio
-import subprocess
-import os
+import hashlib
 import logging
-from datetime import datetime
+import os
+from typing import List, Optional
+
+from tools.batch import chunked, target_file
+from tools.cache import cached_result, store_result
+from tools.executor import DEFAULT_MAX_CONCURRENCY, run_concurrently
+from tools.journal import mark_done, pending
+from tools.logs import excerpt
+from tools.preflight import require_tool
+from tools.results import FindingParser, ToolResult, error_result
+from tools.store import save_run
+from tools.supervisor import run_supervised
+from tools.targets import is_target_source, iter_targets, source_name
 
-logging.basicConfig(level=logging.INFO)
+# Сколько доменов ReconBulk получает одним файлом; каждая часть отмечается в журнале отдельно
+CHUNK_SIZE = int(os.environ.get("CFD_RECONBULK_CHUNK", "200"))
 
-async def run_reconbulk(targets: str, output_to_file: bool = True) -> None:
+def chunk_label(targets: str, chunk: List[str]) -> str:
+    """
+    Метка части списка для журнала и результатов: источник и хэш доменов части, поэтому
+    после изменения файла записи журнала о старых частях не совпадут с новыми.
+    Временный файл (stdin, домены задания) помечается постоянным именем, а не путём, чтобы
+    продолжение по журналу и сравнение со снимком работали при следующем запуске.
+    Отдельный домен (не файл) помечается самим доменом.
+    """
+    if not is_target_source(targets):
+        return chunk[0]
+    digest = hashlib.blake2b("\n".join(chunk).encode(), digest_size=8).hexdigest()
+    return f"{source_name(targets)}#{digest}"
+
+async def _run_reconbulk_chunk(label: str, domains: List[str], output_to_file: bool, refresh: bool) -> ToolResult:
+    """
+    Запускает ReconBulk для части списка доменов. Инструменту передаётся временный файл
+    с нормализованными целями без повторов: исходным может быть .gz или stdin.
+    """
+    with target_file(domains) as path:
+        command = [*require_tool("reconbulk"), "-f", path]  # Опция -f предполагает использование файла с доменами
+
+        cached = cached_result("reconbulk", path, command, refresh)
+        if cached is not None:
+            cached.target = label
+            return cached
+
+        logging.info(f"Запуск ReconBulk для {label}, доменов в части: {len(domains)}")
+        parser = FindingParser(label, "reconbulk")
+        result = await run_supervised("reconbulk", command, parser=parser, label=f"ReconBulk {label}", capture=output_to_file)
+
+        if result.returncode == 0:
+            logging.info(f"Результаты ReconBulk для {label}: {result.lines} строк")
+        else:
+            logging.error(f"Ошибка при запуске ReconBulk: {excerpt(result.stderr)}")
+
+        tool_result = ToolResult("reconbulk", label, result.returncode, parser.records,
+                                  error=result.stderr if result.returncode else "")
+        save_run(tool_result, result)
+        store_result(tool_result, command, target=path)
+    return tool_result
+
+async def run_reconbulk(targets: str, output_to_file: bool = True, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                        timeout: Optional[float] = None, refresh: bool = False) -> List[ToolResult]:
     """
     Асинхронная функция для запуска ReconBulk.
 
+    Список доменов передаётся ReconBulk частями по CHUNK_SIZE (-f на каждую часть), и каждая
+    выполненная часть отмечается в журнале: прерванный проход по большому файлу продолжается
+    с незавершённых частей. Части выполняются параллельно не более чем по max_concurrency.
+
     :param targets: файл с доменами или один домен для проверки.
     :type targets: str
-    :param output_to_file: флаг, означающий, что результаты будут сохранены в файл.
+    :param output_to_file: флаг, означающий, что полный вывод будет сохранён в хранилище результатов.
     :type output_to_file: bool
+    :param max_concurrency: максимальное число одновременно запущенных процессов.
+    :type max_concurrency: int
+    :param timeout: таймаут в секундах на одну часть списка.
+    :type timeout: float
+    :param refresh: игнорировать кэш и запустить инструмент заново.
+    :type refresh: bool
     """
+    results = []
     try:
-        command = ["ReconBulk", "-f", targets]  # Опция -f предполагает использование файла с доменами
-
-        logging.info(f"Запуск ReconBulk для {targets}")
-        # Убираем параметр text=True и декодируем вывод вручную
-        process = await asyncio.create_subprocess_exec(
-            *command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-
-        stdout, stderr = await process.communicate()
-
-        # Преобразуем байтовые данные в строки
-        stdout_str = stdout.decode()
-        stderr_str = stderr.decode()
-
-        if process.returncode == 0:
-            logging.info(f"Результаты ReconBulk для {targets}:")
-            logging.info(stdout_str)
-
-            if output_to_file:
-                file_name = f"reconbulk_results_{os.path.basename(targets)}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-                with open(file_name, "w") as f:
-                    f.write(stdout_str)
-                logging.info(f"Результаты сохранены в {file_name}")
-        else:
-            logging.error(f"Ошибка при запуске ReconBulk: {stderr_str}")
-    except FileNotFoundError:
-        logging.error("Команда ReconBulk не найдена. Убедитесь, что она установлена и доступна в PATH.")
+        # Недоступный инструмент отсекается до разбора целей, без единого запуска процесса
+        require_tool("reconbulk")
+        label = lambda chunk: chunk_label(targets, chunk)
+        chunks = pending("reconbulk", chunked(iter_targets(targets), CHUNK_SIZE), key=label)
+        async for chunk, result, error in run_concurrently(
+            chunks, lambda chunk: _run_reconbulk_chunk(label(chunk), chunk, output_to_file, refresh), max_concurrency, timeout
+        ):
+            if isinstance(error, FileNotFoundError):
+                logging.error("Команда ReconBulk не найдена. Убедитесь, что она установлена и доступна в PATH.")
+            elif error is not None:
+                logging.error(f"Ошибка при обработке {label(chunk)}: {error}")
+            if error is None:
+                mark_done(result)
+            results.append(result if error is None else error_result("reconbulk", label(chunk), error))
+    except FileNotFoundError as e:
+        logging.error(f"Команда ReconBulk не найдена. Убедитесь, что она установлена и доступна в PATH. ({e})")
+        results.append(error_result("reconbulk", targets, e))
     except Exception as e:
         logging.error(f"Неожиданная ошибка: {e}")
 
-def run_reconbulk_sync(targets: str, output_to_file: bool = True) -> None:
+    return results
+
+def run_reconbulk_sync(targets: str, output_to_file: bool = True) -> List[ToolResult]:
     """
     Функция для запуска асинхронной задачи run_reconbulk
     """
     if not targets:
         logging.error("Файл с доменами или домен не может быть пустым")
-        return
+        return []
 
-    asyncio.run(run_reconbulk(targets, output_to_file))
+    return asyncio.run(run_reconbulk(targets, output_to_file))
@@ -0,0 +1,153 @@
+import importlib
+import logging
+from dataclasses import dataclass
+from importlib.metadata import entry_points
+from typing import Callable, Dict, Optional, Union
+
+# Группа entry points, через которую сторонние пакеты регистрируют свои инструменты.
+# Значение entry point должно указывать на объект ToolSpec.
+PLUGIN_GROUP = "cloudflare_deactivate.tools"
+
+# Лимиты параллельности по классу инструмента: Ruby/Python-интерпретаторы тяжелее
+# Go-бинарника, ReconBulk сам обходит весь файл
+CONCURRENCY_LIMITS = {
+    "go": 20,
+    "python": 8,
+    "bash": 8,
+    "ruby": 4,
+    "bulk": 1,
+    "chain": 8
+}
+
+# Вес одного процесса в бюджете tools.governor по классу инструмента: сколько CPU и памяти
+# он занимает относительно Ruby/Python-интерпретатора. Составные инструменты сами процессов не запускают.
+CLASS_WEIGHTS = {
+    "go": 0.5,
+    "python": 1.0,
+    "bash": 0.5,
+    "ruby": 1.0,
+    "bulk": 2.0,
+    "chain": 0.0
+}
+
+
+@dataclass(slots=True, frozen=True)
+class ToolSpec:
+    """
+    Описание инструмента. Модуль с реализацией импортируется только при первом вызове load_tool.
+
+    :param name: короткое имя инструмента (используется в пакетном режиме и в кэше).
+    :param title: подпись в меню.
+    :param entry: путь к корутине в виде "модуль:функция".
+    :param binary: исполняемый файл или скрипт инструмента (None для составных инструментов).
+    :param interpreter: интерпретатор, которым запускается binary (ruby, bash, python3), если нужен.
+    :param input_kind: вид входных данных: domain, file или username.
+    :param concurrency_class: ключ CONCURRENCY_LIMITS.
+    :param timeout: предельное время одного запуска в секундах, пока нет статистики для адаптивного таймаута.
+    :param weight: вес процесса в бюджете ресурсов хоста (None — по CLASS_WEIGHTS).
+    """
+    name: str
+    title: str
+    entry: str
+    binary: Optional[str] = None
+    interpreter: Optional[str] = None
+    input_kind: str = "domain"
+    concurrency_class: str = "python"
+    timeout: float = 600
+    weight: Optional[float] = None
+
+
+BUILTIN_TOOLS = (
+    ToolSpec("subfinder", "Subfinder (поиск поддоменов)", "tools.subfinder:run_subfinder",
+             "subfinder", None, "domain", "go", 900),
+    ToolSpec("cloudfail", "CloudFail (защита и проверка доменов)", "tools.cloudfail:run_cloudfail",
+             "cloudfail", None, "domain", "python", 900),
+    ToolSpec("reconbulk", "ReconBulk (массовая проверка доменов)", "tools.reconbulk:run_reconbulk",
+             "ReconBulk", None, "file", "bulk", 6 * 3600),
+    ToolSpec("hatcloud", "HatCloud (выяснить реальный IP)", "tools.hatcloud:run_hatcloud",
+             "hatcloud.rb", "ruby", "domain", "ruby", 300),
+    ToolSpec("maryam", "Maryam (сбор информации по домену)", "tools.maryam:run_maryam",
+             "maryam", None, "domain", "python", 600),
+    ToolSpec("cloudunflare", "CloudUnflare (Bash-скрипт)", "tools.cloudunflare:run_cloudunflare",
+             "./CloudUnflare/cloudunflare.bash", "bash", "domain", "bash", 600),
+    ToolSpec("bypass_firewall", "BypassFirewall (пытается найти реальный IP)", "tools.bypass_firewall:run_bypass_firewall",
+             "./bypass-firewalls-by-DNS-history/bypass-firewalls-by-DNS-history.sh", "bash", "domain", "bash", 600),
+    ToolSpec("osrframework", "OSRFramework (поиск по имени пользователя)", "tools.orsframe_work:run_osrframework",
+             "./osrframework/usufy.py", "python3", "username", "python", 600),
+    ToolSpec("catphish", "Catphish (сбор информации по домену)", "tools.catphish:run_catphish",
+             "./catphish/catphish.rb", "ruby", "domain", "ruby", 600),
+    ToolSpec("chain", "Цепочка Subfinder → HatCloud/CloudUnflare/BypassFirewall (поддомены и реальные IP)",
+             "tools.chain:run_chain", None, None, "domain", "chain"),
+    # Sudomy сам запускает десятки проверок и заметно тяжелее обычного Python-инструмента
+    ToolSpec("sudomy", "Sudomy (поиск поддоменов)", "tools.sudomy:run_sudomy",
+             "sudomy.py", "python3", "domain", "python", 1800, 2.0),
+)
+
+_registry: Optional[Dict[int, ToolSpec]] = None
+_loaded: Dict[str, Callable] = {}
+
+
+def discover_plugins() -> list:
+    """
+    Находит инструменты, зарегистрированные сторонними пакетами через entry points.
+    """
+    plugins = []
+    for entry_point in entry_points(group=PLUGIN_GROUP):
+        try:
+            spec = entry_point.load()
+        except Exception as e:
+            logging.error(f"Не удалось загрузить плагин {entry_point.name}: {e}")
+            continue
+        if not isinstance(spec, ToolSpec):
+            logging.error(f"Плагин {entry_point.name} должен указывать на ToolSpec")
+            continue
+        plugins.append(spec)
+    return sorted(plugins, key=lambda spec: spec.name)
+
+
+def get_registry() -> Dict[int, ToolSpec]:
+    """
+    Пронумерованный список инструментов для меню: сначала встроенные, затем плагины.
+    """
+    global _registry
+    if _registry is None:
+        _registry = {}
+        names = set()
+        for spec in BUILTIN_TOOLS + tuple(discover_plugins()):
+            if spec.name in names:
+                logging.error(f"Инструмент {spec.name} уже зарегистрирован, плагин пропущен")
+                continue
+            if spec.concurrency_class not in CONCURRENCY_LIMITS:
+                logging.error(f"Неизвестный класс параллельности {spec.concurrency_class} у {spec.name}")
+                continue
+            names.add(spec.name)
+            _registry[len(_registry) + 1] = spec
+    return _registry
+
+
+def get_tool(key: Union[int, str]) -> ToolSpec:
+    """
+    Возвращает описание инструмента по номеру в меню или по имени.
+    """
+    registry = get_registry()
+    key = str(key).strip().lower()
+    if key.isdigit() and int(key) in registry:
+        return registry[int(key)]
+    for spec in registry.values():
+        if spec.name == key:
+            return spec
+    raise ValueError(f"Неизвестный инструмент: {key}")
+
+
+def tool_weight(spec: ToolSpec) -> float:
+    return spec.weight if spec.weight is not None else CLASS_WEIGHTS.get(spec.concurrency_class, 1.0)
+
+
+def load_tool(spec: ToolSpec) -> Callable:
+    """
+    Импортирует модуль инструмента при первом обращении и возвращает его корутину.
+    """
+    if spec.name not in _loaded:
+        module_name, _, attr = spec.entry.partition(":")
+        _loaded[spec.name] = getattr(importlib.import_module(module_name), attr)
+    return _loaded[spec.name]
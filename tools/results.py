@@ -0,0 +1,245 @@
+import ipaddress
+import re
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Union
+
+from tools.cidr import classify_ips
+
+# ANSI-последовательности цветного вывода, которыми часто раскрашены отчёты инструментов
+ANSI_RE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+IPV4_RE = re.compile(r"(?<![\d.])(?:\d{1,3}\.){3}\d{1,3}(?![\d.])")
+IPV6_RE = re.compile(r"(?<![0-9A-Fa-f:])(?:[0-9A-Fa-f]{0,4}:){2,7}[0-9A-Fa-f]{0,4}(?![0-9A-Fa-f:])")
+HOST_RE = re.compile(r"(?:[A-Za-z0-9_](?:[A-Za-z0-9_-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,63}")
+
+
+@dataclass(slots=True, frozen=True)
+class Subdomain:
+    domain: str
+    host: str
+    source: str
+
+
+@dataclass(slots=True, frozen=True)
+class OriginIP:
+    domain: str
+    ip: str
+    source: str
+    # "edge" — адрес из диапазонов Cloudflare, "possible origin" — кандидат в реальный сервер (tools.cidr)
+    role: str = ""
+
+
+@dataclass(slots=True, frozen=True)
+class Finding:
+    domain: str
+    text: str
+    source: str
+
+
+Record = Union[Subdomain, OriginIP, Finding]
+
+
+@dataclass(slots=True)
+class ToolResult:
+    tool: str
+    target: str
+    returncode: Optional[int]
+    records: List[Record] = field(default_factory=list)
+    output_file: Optional[str] = None
+    error: str = ""
+    # Идентификатор запуска в хранилище результатов (tools.store)
+    run_id: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+
+class _Parser:
+    """
+    Общая часть парсеров: накопление записей и уведомление о каждой новой записи
+    (on_record), чтобы следующие стадии могли начинать работу до завершения процесса.
+    """
+    __slots__ = ()
+
+    def reset(self) -> None:
+        """
+        Сбрасывает накопленные записи перед повторным запуском инструмента.
+        """
+        self.records = []
+        if hasattr(self, "_seen"):
+            self._seen = set()
+
+    def finish(self) -> None:
+        """
+        Вызывается после завершения процесса, когда все строки вывода разобраны.
+        """
+
+    def _emit(self, record: Record) -> None:
+        self.records.append(record)
+        if self.on_record is not None:
+            self.on_record(record)
+
+    def merge(self, values: List[str]) -> None:
+        """
+        Добавляет записи по значениям, разобранным из куска вывода в другом процессе (parse_chunk),
+        с тем же отсевом повторов, что и при построчном разборе.
+        """
+        seen = getattr(self, "_seen", None)
+        for value in values:
+            if seen is not None:
+                if value in seen:
+                    continue
+                seen.add(value)
+            self._emit(self._record(value))
+
+
+class SubdomainParser(_Parser):
+    """
+    Инкрементальный разбор списка поддоменов: по одному имени в строке
+    (subfinder -silent, Sudomy). Имена вне домена и повторы отбрасываются.
+    """
+    __slots__ = ("domain", "source", "records", "on_record", "_seen")
+
+    def __init__(self, domain: str, source: str, on_record: Optional[Callable[[Record], None]] = None):
+        self.domain = domain.lower()
+        self.source = source
+        self.records: List[Record] = []
+        self.on_record = on_record
+        self._seen = set()
+
+    def feed(self, line: str) -> None:
+        for host in HOST_RE.findall(ANSI_RE.sub("", line)):
+            host = host.lower()
+            if host in self._seen or not (host == self.domain or host.endswith("." + self.domain)):
+                continue
+            self._seen.add(host)
+            self._emit(Subdomain(self.domain, host, self.source))
+
+    def _record(self, host: str) -> Subdomain:
+        return Subdomain(self.domain, host, self.source)
+
+    @staticmethod
+    def _value(record: Subdomain) -> str:
+        return record.host
+
+
+class OriginIPParser(_Parser):
+    """
+    Инкрементальный разбор вывода инструментов поиска реального IP
+    (HatCloud, CloudFail, CloudUnflare, bypass-firewalls-by-DNS-history):
+    из каждой строки извлекаются корректные IPv4/IPv6-адреса без повторов.
+    """
+    __slots__ = ("domain", "source", "records", "on_record", "_seen")
+
+    def __init__(self, domain: str, source: str, on_record: Optional[Callable[[Record], None]] = None):
+        self.domain = domain.lower()
+        self.source = source
+        self.records: List[Record] = []
+        self.on_record = on_record
+        self._seen = set()
+
+    def feed(self, line: str) -> None:
+        line = ANSI_RE.sub("", line)
+        for candidate in IPV4_RE.findall(line) + IPV6_RE.findall(line):
+            try:
+                ip = ipaddress.ip_address(candidate)
+            except ValueError:
+                continue
+            if ip.is_private or ip.is_loopback or ip.is_unspecified:
+                continue
+            ip = str(ip)
+            if ip not in self._seen:
+                self._seen.add(ip)
+                self._emit(OriginIP(self.domain, ip, self.source))
+
+    def _record(self, ip: str) -> OriginIP:
+        return OriginIP(self.domain, ip, self.source)
+
+    @staticmethod
+    def _value(record: OriginIP) -> str:
+        return record.ip
+
+    def finish(self) -> None:
+        # Принадлежность к Cloudflare проверяется одним пакетным запросом к индексу по всем адресам сразу
+        roles = classify_ips([record.ip for record in self.records])
+        self.records = [OriginIP(record.domain, record.ip, record.source, role) for record, role in zip(self.records, roles)]
+
+
+class FindingParser(_Parser):
+    """
+    Инкрементальный разбор свободного текстового отчёта (Maryam, Catphish,
+    OSRFramework, ReconBulk): каждая непустая строка становится записью.
+    """
+    __slots__ = ("domain", "source", "records", "on_record")
+
+    def __init__(self, domain: str, source: str, on_record: Optional[Callable[[Record], None]] = None):
+        self.domain = domain
+        self.source = source
+        self.records: List[Record] = []
+        self.on_record = on_record
+
+    def feed(self, line: str) -> None:
+        line = ANSI_RE.sub("", line).strip()
+        if line:
+            self._emit(Finding(self.domain, line, self.source))
+
+    def _record(self, text: str) -> Finding:
+        return Finding(self.domain, text, self.source)
+
+    @staticmethod
+    def _value(record: Finding) -> str:
+        return record.text
+
+
+PARSERS = {cls.__name__: cls for cls in (SubdomainParser, OriginIPParser, FindingParser)}
+
+
+def parse_chunk(parser_name: str, domain: str, source: str, data: bytes) -> List[str]:
+    """
+    Разбирает кусок вывода свежим парсером (выполняется в пуле процессов, см. tools.offload).
+    Возвращаются только значения записей (имена, IP, текст): список строк передаётся между
+    процессами намного дешевле объектов. Повторы внутри куска отсеиваются здесь,
+    между кусками — при слиянии в parser.merge().
+    """
+    parser_class = PARSERS[parser_name]
+    parser = parser_class(domain, source)
+    for line in data.decode(errors="replace").splitlines():
+        parser.feed(line)
+    return list(map(parser_class._value, parser.records))
+
+
+def error_result(tool: str, target: str, error: BaseException) -> ToolResult:
+    """
+    Результат для цели, обработка которой завершилась исключением.
+    """
+    return ToolResult(tool, target, None, error=str(error) or type(error).__name__)
+
+
+RECORD_TYPES = {cls.__name__: cls for cls in (Subdomain, OriginIP, Finding)}
+
+
+def record_to_dict(record: Record) -> dict:
+    return {"type": type(record).__name__, **{name: getattr(record, name) for name in record.__slots__}}
+
+
+def record_from_dict(data: dict) -> Record:
+    data = dict(data)
+    return RECORD_TYPES[data.pop("type")](**data)
+
+
+def result_to_dict(result: ToolResult) -> dict:
+    return {
+        "tool": result.tool,
+        "target": result.target,
+        "returncode": result.returncode,
+        "records": [record_to_dict(record) for record in result.records],
+        "output_file": result.output_file,
+        "error": result.error,
+        "run_id": result.run_id,
+    }
+
+
+def result_from_dict(data: dict) -> ToolResult:
+    return ToolResult(data["tool"], data["target"], data["returncode"],
+                      [record_from_dict(record) for record in data["records"]],
+                      data.get("output_file"), data.get("error", ""), data.get("run_id"))
@@ -0,0 +1,302 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Union
+
+# Приоритеты заданий — веса их долей: при конкуренции задание с приоритетом high получает
+# вчетверо больше процессорного времени инструментов, чем normal
+PRIORITIES = {"low": 1.0, "normal": 4.0, "high": 16.0}
+DEFAULT_PRIORITY = "normal"
+# Задания с приоритетом не ниже этого веса не ждут снижения загрузки, а их первый процесс
+# может занять резерв сверх бюджета tools.governor, не дожидаясь конца чужих
+RESERVED_WEIGHT = PRIORITIES["high"]
+# Оценка длительности запуска инструмента до первых наблюдений, секунды
+DEFAULT_COST = 10.0
+# Сглаживание наблюдённой длительности запусков
+COST_SMOOTHING = 0.2
+# Как часто пакетный режим пишет в журнал прогресс заданий
+PROGRESS_LOG_INTERVAL = float(os.environ.get("CFD_PROGRESS_INTERVAL", "30"))
+
+
+def parse_priority(value: Union[str, float, int, None]) -> float:
+    """
+    Вес доли задания: имя приоритета (low, normal, high) или положительное число.
+    """
+    if value is None or value == "":
+        return PRIORITIES[DEFAULT_PRIORITY]
+    if isinstance(value, str) and value in PRIORITIES:
+        return PRIORITIES[value]
+    try:
+        weight = float(value)
+    except (TypeError, ValueError):
+        weight = 0.0
+    if weight <= 0:
+        raise ValueError(f"Неверный приоритет: {value}. Допустимы {', '.join(PRIORITIES)} или положительное число")
+    return weight
+
+
+class Share:
+    """
+    Доля одного задания в общем бюджете процессов. vtime — время завершённых процессов
+    (секунды × вес инструмента), делённое на вес доли, pending — такая же оценка для
+    выполняющихся: следующим запускается процесс задания с наименьшей суммой.
+    Внутри задания так же делятся инструменты (tool_vtime, tool_pending).
+    Ведёт прогресс задания: done из total целей (total — оценка по числу строк в файлах).
+    """
+    __slots__ = ("name", "weight", "vtime", "pending", "tool_vtime", "tool_pending", "tool_active", "active",
+                 "running", "total", "done", "created", "started", "finished")
+
+    def __init__(self, name: str, weight: float = PRIORITIES[DEFAULT_PRIORITY], total: int = 0):
+        self.name = name
+        self.weight = weight
+        self.vtime = 0.0
+        self.pending = 0.0
+        self.tool_vtime: Dict[str, float] = {}
+        self.tool_pending: Dict[str, float] = {}
+        self.tool_active: Dict[str, int] = {}
+        self.active = 0
+        self.running = 0
+        self.total = total
+        self.done = 0
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    @property
+    def reserved(self) -> bool:
+        return self.weight >= RESERVED_WEIGHT
+
+    def advance(self, units: int = 1) -> None:
+        self.done += units
+
+    def eta(self) -> Optional[float]:
+        """
+        Оценка оставшегося времени в секундах по средней скорости с начала задания; None — оценки пока нет.
+        """
+        if self.finished is not None:
+            return 0.0
+        if not self.done or not self.total or self.started is None:
+            return None
+        rate = self.done / max(time.time() - self.started, 1e-6)
+        return max(0, self.total - self.done) / rate
+
+    def progress(self) -> dict:
+        total = max(self.total, self.done)
+        percent = 100.0 if self.finished is not None else (100.0 * self.done / total if total else 0.0)
+        eta = self.eta()
+        return {"done": self.done, "total": total, "percent": round(percent, 1),
+                "eta_seconds": round(eta, 1) if eta is not None else None}
+
+
+class Waiter:
+    __slots__ = ("share", "tool", "weight", "seq")
+
+    def __init__(self, share: Share, tool: str, weight: float, seq: int):
+        self.share = share
+        self.tool = tool
+        self.weight = weight
+        self.seq = seq
+
+    def key(self):
+        share = self.share
+        return (share.vtime + share.pending, share.tool_vtime.get(self.tool, 0.0) + share.tool_pending.get(self.tool, 0.0),
+                self.seq)
+
+
+class FairScheduler:
+    """
+    Взвешенная справедливая очередь процессов между заданиями (start-time fair queuing):
+    при каждом освобождении бюджета запускается ожидающий процесс задания, которое пока
+    получило меньше всего времени с учётом веса своей доли. Простаивавшее задание
+    не копит кредит: его vtime подтягивается к наименьшему vtime активных заданий
+    (без оценок выполняющихся процессов, которые ещё могут оказаться завышены),
+    поэтому новое небольшое задание сразу встаёт в начало очереди, а большое
+    забирает весь оставшийся бюджет.
+    """
+
+    def __init__(self):
+        self.waiting: List[Waiter] = []
+        self.shares: Dict[str, Share] = {}
+        # Задания с ожидающими или выполняющимися процессами
+        self._active: Dict[int, Share] = {}
+        self._costs: Dict[str, float] = {}
+        self._seq = itertools.count()
+        # Меняется при каждом изменении очереди или долей: по нему кэшируется выбор первого в очереди
+        self.version = 0
+
+    def cost(self, tool: str) -> float:
+        return self._costs.get(tool, DEFAULT_COST)
+
+    def enqueue(self, share: Share, tool: str, weight: float) -> Waiter:
+        if share.active == 0:
+            if self._active:
+                share.vtime = max(share.vtime, min(other.vtime for other in self._active.values()))
+            self._active[id(share)] = share
+        if not share.tool_active.get(tool):
+            busy = [share.tool_vtime.get(other, 0.0) for other, count in share.tool_active.items() if count]
+            if busy:
+                share.tool_vtime[tool] = max(share.tool_vtime.get(tool, 0.0), min(busy))
+        share.active += 1
+        share.tool_active[tool] = share.tool_active.get(tool, 0) + 1
+        waiter = Waiter(share, tool, weight, next(self._seq))
+        self.waiting.append(waiter)
+        self.version += 1
+        return waiter
+
+    def head(self, eligible: Callable[[Waiter], bool]) -> Optional[Waiter]:
+        candidates = [waiter for waiter in self.waiting if eligible(waiter)]
+        return min(candidates, key=Waiter.key) if candidates else None
+
+    def start(self, waiter: Waiter) -> float:
+        """
+        Процесс допущен: до завершения доле начисляется оценка его стоимости, чтобы одно задание
+        не забрало все освободившиеся места разом. Возвращает начисленную оценку.
+        """
+        self.waiting.remove(waiter)
+        self.version += 1
+        share = waiter.share
+        share.running += 1
+        if share.started is None:
+            share.started = time.time()
+        estimate = self.cost(waiter.tool) * waiter.weight / share.weight
+        share.pending += estimate
+        share.tool_pending[waiter.tool] = share.tool_pending.get(waiter.tool, 0.0) + estimate
+        return estimate
+
+    def finish(self, waiter: Waiter, estimate: float, elapsed: float) -> None:
+        # Оценка заменяется фактическим временем процесса
+        self.version += 1
+        share = waiter.share
+        share.running -= 1
+        share.pending -= estimate
+        share.tool_pending[waiter.tool] -= estimate
+        share.vtime += elapsed * waiter.weight / share.weight
+        share.tool_vtime[waiter.tool] = share.tool_vtime.get(waiter.tool, 0.0) + elapsed * waiter.weight / share.weight
+        self._costs[waiter.tool] = self.cost(waiter.tool) * (1 - COST_SMOOTHING) + elapsed * COST_SMOOTHING \
+            if waiter.tool in self._costs else elapsed
+        self._leave(waiter)
+
+    def cancel(self, waiter: Waiter) -> None:
+        # Ожидание отменено до допуска
+        if waiter in self.waiting:
+            self.waiting.remove(waiter)
+        self.version += 1
+        self._leave(waiter)
+
+    def _leave(self, waiter: Waiter) -> None:
+        waiter.share.active -= 1
+        waiter.share.tool_active[waiter.tool] -= 1
+        if waiter.share.active == 0:
+            self._active.pop(id(waiter.share), None)
+
+    def open(self, name: str, priority: Union[str, float, None] = None, total: int = 0) -> Share:
+        if name in self.shares:
+            name = f"{name} #{next(self._seq)}"
+        share = Share(name, parse_priority(priority), total)
+        self.shares[name] = share
+        return share
+
+    def close(self, share: Share) -> None:
+        share.finished = time.time()
+        self.shares.pop(share.name, None)
+
+
+_default_scheduler: Optional[FairScheduler] = None
+# Доля задания, в котором выполняется текущая задача asyncio; вне заданий — общая доля по умолчанию
+_default_share = Share("default")
+current_share: ContextVar[Share] = ContextVar("current_share", default=_default_share)
+
+
+def get_scheduler() -> FairScheduler:
+    global _default_scheduler
+    if _default_scheduler is None:
+        _default_scheduler = FairScheduler()
+    return _default_scheduler
+
+
+def advance(units: int = 1) -> None:
+    # Цели текущего задания обработаны (выполнены, взяты из кэша или пропущены)
+    current_share.get().advance(units)
+
+
+@contextmanager
+def job_share(name: str, priority: Union[str, float, None] = None, total: int = 0) -> Iterator[Share]:
+    """
+    Выполняет блок как отдельное задание планировщика: все процессы инструментов,
+    запущенные из него (и из созданных в нём задач), делят бюджет с его весом.
+    """
+    scheduler = get_scheduler()
+    share = scheduler.open(name, priority, total)
+    token = current_share.set(share)
+    try:
+        yield share
+    finally:
+        current_share.reset(token)
+        scheduler.close(share)
+
+
+def format_progress(share: Share) -> str:
+    progress = share.progress()
+    eta = progress["eta_seconds"]
+    remaining = f", осталось ~{eta / 60:.0f} мин" if eta is not None and eta >= 60 else \
+        f", осталось ~{eta:.0f} с" if eta is not None else ""
+    return f"{share.name}: {progress['done']}/{progress['total']} ({progress['percent']:g}%){remaining}"
+
+
+async def log_progress(interval: float = PROGRESS_LOG_INTERVAL) -> None:
+    """
+    Периодически пишет в журнал прогресс и оценку оставшегося времени незавершённых заданий.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        for share in list(get_scheduler().shares.values()):
+            if share.started is not None:
+                logging.info(f"Прогресс {format_progress(share)}")
+
+
+class PrioritySlots:
+    """
+    Ограничение числа одновременно выполняемых заданий, где очередь упорядочена по весу
+    приоритета, а не по времени постановки. Задания с резервным приоритетом не ждут слота.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.running = 0
+        self._waiting: list = []
+        self._seq = itertools.count()
+
+    def _wake(self) -> None:
+        while self._waiting and self.running < self.limit:
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                self.running += 1
+                future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, weight: float):
+        if weight >= RESERVED_WEIGHT:
+            self.running += 1
+        elif self.running < self.limit and not self._waiting:
+            self.running += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiting, (-weight, next(self._seq), future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Слот уже выдан, но задание отменили: отдаём его следующему
+                    self.running -= 1
+                    self._wake()
+                raise
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._wake()
@@ -0,0 +1,376 @@
+import atexit
+import contextvars
+import hashlib
+import logging
+import os
+import queue
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+import zlib
+from typing import Callable, Dict, FrozenSet, List, Optional
+
+from tools.results import ToolResult
+from tools.stream import StreamResult, output_path
+
+# Хранилище всех запусков вместо отдельного .txt на каждый домен и инструмент.
+# Относительный путь считается от директории результатов (--output-dir / CFD_OUTPUT_DIR).
+DEFAULT_STORE_PATH = os.environ.get("CFD_STORE_PATH", "results.sqlite")
+# Запись идёт пачками в отдельном потоке: одна транзакция на BATCH_SIZE запусков или FLUSH_INTERVAL секунд
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS runs ("
+    "id TEXT PRIMARY KEY, tool TEXT, target TEXT, created REAL, returncode INTEGER, error TEXT, "
+    "lines INTEGER, bytes INTEGER, output BLOB)",
+    "CREATE TABLE IF NOT EXISTS records ("
+    "run_id TEXT, tool TEXT, domain TEXT, kind TEXT, value TEXT, source TEXT, created REAL, role TEXT)",
+    "CREATE INDEX IF NOT EXISTS runs_target ON runs (target, tool, created)",
+    "CREATE INDEX IF NOT EXISTS runs_tool ON runs (tool, created)",
+    "CREATE INDEX IF NOT EXISTS runs_created ON runs (created)",
+    "CREATE INDEX IF NOT EXISTS records_domain ON records (domain, tool, created)",
+    "CREATE INDEX IF NOT EXISTS records_tool ON records (tool, created)",
+    "CREATE INDEX IF NOT EXISTS records_run ON records (run_id)",
+    # Снимок последнего успешного запуска инструмента по цели: отсортированные 8-байтовые хэши записей
+    "CREATE TABLE IF NOT EXISTS snapshots ("
+    "tool TEXT, target TEXT, run_id TEXT, created REAL, digest BLOB, hashes BLOB, PRIMARY KEY (tool, target))",
+    # Отличия запуска от предыдущего снимка: change "+" — запись появилась, "-" — пропала
+    "CREATE TABLE IF NOT EXISTS changes ("
+    "run_id TEXT, tool TEXT, target TEXT, created REAL, change TEXT, kind TEXT, value TEXT)",
+    "CREATE INDEX IF NOT EXISTS changes_created ON changes (created)",
+    "CREATE INDEX IF NOT EXISTS changes_target ON changes (target, tool, created)",
+)
+# Колонки, добавленные после первой версии схемы: (таблица, колонка, тип)
+MIGRATIONS = (
+    ("records", "role", "TEXT"),
+)
+# Поле записи, которое хранится как value: имя хоста, IP или текст находки
+RECORD_VALUES = {"Subdomain": "host", "OriginIP": "ip", "Finding": "text"}
+
+# Получатель каждого сохранённого результата в контексте текущей задачи (потоковая выдача заданий демона)
+result_sink: contextvars.ContextVar[Optional[Callable[[ToolResult], None]]] = contextvars.ContextVar("result_sink", default=None)
+
+# Режим изменений (--diff): цепочки пропускают неизменившиеся цели, в отчёт попадают только отличия
+diff_mode = os.environ.get("CFD_DIFF", "") not in ("", "0")
+
+
+def set_diff_mode(enabled: bool) -> None:
+    global diff_mode
+    diff_mode = enabled
+
+
+def record_hash(kind: str, value: str) -> int:
+    # 64 бита хватает: вероятность совпадения хэшей при миллионе записей цели порядка 1e-7
+    return int.from_bytes(hashlib.blake2b(f"{kind}\t{value}".encode(), digest_size=8).digest(), "big")
+
+
+def _pack_hashes(hashes: List[int]) -> bytes:
+    return struct.pack(f">{len(hashes)}Q", *hashes)
+
+
+def _unpack_hashes(data: bytes) -> FrozenSet[int]:
+    return frozenset(struct.unpack(f">{len(data) // 8}Q", data))
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    for statement in SCHEMA:
+        db.execute(statement)
+    for table, column, kind in MIGRATIONS:
+        if column not in {row[1] for row in db.execute(f"PRAGMA table_info({table})")}:
+            db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+    return db
+
+
+class ResultStore:
+    """
+    Хранилище результатов в SQLite (WAL): запуски со сжатым выводом и разобранные записи
+    с индексами по домену, инструменту и времени. Запись только добавляется и выполняется
+    пачками в отдельном потоке, поэтому обёртки не ждут диск.
+    """
+
+    def __init__(self, path: str, batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # Снимки, прочитанные до запусков этого процесса (is_new), по (инструмент, цель)
+        self._baselines: Dict[tuple, Optional[FrozenSet[int]]] = {}
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        # Соединение для чтения; у потока записи своё
+        if self._db is None:
+            self._db = _connect(self.path)
+        return self._db
+
+    def append(self, result: ToolResult, stream: Optional[StreamResult] = None) -> str:
+        """
+        Ставит запуск в очередь на запись и возвращает его идентификатор.
+
+        :param result: итог запуска с разобранными записями.
+        :type result: ToolResult
+        :param stream: результат stream_process со сжатым выводом (capture=True).
+        :type stream: StreamResult
+        """
+        run_id = uuid.uuid4().hex
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="result-store-writer", daemon=True)
+                self._writer.start()
+        self._queue.put((run_id, time.time(), result, stream))
+        return run_id
+
+    def _write_loop(self) -> None:
+        try:
+            db = _connect(self.path)
+        except (OSError, sqlite3.Error) as e:
+            logging.error(f"Хранилище результатов {self.path} недоступно, запуски не сохраняются: {e}")
+            # Очередь всё равно разбирается, иначе flush() и close() зависнут
+            while self._queue.get() is not None:
+                self._queue.task_done()
+            self._queue.task_done()
+            return
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    self._queue.task_done()
+                    return
+                batch = [item]
+                deadline = time.monotonic() + self.flush_interval
+                stop = False
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+                try:
+                    self._write_batch(db, batch)
+                except Exception as e:
+                    # Поток записи не должен падать: иначе flush() и close() будут ждать его вечно
+                    logging.error(f"Ошибка записи {len(batch)} запусков в хранилище результатов: {e}")
+                for _ in range(len(batch) + stop):
+                    self._queue.task_done()
+                if stop:
+                    return
+        finally:
+            db.close()
+
+    @staticmethod
+    def _write_batch(db: sqlite3.Connection, batch) -> None:
+        runs = []
+        records = []
+        for run_id, created, result, stream in batch:
+            runs.append((run_id, result.tool, result.target, created, result.returncode, result.error,
+                         stream.lines if stream else 0, stream.bytes if stream else 0, stream.output if stream else b""))
+            for record in result.records:
+                kind = type(record).__name__
+                records.append((run_id, result.tool, record.domain, kind, getattr(record, RECORD_VALUES[kind]),
+                                record.source, created, getattr(record, "role", None)))
+        db.execute("BEGIN")
+        try:
+            db.executemany("INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", runs)
+            db.executemany("INSERT INTO records (run_id, tool, domain, kind, value, source, created, role) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", records)
+            for run_id, created, result, _ in batch:
+                # Неудачный запуск не заменяет снимок: иначе следующий покажет всё как новое
+                if result.ok:
+                    ResultStore._write_snapshot(db, run_id, created, result)
+            db.execute("COMMIT")
+        except sqlite3.Error:
+            db.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _write_snapshot(db: sqlite3.Connection, run_id: str, created: float, result: ToolResult) -> None:
+        """
+        Заменяет снимок цели снимком запуска и записывает отличия от предыдущего в changes.
+        Для первого снимка цели отличия не пишутся: это исходное состояние.
+        """
+        values = {}
+        for record in result.records:
+            kind = type(record).__name__
+            value = getattr(record, RECORD_VALUES[kind])
+            values[record_hash(kind, value)] = (kind, value)
+        packed = _pack_hashes(sorted(values))
+        digest = hashlib.blake2b(packed, digest_size=16).digest()
+        previous = db.execute("SELECT run_id, digest, hashes FROM snapshots WHERE tool = ? AND target = ?",
+                              (result.tool, result.target)).fetchone()
+        db.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?)",
+                   (result.tool, result.target, run_id, created, digest, packed))
+        if previous is None or previous[1] == digest:
+            return
+        previous_hashes = _unpack_hashes(previous[2])
+        changes = [(run_id, result.tool, result.target, created, "+", kind, value)
+                   for hash_value, (kind, value) in values.items() if hash_value not in previous_hashes]
+        removed = set(previous_hashes.difference(values))
+        if removed:
+            # Снимок хранит только хэши; имена пропавших записей берутся из записей прошлого запуска
+            for kind, value in db.execute("SELECT DISTINCT kind, value FROM records WHERE run_id = ?", (previous[0],)):
+                hash_value = record_hash(kind, value)
+                if hash_value in removed:
+                    removed.discard(hash_value)
+                    changes.append((run_id, result.tool, result.target, created, "-", kind, value))
+            # Записи прошлого запуска уже удалены (prune): остаётся только хэш
+            changes.extend((run_id, result.tool, result.target, created, "-", "", f"#{hash_value:016x}")
+                           for hash_value in removed)
+        db.executemany("INSERT INTO changes VALUES (?, ?, ?, ?, ?, ?, ?)", changes)
+
+    def flush(self) -> None:
+        """
+        Ждёт, пока все поставленные в очередь запуски будут записаны.
+        """
+        if self._writer is not None:
+            self._queue.join()
+
+    def find_runs(self, domain: Optional[str] = None, tool: Optional[str] = None, since: Optional[float] = None,
+                  until: Optional[float] = None, limit: int = 100) -> List[dict]:
+        """
+        Запуски по цели, инструменту и интервалу времени (новые первыми), без вывода.
+        """
+        self.flush()
+        where, params = self._filters("target", domain, tool, since, until)
+        rows = self.db.execute(
+            f"SELECT id, tool, target, created, returncode, error, lines, bytes FROM runs {where} "
+            f"ORDER BY created DESC LIMIT ?", (*params, limit)
+        )
+        columns = ("id", "tool", "target", "created", "returncode", "error", "lines", "bytes")
+        return [dict(zip(columns, row)) for row in rows]
+
+    def find_records(self, domain: Optional[str] = None, tool: Optional[str] = None, since: Optional[float] = None,
+                     until: Optional[float] = None, limit: int = 1000) -> List[dict]:
+        """
+        Разобранные записи (поддомены, IP, находки) по домену, инструменту и интервалу времени.
+        """
+        self.flush()
+        where, params = self._filters("domain", domain, tool, since, until)
+        rows = self.db.execute(
+            f"SELECT run_id, tool, domain, kind, value, source, created, role FROM records {where} "
+            f"ORDER BY created DESC LIMIT ?", (*params, limit)
+        )
+        columns = ("run_id", "tool", "domain", "kind", "value", "source", "created", "role")
+        return [dict(zip(columns, row)) for row in rows]
+
+    def find_changes(self, domain: Optional[str] = None, tool: Optional[str] = None, since: Optional[float] = None,
+                     until: Optional[float] = None, limit: int = 1000) -> List[dict]:
+        """
+        Отличия запусков от предыдущих снимков по цели, инструменту и интервалу времени.
+        """
+        self.flush()
+        where, params = self._filters("target", domain, tool, since, until)
+        rows = self.db.execute(
+            f"SELECT run_id, tool, target, created, change, kind, value FROM changes {where} "
+            f"ORDER BY created, tool, target LIMIT ?", (*params, limit)
+        )
+        columns = ("run_id", "tool", "target", "created", "change", "kind", "value")
+        return [dict(zip(columns, row)) for row in rows]
+
+    def is_new(self, tool: str, target: str, kind: Optional[str] = None, value: Optional[str] = None) -> bool:
+        """
+        Не было ли записи (kind, value) в снимке цели до запусков этого процесса.
+        Без kind и value — нет ли у цели снимка вовсе. Снимок читается один раз и не меняется
+        до конца процесса, поэтому ответ не зависит от того, успел ли текущий запуск записаться.
+        """
+        key = (tool, target)
+        if key not in self._baselines:
+            try:
+                row = self.db.execute("SELECT hashes FROM snapshots WHERE tool = ? AND target = ?", key).fetchone()
+            except sqlite3.Error as e:
+                logging.error(f"Не удалось прочитать снимок {tool} {target}: {e}")
+                row = None
+            self._baselines[key] = _unpack_hashes(row[0]) if row is not None else None
+        baseline = self._baselines[key]
+        if baseline is None:
+            return True
+        return kind is not None and record_hash(kind, value) not in baseline
+
+    @staticmethod
+    def _filters(target_column: str, domain, tool, since, until):
+        conditions = []
+        params = []
+        for condition, value in ((f"{target_column} = ?", domain), ("tool = ?", tool),
+                                 ("created >= ?", since), ("created < ?", until)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        return ("WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+    def read_output(self, run_id: str) -> Optional[str]:
+        """
+        Полный вывод инструмента для запуска; None, если запуск не найден.
+        """
+        self.flush()
+        row = self.db.execute("SELECT output FROM runs WHERE id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        return zlib.decompress(row[0]).decode(errors="replace") if row[0] else ""
+
+    def prune(self, before: float, tool: Optional[str] = None) -> int:
+        """
+        Удаляет запуски и их записи старше before (timestamp); возвращает число удалённых запусков.
+        Запуски, на которых основаны текущие снимки, остаются: по их записям восстанавливаются имена пропавших.
+        """
+        self.flush()
+        where, params = self._filters("target", None, tool, None, before)
+        where += " AND id NOT IN (SELECT run_id FROM snapshots)"
+        self.db.execute("BEGIN")
+        try:
+            self.db.execute(f"DELETE FROM records WHERE run_id IN (SELECT id FROM runs {where})", params)
+            self.db.execute(f"DELETE FROM changes WHERE run_id IN (SELECT id FROM runs {where})", params)
+            removed = self.db.execute(f"DELETE FROM runs {where}", params).rowcount
+            self.db.execute("COMMIT")
+        except sqlite3.Error:
+            self.db.execute("ROLLBACK")
+            raise
+        return removed
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+_default_store: Optional[ResultStore] = None
+
+
+def get_store() -> ResultStore:
+    """
+    Общее хранилище для всех обёрток; закрывается (с дозаписью очереди) при выходе из процесса.
+    """
+    global _default_store
+    if _default_store is None:
+        _default_store = ResultStore(output_path(DEFAULT_STORE_PATH))
+        atexit.register(_default_store.close)
+    return _default_store
+
+
+def save_run(result: ToolResult, stream: Optional[StreamResult] = None) -> ToolResult:
+    """
+    Сохраняет запуск в хранилище и проставляет result.run_id.
+    """
+    try:
+        result.run_id = get_store().append(result, stream)
+    except (OSError, sqlite3.Error) as e:
+        logging.error(f"Ошибка записи в хранилище результатов: {e}")
+    sink = result_sink.get()
+    if sink is not None:
+        sink(result)
+    return result
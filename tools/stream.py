@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import os
+import resource
+import signal
+import time
+import zlib
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from tools import logs
+
+# Максимальная длина строки, которую StreamReader держит в буфере целиком
+STREAM_LIMIT = 1024 * 1024
+# Сколько последних байт stderr сохраняется для сообщения об ошибке
+STDERR_TAIL = 64 * 1024
+# Как часто (в строках) сообщать о прогрессе чтения
+PROGRESS_EVERY = 10000
+
+# Корневая директория для файлов результатов; относительные пути считаются от неё
+output_root = os.environ.get("CFD_OUTPUT_DIR", "")
+
+
+def set_output_root(path: str) -> None:
+    global output_root
+    output_root = path
+
+
+def output_path(path: str) -> str:
+    """
+    Путь к файлу результатов с учётом output_root.
+    """
+    if output_root and not os.path.isabs(path):
+        return os.path.join(output_root, path)
+    return path
+
+
+class StreamResult(NamedTuple):
+    returncode: int
+    stderr: str
+    lines: int
+    bytes: int
+    stderr_bytes: int = 0
+    spawn_latency: float = 0.0
+    wall_time: float = 0.0
+    cpu_user: float = 0.0
+    cpu_system: float = 0.0
+    # Вывод процесса, сжатый zlib (только при capture=True)
+    output: bytes = b""
+
+
+async def _read_lines(stream: asyncio.StreamReader):
+    """
+    Асинхронный генератор строк потока. Строки длиннее STREAM_LIMIT отдаются частями,
+    а не теряются, как при переполнении буфера в readline().
+    """
+    while True:
+        try:
+            line = await stream.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            # Последняя строка без перевода строки
+            if e.partial:
+                yield e.partial
+            return
+        except asyncio.LimitOverrunError as e:
+            line = await stream.read(e.consumed)
+        yield line
+
+
+async def _read_tail(stream: asyncio.StreamReader, limit: int = STDERR_TAIL) -> Tuple[bytes, int]:
+    """
+    Вычитывает поток до конца, сохраняя только последние limit байт.
+    Возвращает хвост потока и общее число прочитанных байт.
+    """
+    tail = bytearray()
+    total = 0
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            return bytes(tail), total
+        total += len(chunk)
+        tail += chunk
+        if len(tail) > limit:
+            del tail[:len(tail) - limit]
+
+
+def kill_process_group(process: asyncio.subprocess.Process) -> None:
+    """
+    Завершает процесс вместе со всей его группой (bash-скрипты и интерпретаторы
+    запускают собственные дочерние процессы).
+    """
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+
+async def stream_process(command: List[str], output_file: Optional[str] = None,
+                         on_line: Optional[Callable[[str], None]] = None, label: str = "",
+                         capture: bool = False, feeder=None, on_spawn: Optional[Callable[[int], None]] = None) -> StreamResult:
+    """
+    Запускает процесс и построчно читает его stdout, не накапливая вывод в памяти.
+    Вывод пишется во временный файл, который переименовывается в output_file
+    только при успешном завершении процесса.
+
+    :param command: команда для запуска.
+    :type command: List[str]
+    :param output_file: файл для сохранения stdout (None — вывод не сохраняется).
+    :type output_file: str
+    :param on_line: функция, вызываемая для каждой декодированной строки без перевода строки.
+    :type on_line: Callable
+    :param label: подпись для сообщений о прогрессе.
+    :type label: str
+    :param capture: сохранить вывод в StreamResult.output в сжатом виде (для хранилища результатов).
+    :type capture: bool
+    :param feeder: асинхронный приёмник сырых строк (feed/close/cancel, см. tools.offload.OffloadFeeder);
+        пока он ждёт, stdout не читается.
+    :param on_spawn: функция, вызываемая с pid сразу после запуска процесса (см. tools.governor.configure_child).
+    :type on_spawn: Callable
+    """
+    # CPU-время берётся из RUSAGE_CHILDREN по разнице до и после ожидания процесса;
+    # при параллельных запусках в неё попадают и другие завершившиеся процессы
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.monotonic()
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        limit=STREAM_LIMIT,
+        # Своя группа процессов, чтобы при таймауте завершить и все дочерние процессы инструмента
+        start_new_session=True
+    )
+
+    spawn_latency = time.monotonic() - started
+    if on_spawn is not None:
+        on_spawn(process.pid)
+
+    part_file = f"{output_file}.part" if output_file else None
+    if part_file and os.path.dirname(part_file):
+        os.makedirs(os.path.dirname(part_file), exist_ok=True)
+    sink = open(part_file, "wb") if part_file else None
+    # Сжатие по мере чтения: в памяти держится только сжатый вывод
+    compressor = zlib.compressobj(6) if capture else None
+    compressed = []
+    lines = 0
+    size = 0
+    completed = False
+    # stderr читается параллельно, иначе процесс может заблокироваться на заполненном канале
+    stderr_task = asyncio.create_task(_read_tail(process.stderr))
+    try:
+        async for line in _read_lines(process.stdout):
+            lines += 1
+            size += len(line)
+            if sink is not None:
+                sink.write(line)
+            if compressor is not None:
+                compressed.append(compressor.compress(line))
+            if on_line is not None:
+                on_line(line.decode(errors="replace").rstrip("\r\n"))
+            if feeder is not None:
+                await feeder.feed(line)
+            if lines <= logs.OUTPUT_SAMPLE_LINES:
+                # Образец вывода для отладки; полный вывод — только в файле и результатах
+                logging.info(f"{label} [{lines}]: {logs.excerpt(line.decode(errors='replace'), 500)}")
+            if lines % PROGRESS_EVERY == 0:
+                logging.info(f"{label}: получено {lines} строк ({size} байт)")
+        if feeder is not None:
+            await feeder.close()
+        stderr, stderr_bytes = await stderr_task
+        await process.wait()
+        completed = True
+    finally:
+        if feeder is not None and not completed:
+            feeder.cancel()
+        # При таймауте или отмене не оставляем процесс висеть. Группа завершается, даже если
+        # сам процесс уже вышел: stdout может держать открытым его фоновый дочерний процесс
+        if not completed:
+            kill_process_group(process)
+            await process.wait()
+        if not stderr_task.done():
+            stderr_task.cancel()
+        if sink is not None:
+            sink.close()
+            if completed and process.returncode == 0:
+                os.replace(part_file, output_file)
+            else:
+                os.remove(part_file)
+
+    if compressor is not None:
+        compressed.append(compressor.flush())
+    usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return StreamResult(process.returncode, stderr.decode(errors="replace"), lines, size, stderr_bytes, spawn_latency,
+                        time.monotonic() - started, usage_after.ru_utime - usage_before.ru_utime,
+                        usage_after.ru_stime - usage_before.ru_stime, b"".join(compressed))
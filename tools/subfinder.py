@@ -1,60 +1,150 @@
 import asyncio
-import subprocess
-import os
 import logging
+from typing import Callable, List, Optional
 
-logging.basicConfig(level=logging.INFO)
+from tools.batch import BATCH_SIZE, BatchParser, chunked, target_file
+from tools.cache import cached_result, store_result
+from tools.executor import DEFAULT_MAX_CONCURRENCY, run_concurrently
+from tools.journal import mark_done, pending
+from tools.logs import excerpt
+from tools.preflight import require_tool
+from tools.results import Record, SubdomainParser, ToolResult, error_result
+from tools.store import save_run
+from tools.supervisor import run_supervised
+from tools.targets import is_target_source, iter_targets
 
-async def run_subfinder(target: str, silent: bool = True, output_to_file: bool = True) -> None:
+def _command(option: str, value: str, silent: bool) -> List[str]:
+    command = [*require_tool("subfinder"), option, value]
+    if silent:
+        command.append("-silent")
+    return command
+
+def _cached(target: str, silent: bool, refresh: bool, on_record: Optional[Callable[[Record], None]]) -> Optional[ToolResult]:
+    cached = cached_result("subfinder", target, _command("-d", target, silent), refresh)
+    if cached is not None and on_record is not None:
+        for record in cached.records:
+            on_record(record)
+    return cached
+
+async def _run_subfinder_domain(target: str, silent: bool, output_to_file: bool, refresh: bool,
+                                on_record: Optional[Callable[[Record], None]]) -> ToolResult:
+    """
+    Запускает subfinder для одного домена.
+    """
+    command = _command("-d", target, silent)
+    cached = _cached(target, silent, refresh, on_record)
+    if cached is not None:
+        return cached
+
+    logging.info(f"{command}")
+    logging.info(f"Запуск subfinder для {target}")
+
+    parser = SubdomainParser(target, "subfinder", on_record)
+    result = await run_supervised("subfinder", command, parser=parser, label=f"subfinder {target}", capture=output_to_file)
+
+    if result.returncode == 0:
+        logging.info(f"Найдено {result.lines} поддоменов для {target}")
+    else:
+        logging.error(f"Ошибка при запуске Subfinder: {excerpt(result.stderr)}")
+
+    tool_result = ToolResult("subfinder", target, result.returncode, parser.records,
+                              error=result.stderr if result.returncode else "")
+    save_run(tool_result, result)
+    store_result(tool_result, command)
+    return tool_result
+
+async def _run_subfinder_batch(targets: List[str], silent: bool, output_to_file: bool, refresh: bool,
+                               on_record: Optional[Callable[[Record], None]]) -> List[ToolResult]:
+    """
+    Запускает один процесс subfinder на список доменов (-dL) и разбирает общий вывод по доменам.
+    Результаты кэшируются и сохраняются по каждому домену так же, как при отдельных запусках.
+    """
+    results = {}
+    uncached = []
+    for target in targets:
+        cached = _cached(target, silent, refresh, on_record)
+        if cached is not None:
+            results[target] = cached
+        else:
+            uncached.append(target)
+    if len(uncached) == 1:
+        results[uncached[0]] = await _run_subfinder_domain(uncached[0], silent, output_to_file, refresh, on_record)
+    elif uncached:
+        parsers = {target: SubdomainParser(target, "subfinder", on_record) for target in uncached}
+        batch = BatchParser(parsers, capture=output_to_file)
+        logging.info(f"Запуск subfinder для {len(uncached)} доменов одним процессом")
+        with target_file(uncached) as path:
+            result = await run_supervised("subfinder", _command("-dL", path, silent), parser=batch,
+                                          label=f"subfinder {uncached[0]} и ещё {len(uncached) - 1}", units=len(uncached))
+        if result.returncode != 0:
+            logging.error(f"Ошибка при запуске Subfinder: {excerpt(result.stderr)}")
+        for target in uncached:
+            tool_result = ToolResult("subfinder", target, result.returncode, parsers[target].records,
+                                      error=result.stderr if result.returncode else "")
+            save_run(tool_result, batch.split(result, target))
+            store_result(tool_result, _command("-d", target, silent))
+            results[target] = tool_result
+    return [results[target] for target in targets]
+
+async def run_subfinder(target: str, silent: bool = True, output_to_file: bool = True,
+                        max_concurrency: int = DEFAULT_MAX_CONCURRENCY, timeout: Optional[float] = None, refresh: bool = False,
+                        on_record: Optional[Callable[[Record], None]] = None) -> List[ToolResult]:
     """
     Асинхронная функция для запуска subfinder
 
-    :param target: домен, для которого будет выполняться поиск
+    :param target: домен или файл с доменами, для которых будет выполняться поиск
     :type target: str
     :param silent: флаг, означающий, что не будет вывода в stdout
     :type silent: bool
-    :param output_to_file: флаг, означающий, что результаты будут сохранены в файл
+    :param output_to_file: флаг, означающий, что полный вывод будет сохранён в хранилище результатов
     :type output_to_file: bool
+    :param max_concurrency: максимальное число одновременно запущенных процессов
+    :type max_concurrency: int
+    :param timeout: таймаут в секундах на один домен
+    :type timeout: float
+    :param refresh: игнорировать кэш и запустить инструмент заново
+    :type refresh: bool
+    :param on_record: функция, вызываемая для каждого найденного поддомена сразу по мере вывода
+    :type on_record: Callable
     """
+    results = []
     try:
-        command = ["/home/ubuntu/go/bin/subfinder", "-d", target]
-        if silent:
-            command.append("-silent")
-        logging.info(f"{command}")
-        logging.info(f"Запуск subfinder для {target}")
-        
-        result = await asyncio.create_subprocess_exec(
-            *command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        
-        stdout, stderr = await result.communicate()
-        
-        stdout_str = stdout.decode()
-        stderr_str = stderr.decode()
-
-        if result.returncode == 0:
-            subdomains = stdout_str.splitlines()
-            if output_to_file:
-                file_name = f"{target}_subdomains_{os.urandom(4).hex()}.txt"
-                with open(file_name, "w") as f:
-                    f.write("\n".join(subdomains))
-                logging.info(f"Результаты сохранены в {file_name}")
-        else:
-            logging.error(f"Ошибка при запуске Subfinder: {stderr_str}")
-    except FileNotFoundError:
-        logging.error("Команда subfinder не найдена. Убедитесь, что она установлена и доступна в PATH.")
+        # Недоступный инструмент отсекается до разбора целей, без единого запуска процесса
+        require_tool("subfinder")
+        domain_list = pending("subfinder", iter_targets(target))
+        # Список доменов обрабатывается пакетами: один процесс на batch_size доменов вместо процесса на домен
+        batch_size = BATCH_SIZE if is_target_source(target) else 1
+
+        async for domains, batch_results, error in run_concurrently(
+            chunked(domain_list, batch_size),
+            lambda domains: _run_subfinder_batch(domains, silent, output_to_file, refresh, on_record),
+            max_concurrency, timeout * batch_size if timeout is not None else None
+        ):
+            if isinstance(error, FileNotFoundError):
+                logging.error("Команда subfinder не найдена. Убедитесь, что она установлена и доступна в PATH.")
+            elif error is not None:
+                logging.error(f"Ошибка при обработке {', '.join(domains)}: {error}")
+            if error is not None:
+                results.extend(error_result("subfinder", domain, error) for domain in domains)
+                continue
+            for result in batch_results:
+                mark_done(result)
+                results.append(result)
+    except FileNotFoundError as e:
+        logging.error(f"Команда subfinder не найдена. Убедитесь, что она установлена и доступна в PATH. ({e})")
+        results.append(error_result("subfinder", target, e))
     except Exception as e:
         logging.error(f"Неожиданная ошибка: {e}")
 
-def run_subfinder_sync(target: str, silent: bool = True, output_to_file: bool = True) -> None:
+    return results
+
+def run_subfinder_sync(target: str, silent: bool = True, output_to_file: bool = True,
+                       max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> List[ToolResult]:
     """
     Функция для запуска асинхронной задачи find_subdomain
     """
     if not target:
         logging.error("Домен не может быть пустым")
-        return
-    
-    asyncio.run(run_subfinder(target, silent, output_to_file))
+        return []
 
+    return asyncio.run(run_subfinder(target, silent, output_to_file, max_concurrency))
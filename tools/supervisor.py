@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import random
+import re
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from tools import metrics
+from tools.logs import event
+from tools.governor import configure_child, get_governor
+from tools.offload import OffloadFeeder
+from tools.registry import get_tool
+from tools.stream import StreamResult, stream_process
+
+# Адаптивный таймаут: TIMEOUT_FACTOR × p95 наблюдённых длительностей, но не меньше
+# MIN_TIMEOUT и не больше таймаута из реестра. До MIN_SAMPLES запусков действует таймаут реестра.
+TIMEOUT_FACTOR = 3.0
+MIN_TIMEOUT = 30.0
+MIN_SAMPLES = 20
+HISTORY_SIZE = 500
+
+DEFAULT_RETRIES = 2
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+
+# Признаки временных сбоев (сеть, DNS, ограничение частоты запросов), после которых есть смысл повторить запуск
+TRANSIENT_RE = re.compile(
+    r"timed? ?out|temporar(?:y|ily)|connection (?:reset|refused|aborted)|name resolution|"
+    r"too many requests|rate.?limit|\b429\b|\b50[234]\b|network is unreachable",
+    re.IGNORECASE
+)
+
+_durations: Dict[str, Deque[float]] = {}
+
+
+def record_duration(tool: str, seconds: float) -> None:
+    _durations.setdefault(tool, deque(maxlen=HISTORY_SIZE)).append(seconds)
+
+
+def p95(tool: str) -> Optional[float]:
+    samples = _durations.get(tool)
+    if not samples or len(samples) < MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+def adaptive_timeout(tool: str, units: int = 1) -> float:
+    """
+    Таймаут одного запуска инструмента с учётом наблюдённой длительности.
+    Для пакетного запуска на units целей таймаут растёт пропорционально.
+    """
+    limit = get_tool(tool).timeout * units
+    observed = p95(tool)
+    if observed is None:
+        return limit
+    return max(MIN_TIMEOUT, min(limit, observed * units * TIMEOUT_FACTOR))
+
+
+def is_transient(result: StreamResult) -> bool:
+    return result.returncode != 0 and TRANSIENT_RE.search(result.stderr) is not None
+
+
+def backoff_delay(attempt: int) -> float:
+    # Экспоненциальная задержка со случайным разбросом, чтобы повторы не шли залпом
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+async def run_supervised(tool: str, command: List[str], output_file: Optional[str] = None, parser=None,
+                         label: str = "", retries: int = DEFAULT_RETRIES, capture: bool = False,
+                         units: int = 1) -> StreamResult:
+    """
+    Запускает инструмент через stream_process с адаптивным таймаутом и повторами.
+    Каждая попытка сначала ждёт допуска по ресурсам хоста (tools.governor); ожидание в таймаут не входит.
+    Запуск, завершение и таймаут каждой попытки пишутся в журнал событиями process.* (tools.logs.event).
+    По таймауту убивается вся группа процессов и выбрасывается TimeoutError;
+    ненулевой код возврата с признаками временного сбоя повторяется до retries раз.
+
+    :param tool: имя инструмента в реестре.
+    :type tool: str
+    :param command: команда для запуска.
+    :type command: List[str]
+    :param output_file: файл для сохранения stdout.
+    :type output_file: str
+    :param parser: парсер вывода (feed/reset/finish); сбрасывается перед каждым повтором.
+    :param label: подпись для сообщений.
+    :type label: str
+    :param retries: максимальное число повторов.
+    :type retries: int
+    :param capture: сохранить сжатый вывод в результате (см. stream_process).
+    :type capture: bool
+    :param units: число целей в запуске (пакетный режим, tools.batch); статистика длительности ведётся на одну цель.
+    :type units: int
+    """
+    attempt = 0
+
+    def spawned(pid: int) -> None:
+        configure_child(pid)
+        event("process.start", tool=tool, label=label, pid=pid, attempt=attempt + 1, timeout=timeout)
+
+    while True:
+        timeout = adaptive_timeout(tool, units)
+        async with get_governor().admit(tool):
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(
+                    stream_process(command, output_file, label=label, capture=capture,
+                                   feeder=OffloadFeeder(parser) if parser else None, on_spawn=spawned), timeout
+                )
+            except asyncio.TimeoutError:
+                metrics.record_timeout(tool, time.monotonic() - started)
+                event("process.timeout", logging.WARNING, tool=tool, label=label, attempt=attempt + 1,
+                      wall=time.monotonic() - started)
+                raise TimeoutError(f"{label}: процесс не завершился за {timeout:.0f} с и был остановлен")
+        record_duration(tool, (time.monotonic() - started) / units)
+        metrics.record_run(tool, result)
+        event("process.finish", tool=tool, label=label, attempt=attempt + 1, returncode=result.returncode,
+              lines=result.lines, bytes=result.bytes, stderr_bytes=result.stderr_bytes, wall=result.wall_time)
+
+        if attempt >= retries or not is_transient(result):
+            if parser is not None:
+                parser.finish()
+            return result
+        delay = backoff_delay(attempt)
+        attempt += 1
+        logging.warning(f"{label}: временная ошибка (код {result.returncode}), повтор {attempt}/{retries} через {delay:.1f} с")
+        if parser is not None:
+            parser.reset()
+        await asyncio.sleep(delay)
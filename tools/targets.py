@@ -0,0 +1,245 @@
+import atexit
+import gzip
+import hashlib
+import logging
+import math
+import os
+import re
+import shutil
+import sys
+import tempfile
+from typing import IO, Dict, Iterable, Iterator, Optional
+
+# Домен после нормализации: ASCII (IDNA), метки 1-63 символа без дефиса по краям, TLD из букв или punycode
+DOMAIN_RE = re.compile(r"^(?=.{1,253}$)(?:(?!-)[a-z0-9-]{1,63}(?<!-)\.)+(?:[a-z]{2,63}|xn--[a-z0-9-]{1,59})$")
+SCHEME_RE = re.compile(r"^[a-z][a-z0-9+.-]*://", re.IGNORECASE)
+
+# До EXACT_LIMIT уникальных целей дубликаты отсекаются точно (set), дальше — фильтром Блума
+# фиксированного размера: память не растёт, но с вероятностью BLOOM_ERROR_RATE новая цель
+# может быть принята за повтор и пропущена.
+EXACT_LIMIT = 1_000_000
+BLOOM_CAPACITY = 50_000_000
+BLOOM_ERROR_RATE = 0.001
+# Сколько байт файла целей читается для оценки их числа в прогрессе задания
+COUNT_SAMPLE_BYTES = int(os.environ.get("CFD_PROGRESS_SAMPLE", str(4 * 1024 * 1024)))
+
+
+class BloomFilter:
+    __slots__ = ("size", "hashes", "bits")
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterator[int]:
+        # Двойное хеширование: k позиций из двух 64-битных половин одного blake2b
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, item: str) -> bool:
+        """
+        Добавляет элемент; False, если он (возможно) уже был добавлен.
+        """
+        new = False
+        for position in self._positions(item):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not self.bits[byte] & mask:
+                self.bits[byte] |= mask
+                new = True
+        return new
+
+
+class Deduplicator:
+    """
+    Отсеивает повторы с ограниченной памятью: точное множество до exact_limit элементов,
+    затем фильтр Блума на bloom_capacity элементов.
+    """
+    __slots__ = ("exact_limit", "bloom_capacity", "error_rate", "seen", "bloom")
+
+    def __init__(self, exact_limit: int = EXACT_LIMIT, bloom_capacity: int = BLOOM_CAPACITY,
+                 error_rate: float = BLOOM_ERROR_RATE):
+        self.exact_limit = exact_limit
+        self.bloom_capacity = bloom_capacity
+        self.error_rate = error_rate
+        self.seen = set()
+        self.bloom: Optional[BloomFilter] = None
+
+    def add(self, item: str) -> bool:
+        if self.bloom is not None:
+            return self.bloom.add(item)
+        if item in self.seen:
+            return False
+        self.seen.add(item)
+        if len(self.seen) > self.exact_limit:
+            logging.info(f"Больше {self.exact_limit} уникальных целей, дедупликация переходит на фильтр Блума")
+            self.bloom = BloomFilter(max(self.bloom_capacity, len(self.seen) * 2), self.error_rate)
+            for seen in self.seen:
+                self.bloom.add(seen)
+            self.seen = set()
+        return True
+
+
+def normalize_domain(value: str) -> Optional[str]:
+    """
+    Приводит домен к каноническому виду (нижний регистр, IDNA, без схемы, пути и завершающей точки).
+    Возвращает None, если строка не является доменом.
+
+    :param value: строка из файла целей или ввода пользователя.
+    :type value: str
+    """
+    domain = SCHEME_RE.sub("", value.strip()).split("/", 1)[0].rstrip(".").lower()
+    if not domain:
+        return None
+    if not domain.isascii():
+        try:
+            domain = domain.encode("idna").decode("ascii")
+        except UnicodeError:
+            return None
+    return domain if DOMAIN_RE.match(domain) else None
+
+
+def is_valid_domain(value: str) -> bool:
+    return normalize_domain(value) is not None
+
+
+def is_target_source(target: str) -> bool:
+    # Цель — это источник списка (файл, .gz или stdin), а не отдельный домен
+    return target == "-" or os.path.isfile(target)
+
+
+def open_targets(path: str) -> IO[str]:
+    """
+    Открывает источник целей на чтение: "-" — stdin, *.gz — gzip, иначе обычный текстовый файл.
+    """
+    if path == "-":
+        return open(sys.stdin.fileno(), "r", encoding="utf-8", errors="replace", closefd=False)
+    with open(path, "rb") as f:
+        compressed = f.read(2) == b"\x1f\x8b"
+    if compressed:
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+# Постоянные имена временных файлов целей: путь временного файла меняется от запуска к запуску,
+# а журнал и хранилище результатов должны узнавать тот же список при повторном запуске
+_source_names: Dict[str, str] = {}
+
+
+def source_name(target: str) -> str:
+    """
+    Имя источника целей для меток журнала и результатов: для временного файла (stdin, домены
+    задания) — его постоянное имя, для остальных целей — сама цель.
+    """
+    return _source_names.get(target, target)
+
+
+def name_source(path: str, name: Optional[str]) -> None:
+    # Задаёт постоянное имя временному файлу целей; None снимает его
+    if name is None:
+        _source_names.pop(path, None)
+    else:
+        _source_names[path] = name
+
+
+def spool_stdin() -> str:
+    """
+    Копирует stdin во временный файл потоком и возвращает путь к нему.
+    Нужен, когда один список целей читают несколько инструментов: stdin читается только один раз.
+    """
+    with tempfile.NamedTemporaryFile("wb", prefix="cfd_targets_", suffix=".txt", delete=False) as f:
+        shutil.copyfileobj(sys.stdin.buffer, f)
+    atexit.register(_remove, f.name)
+    name_source(f.name, "stdin")
+    return f.name
+
+
+def spool_targets(targets: Iterable[str]) -> str:
+    """
+    Записывает цели во временный файл (по одной в строке) и возвращает путь к нему; файл удаляется при выходе.
+    Отдельные домены задания передаются инструментам одним списком: общий лимит параллельности,
+    пакетные запуски и отсев повторов работают так же, как для файла целей.
+    """
+    with tempfile.NamedTemporaryFile("w", prefix="cfd_targets_", suffix=".txt", delete=False, encoding="utf-8") as f:
+        for target in targets:
+            f.write(target + "\n")
+    atexit.register(_remove, f.name)
+    name_source(f.name, "targets")
+    return f.name
+
+
+def _remove(path: str) -> None:
+    name_source(path, None)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def iter_targets(targets: str, kind: str = "domain", dedup: Optional[Deduplicator] = None) -> Iterator[str]:
+    """
+    Лениво отдаёт цели: строки файла (в том числе .gz) или stdin, если targets — источник списка,
+    иначе сам targets. Пустые строки и комментарии (#) пропускаются, домены нормализуются
+    и проверяются, повторы отсеиваются.
+
+    :param targets: путь к файлу, "-" для stdin или одна цель.
+    :type targets: str
+    :param kind: тип целей: "domain" или "username" (имена только обрезаются по пробелам).
+    :type kind: str
+    :param dedup: общий дедупликатор, если одни и те же цели приходят из нескольких источников.
+    :type dedup: Deduplicator
+    """
+    dedup = dedup or Deduplicator()
+    if not is_target_source(targets):
+        target = targets.strip() if kind == "username" else normalize_domain(targets)
+        if target and dedup.add(target):
+            yield target
+        return
+
+    invalid = duplicates = 0
+    with open_targets(targets) as file:
+        for line in file:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            target = line if kind == "username" else normalize_domain(line)
+            if target is None:
+                invalid += 1
+                if invalid <= 10:
+                    logging.warning(f"{targets}: пропущена некорректная цель {line!r}")
+                continue
+            if not dedup.add(target):
+                duplicates += 1
+                continue
+            yield target
+    if invalid or duplicates:
+        logging.info(f"{targets}: пропущено некорректных целей — {invalid}, повторов — {duplicates}")
+
+
+def count_targets(targets: str, sample_bytes: int = COUNT_SAMPLE_BYTES) -> int:
+    """
+    Оценка числа целей для прогресса задания: непустые строки без комментариев.
+    Некорректные цели и повторы не отсеиваются, поэтому оценка бывает чуть выше фактического числа.
+    Читаются только первые sample_bytes байт списка, остальное экстраполируется по доле
+    прочитанного файла (для .gz — по позиции в сжатом файле): большой список не читается лишний раз целиком.
+    """
+    if not is_target_source(targets) or targets == "-":
+        return 1
+    size = os.path.getsize(targets)
+    count = 0
+    read = 0
+    with open(targets, "rb") as raw:
+        compressed = raw.read(2) == b"\x1f\x8b"
+        raw.seek(0)
+        with (gzip.GzipFile(fileobj=raw) if compressed else raw) as file:
+            for line in file:
+                if line.split(b"#", 1)[0].strip():
+                    count += 1
+                read += len(line)
+                # Позиция в сжатом файле опережает разобранные строки на буфер чтения, это в пределах оценки;
+                # если буфер уже дошёл до конца файла, экстраполировать не по чему и строки считаются до конца
+                if read >= sample_bytes and raw.tell() < size:
+                    return round(count * size / raw.tell())
+    return count
@@ -0,0 +1,278 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from tools.executor import draining, run_concurrently
+from tools.results import ToolResult, error_result, result_from_dict, result_to_dict
+
+# Очередь заданий (инструмент, цель) для нескольких узлов. Файл SQLite должен лежать на общем
+# диске с рабочей блокировкой файлов или на узле координатора, куда ходят все исполнители.
+DEFAULT_QUEUE_PATH = os.environ.get("CFD_QUEUE_PATH", "queue.sqlite")
+# Аренда задания: исполнитель продлевает её каждые HEARTBEAT_INTERVAL секунд; если он упал,
+# через LEASE_SECONDS задание снова выдаётся другим, но не больше MAX_ATTEMPTS раз
+LEASE_SECONDS = float(os.environ.get("CFD_QUEUE_LEASE", "120"))
+HEARTBEAT_INTERVAL = LEASE_SECONDS / 4
+MAX_ATTEMPTS = 3
+# Пауза между опросами пустой очереди
+POLL_INTERVAL = 2.0
+INSERT_BATCH = 1000
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS tasks ("
+    "id INTEGER PRIMARY KEY, batch TEXT, tool TEXT, target TEXT, refresh INTEGER, state TEXT, worker TEXT, "
+    "lease_until REAL, attempts INTEGER DEFAULT 0, created REAL, updated REAL, results TEXT, collected INTEGER DEFAULT 0)",
+    "CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, lease_until)",
+    "CREATE INDEX IF NOT EXISTS tasks_batch ON tasks (batch, state, collected)",
+)
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class Task:
+    __slots__ = ("id", "batch", "tool", "target", "refresh", "attempts")
+
+    def __init__(self, id: int, batch: str, tool: str, target: str, refresh: int, attempts: int):
+        self.id = id
+        self.batch = batch
+        self.tool = tool
+        self.target = target
+        self.refresh = bool(refresh)
+        self.attempts = attempts
+
+
+class WorkQueue:
+    """
+    Очередь заданий в SQLite с арендой: задание выдаётся одному исполнителю до lease_until,
+    исполнитель продлевает аренду, пока работает, и сдаёт результаты. Все операции —
+    короткие транзакции, выполняемые в потоке, чтобы не блокировать цикл событий.
+    """
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH):
+        self.path = path
+        self.worker = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        for statement in SCHEMA:
+            self._db.execute(statement)
+
+    def _transaction(self, func: Callable[[sqlite3.Connection], object]):
+        with self._lock:
+            # IMMEDIATE: блокировка записи берётся сразу, два исполнителя не арендуют одно задание
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                value = func(self._db)
+                self._db.execute("COMMIT")
+                return value
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, jobs: Iterable[Tuple[str, str, bool]], batch: Optional[str] = None) -> Tuple[str, int]:
+        """
+        Добавляет задания (инструмент, цель, refresh) одной партией; возвращает её id и число заданий.
+        """
+        batch = batch or uuid.uuid4().hex
+        total = 0
+        rows = []
+
+        def insert(db):
+            db.executemany("INSERT INTO tasks (batch, tool, target, refresh, state, created, updated) "
+                           "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+        for tool, target, refresh in jobs:
+            now = time.time()
+            rows.append((batch, tool, target, int(refresh), PENDING, now, now))
+            if len(rows) >= INSERT_BATCH:
+                self._transaction(insert)
+                total += len(rows)
+                rows = []
+        if rows:
+            self._transaction(insert)
+            total += len(rows)
+        return batch, total
+
+    def lease(self, limit: int = 1, tools: Optional[Iterable[str]] = None) -> List[Task]:
+        """
+        Арендует до limit заданий: новые и те, чья аренда истекла (исполнитель упал или завис).
+        С tools — только задания этих инструментов: остальные ждут исполнителей, у которых они установлены.
+        """
+        tools = list(tools) if tools is not None else None
+        tool_filter = f" AND tool IN ({', '.join('?' * len(tools))})" if tools is not None else ""
+
+        def take(db):
+            if tools == []:
+                return []
+            now = time.time()
+            db.execute("UPDATE tasks SET state = ?, updated = ?, results = ? WHERE state = ? AND lease_until < ? AND attempts >= ?",
+                       (FAILED, now, json.dumps({"error": "аренда истекла, попытки исчерпаны"}), LEASED, now, MAX_ATTEMPTS))
+            rows = db.execute(
+                "SELECT id, batch, tool, target, refresh, attempts FROM tasks "
+                f"WHERE (state = ? OR (state = ? AND lease_until < ?)){tool_filter} ORDER BY id LIMIT ?",
+                (PENDING, LEASED, now, *(tools or ()), limit)
+            ).fetchall()
+            db.executemany("UPDATE tasks SET state = ?, worker = ?, lease_until = ?, attempts = attempts + 1, updated = ? "
+                           "WHERE id = ?", [(LEASED, self.worker, now + LEASE_SECONDS, now, row[0]) for row in rows])
+            return [Task(*row[:5], row[5] + 1) for row in rows]
+        return self._transaction(take)
+
+    def heartbeat(self, task_ids: List[int]) -> None:
+        if not task_ids:
+            return
+        now = time.time()
+        self._transaction(lambda db: db.executemany(
+            "UPDATE tasks SET lease_until = ?, updated = ? WHERE id = ? AND worker = ? AND state = ?",
+            [(now + LEASE_SECONDS, now, task_id, self.worker, LEASED) for task_id in task_ids]
+        ))
+
+    def complete(self, task: Task, results: List[ToolResult], failed: bool = False) -> bool:
+        """
+        Сдаёт результаты задания. False — аренду уже забрал другой исполнитель, результаты не приняты.
+        """
+        state = FAILED if failed else DONE
+        payload = json.dumps([result_to_dict(result) for result in results], ensure_ascii=False)
+        return self._transaction(lambda db: db.execute(
+            "UPDATE tasks SET state = ?, results = ?, updated = ? WHERE id = ? AND worker = ? AND state = ?",
+            (state, payload, time.time(), task.id, self.worker, LEASED)
+        ).rowcount == 1)
+
+    def release(self, task_ids: List[int]) -> None:
+        # Досрочный возврат аренды при остановке: задания сразу достанутся другим исполнителям
+        if task_ids:
+            self._transaction(lambda db: db.executemany(
+                "UPDATE tasks SET state = ?, worker = NULL, lease_until = NULL, attempts = attempts - 1 "
+                "WHERE id = ? AND worker = ? AND state = ?", [(PENDING, task_id, self.worker, LEASED) for task_id in task_ids]
+            ))
+
+    def counts(self, batch: Optional[str] = None) -> Dict[str, int]:
+        where, params = ("WHERE batch = ?", (batch,)) if batch else ("", ())
+        with self._lock:
+            rows = self._db.execute(f"SELECT state, COUNT(*) FROM tasks {where} GROUP BY state", params).fetchall()
+        return {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0, **dict(rows)}
+
+    def running(self, tools: Optional[Iterable[str]] = None) -> int:
+        """
+        Число заданий, которые сейчас выполняются: аренда не истекла. С tools — только задания этих
+        инструментов; истёкшие аренды не считаются, их заберёт lease().
+        """
+        tools = list(tools) if tools is not None else None
+        if tools == []:
+            return 0
+        tool_filter = f" AND tool IN ({', '.join('?' * len(tools))})" if tools is not None else ""
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM tasks WHERE state = ? AND lease_until >= ?{tool_filter}",
+                                    (LEASED, time.time(), *(tools or ()))).fetchone()[0]
+
+    def collect(self, batch: str, limit: int = 500) -> List[ToolResult]:
+        """
+        Забирает ещё не собранные результаты завершённых заданий партии (для координатора).
+        """
+        def take(db):
+            rows = db.execute("SELECT id, tool, target, results FROM tasks WHERE batch = ? AND state IN (?, ?) AND collected = 0 "
+                              "LIMIT ?", (batch, DONE, FAILED, limit)).fetchall()
+            db.executemany("UPDATE tasks SET collected = 1 WHERE id = ?", [(row[0],) for row in rows])
+            return rows
+
+        results = []
+        for _, tool, target, payload in self._transaction(take):
+            data = json.loads(payload) if payload else []
+            if isinstance(data, dict):
+                # Задание не выполнено ни одним исполнителем (см. lease)
+                results.append(error_result(tool, target, RuntimeError(data.get("error", ""))))
+            else:
+                results.extend(result_from_dict(item) for item in data)
+        return results
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+async def run_worker(queue: WorkQueue, runner: Callable[[Task], Awaitable[List[ToolResult]]], slots: int,
+                     until_empty: bool = False, tools: Optional[Iterable[str]] = None) -> int:
+    """
+    Исполнитель: арендует задания, пока есть свободные слоты, выполняет runner и сдаёт результаты.
+    Работает до request_drain() (SIGINT) или, с until_empty, до опустевшей очереди
+    (задания инструментов не из tools ему не выдаются и не считаются).
+    Возвращает число выполненных заданий.
+    """
+    tools = list(tools) if tools is not None else None
+    held: Dict[int, Task] = {}
+    completed = 0
+
+    async def heartbeat() -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                await asyncio.to_thread(queue.heartbeat, list(held))
+            except sqlite3.Error as e:
+                logging.error(f"Не удалось продлить аренду заданий: {e}")
+
+    async def tasks() -> AsyncIterator[Task]:
+        # run_concurrently берёт следующий элемент только при свободном слоте, так что аренда не опережает работу
+        while not draining():
+            try:
+                leased = await asyncio.to_thread(queue.lease, 1, tools)
+            except sqlite3.Error as e:
+                logging.error(f"Не удалось получить задание из очереди {queue.path}: {e}")
+                leased = []
+            if not leased:
+                if until_empty and not held and not await asyncio.to_thread(queue.running, tools):
+                    return
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+            held[leased[0].id] = leased[0]
+            yield leased[0]
+
+    beat = asyncio.create_task(heartbeat())
+    try:
+        async for task, results, error in run_concurrently(tasks(), runner, slots, progress=False):
+            if error is not None:
+                logging.error(f"Задание {task.id} ({task.tool} {task.target}) завершилось ошибкой: {error}")
+                results = [error_result(task.tool, task.target, error)]
+            # Неудача инструмента по самой цели — тоже результат; повторяются только задания упавших исполнителей
+            accepted = await asyncio.to_thread(queue.complete, task, results, error is not None)
+            held.pop(task.id, None)
+            if not accepted:
+                logging.warning(f"Задание {task.id} уже передано другому исполнителю, результаты отброшены")
+                continue
+            completed += 1
+    finally:
+        beat.cancel()
+        if held:
+            await asyncio.to_thread(queue.release, list(held))
+    return completed
+
+
+async def wait_batch(queue: WorkQueue, batch: str, on_result: Callable[[ToolResult], None]) -> Dict[str, int]:
+    """
+    Координатор: собирает результаты партии по мере выполнения, пока не останется незавершённых заданий.
+    """
+    last = None
+    while True:
+        for result in await asyncio.to_thread(queue.collect, batch):
+            on_result(result)
+        counts = await asyncio.to_thread(queue.counts, batch)
+        if counts != last:
+            logging.info(f"Партия {batch}: ожидают {counts[PENDING]}, выполняются {counts[LEASED]}, "
+                         f"готово {counts[DONE]}, с ошибкой {counts[FAILED]}")
+            last = counts
+        if not counts[PENDING] and not counts[LEASED]:
+            for result in await asyncio.to_thread(queue.collect, batch, -1):
+                on_result(result)
+            return counts
+        if draining():
+            return counts
+        await asyncio.sleep(POLL_INTERVAL)